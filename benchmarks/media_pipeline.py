@@ -0,0 +1,357 @@
+"""
+媒體上傳路徑的內存與吞吐量基準測試
+生成 100KB 到 500MB 的合成圖片/視頻文件，對 upload_to_imgur、upload_to_imgbb、create_data_url 和
+create_temp_server 在本地替身服務上逐一測量：tracemalloc 峰值、RSS 峰值、CPU 時間、耗時、吞吐量和實際傳輸字節數
+
+    python benchmarks/media_pipeline.py
+    python benchmarks/media_pipeline.py --sizes 100K,10M --paths imgur,temp_server --output bench.jsonl
+    python benchmarks/media_pipeline.py --baseline old.jsonl
+
+每個測試在獨立子進程中執行，RSS 峰值不受其他測試影響；結果逐行寫入 JSONL，--baseline 與舊結果比較
+"""
+
+import argparse
+import http.server
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("imgur", "imgbb", "data_url", "temp_server")
+KINDS = ("image", "video")
+DEFAULT_SIZES = "100K,1M,10M,100M,500M"
+CHUNK_SIZE = 1024 * 1024
+# 合成文件的文件頭，讓按擴展名或魔數判斷類型的代碼看到真實格式
+FILE_HEADERS = {
+    "image": (".jpg", b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"),
+    "video": (".mp4", b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"),
+}
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", value.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"無法解析大小: {value}")
+    return int(float(match.group(1)) * UNITS.get(match.group(2), 1))
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return str(size)
+
+
+def generate_file(directory: str, kind: str, size: int) -> str:
+    """
+    生成（或重用）指定大小的合成文件；內容為固定種子的隨機字節，不可壓縮，逐塊寫入不佔用內存
+    """
+    suffix, header = FILE_HEADERS[kind]
+    path = os.path.join(directory, f"{kind}_{format_size(size)}{suffix}")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    rng = random.Random(size)
+    with open(f"{path}.part", "wb") as f:
+        f.write(header[:size])
+        remaining = size - min(size, len(header))
+        while remaining > 0:
+            chunk = min(CHUNK_SIZE, remaining)
+            f.write(rng.randbytes(chunk))
+            remaining -= chunk
+    os.replace(f"{path}.part", path)
+    return path
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    圖床替身：逐塊讀取並丟棄請求體，返回 Imgur / ImgBB 格式的成功響應；
+    收到的字節數編碼在返回的鏈接中，測試進程據此計算傳輸放大
+    """
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        received = 0
+        while remaining > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            received += len(chunk)
+            remaining -= len(chunk)
+        link = f"http://127.0.0.1/standin/{received}.jpg"
+        body = json.dumps({"success": True, "data": {"link": link, "url": link}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in() -> tuple:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_peak_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 為單位，macOS 以字節為單位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+def fetch_served_file(url: str) -> int:
+    """
+    從臨時服務器流式下載文件，返回字節數
+    """
+    import requests
+    received = 0
+    with requests.get(url, stream=True, timeout=120) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            received += len(chunk)
+    return received
+
+
+def run_case(path_name: str, file_path: str, stand_in_url: str) -> dict:
+    """
+    子進程入口：導入節點並執行一次上傳路徑
+    """
+    os.environ["THREADS_IMGUR_UPLOAD_URL"] = f"{stand_in_url}/imgur"
+    os.environ["THREADS_IMGBB_UPLOAD_URL"] = f"{stand_in_url}/imgbb"
+    sys.path.insert(0, PACKAGE_DIR)
+    import threads_api
+
+    uploader = threads_api.ThreadsMediaUploaderNode()
+    size = os.path.getsize(file_path)
+    baseline_rss = rss_peak_bytes()
+    transferred = None
+
+    tracemalloc.start()
+    cpu_start = cpu_seconds()
+    started = time.perf_counter()
+
+    if path_name == "imgur":
+        media_url, success, method = uploader.upload_to_imgur(file_path)
+    elif path_name == "imgbb":
+        media_url, success, method = uploader.upload_to_imgbb(file_path, "benchmark")
+    elif path_name == "data_url":
+        media_url, success, method = uploader.create_data_url(file_path)
+        transferred = len(media_url) if success else None
+    elif path_name == "temp_server":
+        port = free_port()
+        media_url, success, method = uploader.create_temp_server(file_path, port, lifetime=120)
+        if success:
+            transferred = fetch_served_file(f"http://127.0.0.1:{port}/{media_url.rsplit('/', 1)[-1]}")
+    else:
+        raise ValueError(f"未知的上傳路徑: {path_name}")
+
+    wall = time.perf_counter() - started
+    cpu = cpu_seconds() - cpu_start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if success and path_name in ("imgur", "imgbb"):
+        match = re.search(r"/standin/(\d+)\.", media_url)
+        transferred = int(match.group(1)) if match else None
+    peak_rss = rss_peak_bytes()
+
+    return {
+        "path": path_name,
+        "size_bytes": size,
+        "success": bool(success),
+        "method": method,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "throughput_mb_s": round(size / 1024 / 1024 / wall, 2) if wall > 0 and success else None,
+        "tracemalloc_peak_bytes": traced_peak,
+        "tracemalloc_peak_ratio": round(traced_peak / size, 2) if size else None,
+        "rss_peak_bytes": peak_rss,
+        "rss_growth_bytes": peak_rss - baseline_rss if peak_rss is not None else None,
+        "transferred_bytes": transferred,
+        "transfer_ratio": round(transferred / size, 3) if transferred and size else None,
+    }
+
+
+def run_isolated(path_name: str, kind: str, file_path: str, stand_in_url: str, data_dir: str) -> dict:
+    """
+    在子進程中執行單個測試；子進程被終止（例如內存不足）時記錄為失敗
+    """
+    with tempfile.NamedTemporaryFile("r", suffix=".json", delete=False) as output:
+        output_path = output.name
+    env = dict(os.environ)
+    env.update({
+        "THREADS_DATA_DIR": data_dir,
+        "THREADS_SCHEDULER_DISABLED": "1",
+        "THREADS_INGEST_DISABLED": "1",
+        "THREADS_QUEUE_DISABLED": "1",
+        # 暫存區配額需要容納最大的測試文件
+        "THREADS_SCRATCH_QUOTA_MB": env.get("THREADS_SCRATCH_QUOTA_MB", "4096"),
+    })
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-case", path_name, file_path,
+             stand_in_url, output_path],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        with open(output_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if completed.returncode == 0 and content:
+            result = json.loads(content)
+        else:
+            result = {
+                "path": path_name,
+                "size_bytes": os.path.getsize(file_path),
+                "success": False,
+                "method": f"子進程退出碼 {completed.returncode}: {completed.stderr.strip()[-300:]}",
+            }
+    finally:
+        os.remove(output_path)
+    result["kind"] = kind
+    return result
+
+
+def environment_info() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PACKAGE_DIR,
+                                  capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def case_key(result: dict) -> tuple:
+    return result.get("kind"), result.get("path"), result.get("size_bytes")
+
+
+def load_baseline(path: str) -> dict:
+    baseline = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                result = json.loads(line)
+                baseline[case_key(result)] = result
+    return baseline
+
+
+def change(current, previous) -> str:
+    if not current or not previous:
+        return ""
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def format_row(result: dict, previous: dict = None) -> str:
+    mb = 1024 * 1024
+    line = f"{result['kind']:<6} {result['path']:<12} {format_size(result['size_bytes']):>6} "
+    if not result.get("success"):
+        return line + f"  ✗ {result.get('method', '')}"
+    line += (f"{result['wall_seconds']:>9.3f}s {result['cpu_seconds']:>8.3f}s "
+             f"{(result['throughput_mb_s'] or 0):>9.1f}MB/s "
+             f"peak {result['tracemalloc_peak_bytes'] / mb:>8.1f}MB ({result['tracemalloc_peak_ratio']}x) "
+             f"rss +{(result['rss_growth_bytes'] or 0) / mb:>7.1f}MB "
+             f"wire {result['transfer_ratio'] or '-'}x")
+    if previous and previous.get("success"):
+        line += (f"  | peak {change(result['tracemalloc_peak_bytes'], previous.get('tracemalloc_peak_bytes'))}"
+                 f" MB/s {change(result['throughput_mb_s'], previous.get('throughput_mb_s'))}")
+    return line
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="media_pipeline", description="媒體上傳路徑的內存與吞吐量基準測試")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"文件大小列表（默認 {DEFAULT_SIZES}）")
+    parser.add_argument("--paths", default=",".join(PATHS), help="上傳路徑: " + ", ".join(PATHS))
+    parser.add_argument("--kinds", default=",".join(KINDS), help="文件類型: image, video")
+    parser.add_argument("--workdir", default="", help="合成文件目錄（默認為系統臨時目錄，重複執行時重用）")
+    parser.add_argument("--output", default="media_pipeline_results.jsonl", help="結果 JSONL 文件")
+    parser.add_argument("--baseline", default="", help="與之比較的舊結果 JSONL 文件")
+    parser.add_argument("--run-case", nargs=4, metavar=("PATH", "FILE", "STAND_IN", "OUTPUT"),
+                        help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.run_case:
+        path_name, file_path, stand_in_url, output_path = args.run_case
+        result = run_case(path_name, file_path, stand_in_url)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    sizes = [parse_size(value) for value in args.sizes.split(",") if value.strip()]
+    paths = [value.strip() for value in args.paths.split(",") if value.strip()]
+    kinds = [value.strip() for value in args.kinds.split(",") if value.strip()]
+    unknown = [value for value in paths if value not in PATHS] + [value for value in kinds if value not in KINDS]
+    if unknown:
+        print(f"❌ 未知的路徑或類型: {', '.join(unknown)}")
+        return 2
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), "threads_media_bench")
+    os.makedirs(workdir, exist_ok=True)
+    data_dir = tempfile.mkdtemp(prefix="threads_bench_data_")
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    info = environment_info()
+    server, stand_in_url = start_stand_in()
+    print(f"=== 媒體上傳基準測試 ({info['revision'] or 'unknown'}, Python {info['python']}) ===")
+
+    failures = 0
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            for kind in kinds:
+                for size in sizes:
+                    file_path = generate_file(workdir, kind, size)
+                    for path_name in paths:
+                        result = run_isolated(path_name, kind, file_path, stand_in_url, data_dir)
+                        result.update(info)
+                        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        output.flush()
+                        print(format_row(result, baseline.get(case_key(result))))
+                        failures += 0 if result["success"] or path_name == "data_url" else 1
+    finally:
+        server.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"結果已寫入 {os.path.abspath(args.output)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 插件以 ComfyUI 自定義節點包的形式加載；測試直接導入各模組（走 ImportError 的絕對導入分支）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """
+    每個測試使用獨立的數據目錄，並關閉導入時自動啟動的後台服務
+    """
+    monkeypatch.setenv("THREADS_DATA_DIR", str(tmp_path))
+    for name in ("THREADS_SCHEDULER_DISABLED", "THREADS_INGEST_DISABLED", "THREADS_QUEUE_DISABLED"):
+        monkeypatch.setenv(name, "1")
+    return tmp_path
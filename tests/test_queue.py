@@ -0,0 +1,75 @@
+import os
+import time
+
+from threads_queue import (
+    STATUS_DONE, STATUS_FAILED, STATUS_LEASED, STATUS_QUEUED, PublishQueueStore, QueueWorker
+)
+
+
+def job_status(store, job_id):
+    return {job["id"]: job["status"] for job in store.list_jobs()}[job_id]
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_cannot_finish(data_dir):
+    store = PublishQueueStore(str(data_dir / "queue.db"))
+    job_id = store.enqueue({"access_token": "token-a", "text": "hello"})
+
+    claimed = store.claim("worker-1", lease_seconds=0.05)
+    assert claimed == (job_id, {"access_token": "token-a", "text": "hello"})
+    assert store.claim("worker-2") is None
+    time.sleep(0.1)
+
+    assert store.reclaim_expired() == (1, 0)
+    assert job_status(store, job_id) == STATUS_QUEUED
+    assert store.claim("worker-2")[0] == job_id
+    # 原工作進程的租約已失效，不能覆蓋新持有者的結果
+    assert not store.renew(job_id, "worker-1")
+    assert not store.finish(job_id, "worker-1", True, {})
+    assert store.finish(job_id, "worker-2", True, {"post_id": "1"})
+    assert job_status(store, job_id) == STATUS_DONE
+
+
+def test_reclaim_gives_up_after_max_attempts(data_dir):
+    store = PublishQueueStore(str(data_dir / "queue.db"))
+    job_id = store.enqueue({"access_token": "token-a"}, max_attempts=1)
+    store.claim("worker-1", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    assert store.reclaim_expired() == (0, 1)
+    assert job_status(store, job_id) == STATUS_FAILED
+    assert store.claim("worker-2") is None
+
+
+def test_same_shard_runs_in_order_across_reclaim(data_dir):
+    store = PublishQueueStore(str(data_dir / "queue.db"))
+    first = store.enqueue({"access_token": "token-a", "n": 1})
+    second = store.enqueue({"access_token": "token-a", "n": 2})
+    other = store.enqueue({"access_token": "token-b", "n": 3})
+
+    assert store.claim("worker-1", lease_seconds=0.01)[0] == first
+    # 同一帳戶的第二個任務要等第一個完成，其他帳戶不受影響
+    assert store.claim("worker-2")[0] == other
+    assert store.claim("worker-3") is None
+    time.sleep(0.05)
+    store.reclaim_expired()
+    assert store.claim("worker-3")[0] == first
+    assert job_status(store, second) == STATUS_QUEUED
+    assert job_status(store, first) == STATUS_LEASED
+
+
+def test_shared_queue_media_is_removed_after_last_job(data_dir):
+    store = PublishQueueStore(str(data_dir / "queue.db"))
+    source = data_dir / "image.png"
+    source.write_bytes(b"\x89PNG\r\n\x1a\n")
+    payloads = [{"access_token": "token-a"}, {"access_token": "token-b"}]
+    for payload in payloads:
+        store.enqueue(payload, media_source=(str(source), "abc123"))
+    media_path = payloads[0]["queue_media"]
+    assert media_path == payloads[1]["queue_media"]
+
+    worker = QueueWorker(store, lambda payload: (True, {"message": "ok"}), worker_id="worker-1")
+    assert worker.run_one()
+    # 另一個任務仍在排隊，共用的媒體文件必須保留
+    assert os.path.exists(media_path)
+    assert worker.run_one()
+    assert not os.path.exists(media_path)
@@ -0,0 +1,102 @@
+import datetime
+import json
+
+import pytest
+
+from threads_replies import ReplyCursorStore, iter_new_replies
+
+BASE_URL = "https://graph.example"
+
+
+def reply(n):
+    timestamp = datetime.datetime(2026, 1, 1, 0, 0, n, tzinfo=datetime.timezone.utc)
+    return {"id": f"r{n}", "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+class FakePagedSession:
+    """
+    按 after 游標分頁返回回覆（由新到舊）；expired 中的游標下一次使用時返回 400，模擬已失效的舊分頁位置
+    """
+
+    def __init__(self, replies, page_size):
+        self.replies = replies
+        self.page_size = page_size
+        self.expired = set()
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        after = params.get("after", "")
+        self.requests.append(after)
+        if after in self.expired:
+            self.expired.discard(after)
+            return FakeResponse(400, {"error": {"message": "Invalid cursor"}})
+        start = int(after[1:]) if after else 0
+        data = self.replies[start:start + self.page_size]
+        body = {"data": data}
+        end = start + self.page_size
+        if end < len(self.replies):
+            body["paging"] = {"cursors": {"after": f"c{end}"}, "next": f"{url}?after=c{end}"}
+        return FakeResponse(200, body)
+
+
+def read(session, store, limit=0):
+    return [item["id"] for item in iter_new_replies(BASE_URL, "post", "token", limit=limit, page_size=2,
+                                                    store=store, session=session)]
+
+
+@pytest.fixture
+def store(data_dir):
+    return ReplyCursorStore(str(data_dir / "posts.db"))
+
+
+def test_limit_records_backfill_and_next_call_resumes(store):
+    session = FakePagedSession([reply(n) for n in (5, 4, 3, 2, 1)], page_size=2)
+
+    assert read(session, store, limit=3) == ["r5", "r4", "r3"]
+    state = store.get("post", "replies")
+    assert state["backfill_after"] == "c2"
+    # 補讀完成前游標不推進
+    assert state["newest_at"] == 0
+
+    session.requests.clear()
+    assert read(session, store) == ["r2", "r1"]
+    # 從中斷所在頁繼續，不重新讀取第一頁
+    assert session.requests[0] == "c2"
+    state = store.get("post", "replies")
+    assert state["backfill_before"] is None
+    assert state["newest_ids"] == {"r5"}
+
+    session.replies.insert(0, reply(6))
+    assert read(session, store) == ["r6"]
+    assert read(session, store) == []
+
+
+def test_expired_backfill_cursor_restarts_from_first_page(store):
+    session = FakePagedSession([reply(n) for n in (5, 4, 3, 2, 1)], page_size=2)
+    assert read(session, store, limit=3) == ["r5", "r4", "r3"]
+
+    session.expired.add("c2")
+    session.requests.clear()
+    assert read(session, store) == ["r2", "r1"]
+    assert session.requests[:2] == ["c2", ""]
+    assert store.get("post", "replies")["newest_ids"] == {"r5"}
+
+
+def test_replies_arriving_during_backfill_are_read_afterwards(store):
+    session = FakePagedSession([reply(n) for n in (5, 4, 3, 2, 1)], page_size=2)
+    assert read(session, store, limit=2) == ["r5", "r4"]
+
+    # 新回覆插入最前面，已保存的分頁游標不再對齊，跳過條件保證不重複返回
+    session.replies.insert(0, reply(6))
+    assert read(session, store) == ["r3", "r2", "r1"]
+    assert read(session, store) == ["r6"]
@@ -0,0 +1,61 @@
+import time
+
+from threads_scheduler import (
+    STATUS_DONE, STATUS_INTERRUPTED, STATUS_PENDING, PostScheduler, ScheduledPostStore
+)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def statuses(store):
+    return {job["id"]: job["status"] for job in store.list_jobs()}
+
+
+def test_mark_interrupted_only_touches_running_jobs(data_dir):
+    store = ScheduledPostStore(str(data_dir / "scheduled.db"))
+    running_id = store.add(time.time() - 10, {"text": "running"})
+    pending_id = store.add(time.time() + 3600, {"text": "pending"})
+    assert store.claim(running_id) == {"text": "running"}
+
+    assert store.mark_interrupted() == 1
+    assert statuses(store) == {running_id: STATUS_INTERRUPTED, pending_id: STATUS_PENDING}
+    # 已中斷的任務不能再被領取
+    assert store.claim(running_id) is None
+
+
+def test_restart_recovers_pending_jobs_without_rerunning_interrupted(data_dir):
+    db_path = str(data_dir / "scheduled.db")
+    store = ScheduledPostStore(db_path)
+    interrupted_id = store.add(time.time() - 10, {"text": "was running"})
+    overdue_id = store.add(time.time() - 5, {"text": "overdue"})
+    future_id = store.add(time.time() + 3600, {"text": "later"})
+    # 模擬上一個進程在執行中途退出
+    store.claim(interrupted_id)
+
+    executed = []
+
+    def run_job(payload):
+        executed.append(payload["text"])
+        return True, {"message": "ok"}
+
+    scheduler = PostScheduler(ScheduledPostStore(db_path), run_job)
+    scheduler.start()
+    try:
+        assert wait_for(lambda: statuses(store)[overdue_id] == STATUS_DONE)
+    finally:
+        scheduler.stop()
+
+    assert executed == ["overdue"]
+    assert statuses(store) == {
+        interrupted_id: STATUS_INTERRUPTED,
+        overdue_id: STATUS_DONE,
+        future_id: STATUS_PENDING,
+    }
+    assert store.count_pending() == 1
@@ -3,11 +3,147 @@ import json
 from typing import Optional, Dict, Any
 import base64
 import os
-import tempfile
-import shutil
 from pathlib import Path
 import datetime
 import time
+import mimetypes
+
+try:
+    from .threads_s3 import S3CompatibleUploader
+except ImportError:
+    from threads_s3 import S3CompatibleUploader
+
+try:
+    from .threads_media import THREADS_MEDIA, MediaHandle, get_media_store
+except ImportError:
+    from threads_media import THREADS_MEDIA, MediaHandle, get_media_store
+
+try:
+    from .threads_journal import record_published_post
+    from .threads_insights import InsightsStore, ThreadsInsightsSync
+except ImportError:
+    from threads_journal import record_published_post
+    from threads_insights import InsightsStore, ThreadsInsightsSync
+
+try:
+    from .threads_listing import DEFAULT_POST_FIELDS, PageCache, iter_user_threads
+except ImportError:
+    from threads_listing import DEFAULT_POST_FIELDS, PageCache, iter_user_threads
+
+try:
+    from .threads_common import token_fingerprint
+except ImportError:
+    from threads_common import token_fingerprint
+
+try:
+    from .threads_text import THREADS_TEXT_LIMIT, split_for_threads, threads_length
+except ImportError:
+    from threads_text import THREADS_TEXT_LIMIT, split_for_threads, threads_length
+
+try:
+    from .threads_capabilities import (
+        CONTAINER_PUBLISH, PUBLISH_METHODS, THREADS_PUBLISH, account_key, build_publish_request,
+        get_capability_cache, is_endpoint_shape_error
+    )
+except ImportError:
+    from threads_capabilities import (
+        CONTAINER_PUBLISH, PUBLISH_METHODS, THREADS_PUBLISH, account_key, build_publish_request,
+        get_capability_cache, is_endpoint_shape_error
+    )
+
+try:
+    from .threads_preflight import format_verdict, preflight_post
+except ImportError:
+    from threads_preflight import format_verdict, preflight_post
+
+try:
+    from .threads_urlcheck import check_media_url, format_url_check
+except ImportError:
+    from threads_urlcheck import check_media_url, format_url_check
+
+try:
+    from .threads_ingest import (
+        get_ingest_config_path, get_ingest_service, resume_ingest_service, start_ingest_service,
+        stop_ingest_service
+    )
+except ImportError:
+    from threads_ingest import (
+        get_ingest_config_path, get_ingest_service, resume_ingest_service, start_ingest_service,
+        stop_ingest_service
+    )
+
+try:
+    from .threads_dedupe import DEDUPE_MODES, DEFAULT_DEDUPE_THRESHOLD, HASH_METHODS, compute_hashes, \
+        filter_batch, get_image_hash_index, index_account_key
+except ImportError:
+    from threads_dedupe import DEDUPE_MODES, DEFAULT_DEDUPE_THRESHOLD, HASH_METHODS, compute_hashes, \
+        filter_batch, get_image_hash_index, index_account_key
+
+try:
+    from .threads_encoding import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_WIDTH, ENCODE_FORMATS, encode_images
+except ImportError:
+    from threads_encoding import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_WIDTH, ENCODE_FORMATS, encode_images
+
+try:
+    from .threads_delete import iter_bulk_delete, select_from_journal, select_from_listing
+except ImportError:
+    from threads_delete import iter_bulk_delete, select_from_journal, select_from_listing
+
+try:
+    from .threads_cassette import start_cassette_from_env
+except ImportError:
+    from threads_cassette import start_cassette_from_env
+
+try:
+    from .threads_profiling import PROFILE_MODES, get_node_profiler, setup_node_profiling
+except ImportError:
+    from threads_profiling import PROFILE_MODES, get_node_profiler, setup_node_profiling
+
+try:
+    from .threads_replies import DEFAULT_REPLY_FIELDS, REPLY_ENDPOINTS, iter_new_replies, match_keywords, moderate_replies
+except ImportError:
+    from threads_replies import DEFAULT_REPLY_FIELDS, REPLY_ENDPOINTS, iter_new_replies, match_keywords, moderate_replies
+
+try:
+    from .threads_scratch import get_scratch_space
+except ImportError:
+    from threads_scratch import get_scratch_space
+
+try:
+    from .threads_queue import (
+        enqueue_publish, get_publish_queue, get_queue_pool, resume_publish_queue
+    )
+except ImportError:
+    from threads_queue import (
+        enqueue_publish, get_publish_queue, get_queue_pool, resume_publish_queue
+    )
+
+try:
+    from .threads_cache import (
+        DEFAULT_CACHE_TTL, SingleFlight, cache_bucket, cached_get, fetch_me, get_response_cache, never_cached
+    )
+except ImportError:
+    from threads_cache import (
+        DEFAULT_CACHE_TTL, SingleFlight, cache_bucket, cached_get, fetch_me, get_response_cache, never_cached
+    )
+
+try:
+    from .threads_poller import get_status_poller
+except ImportError:
+    from threads_poller import get_status_poller
+
+try:
+    from .threads_scheduler import get_post_scheduler, resume_pending_schedules
+except ImportError:
+    from threads_scheduler import get_post_scheduler, resume_pending_schedules
+
+# 圖床上傳端點；可用環境變數指向本地替身服務（基準測試、離線調試）
+IMGUR_UPLOAD_URL = os.environ.get("THREADS_IMGUR_UPLOAD_URL", "https://api.imgur.com/3/image")
+IMGBB_UPLOAD_URL = os.environ.get("THREADS_IMGBB_UPLOAD_URL", "https://api.imgbb.com/1/upload")
+
+# 成功的重新整理結果保留 10 分鐘，覆蓋同一工作流中其他節點稍後的重試
+TOKEN_REFRESH_MEMO_TTL = 600
+_token_refresh_flight = SingleFlight(memo_ttl=TOKEN_REFRESH_MEMO_TTL, memo_if=lambda result: result[1])
 
 class ThreadsTokenManagerNode:
     """
@@ -36,6 +172,12 @@ class ThreadsTokenManagerNode:
                     "min": 1,
                     "max": 30
                 }),
+                # 只讀結果的緩存時間（秒），0 表示每次都重新請求
+                "cache_ttl_seconds": ("INT", {
+                    "default": 300,
+                    "min": 0,
+                    "max": 86400
+                }),
             }
         }
     
@@ -44,6 +186,14 @@ class ThreadsTokenManagerNode:
     CATEGORY = "Social Media/Threads/Token"
     FUNCTION = "manage_token"
     
+    @classmethod
+    def IS_CHANGED(cls, action: str = "", access_token: str = "",
+                   cache_ttl_seconds: int = DEFAULT_CACHE_TTL, **kwargs):
+        # 只有 validate_token 是只讀操作；交換和重新整理權杖永遠重新執行
+        if action == "validate_token":
+            return cache_bucket(access_token, cache_ttl_seconds)
+        return never_cached()
+    
     def __init__(self):
         self.base_url = "https://graph.threads.net"
     
@@ -118,11 +268,22 @@ class ThreadsTokenManagerNode:
     def refresh_long_lived_token(self, long_lived_token: str) -> tuple:
         """
         重新整理長期權杖
+        多個節點同時遇到權杖錯誤時，同一權杖只發出一次重新整理請求，其他調用者等待並共享新權杖；
+        成功的結果會保留一段時間，稍後才發現舊權杖失效的調用者直接取得同一個新權杖
         """
+        if not long_lived_token:
+            return ("", False, "❌ 需要提供長期權杖", 0, "")
+        
+        result, shared = _token_refresh_flight.do(
+            token_fingerprint(long_lived_token),
+            lambda: self._request_token_refresh(long_lived_token)
+        )
+        if shared and result[1]:
+            print("♻️ 權杖已由並發的請求重新整理，直接使用新權杖")
+        return result
+    
+    def _request_token_refresh(self, long_lived_token: str) -> tuple:
         try:
-            if not long_lived_token:
-                return ("", False, "❌ 需要提供長期權杖", 0, "")
-            
             print("=== 重新整理長期權杖 ===")
             
             url = f"{self.base_url}/refresh_access_token"
@@ -180,7 +341,8 @@ class ThreadsTokenManagerNode:
             traceback.print_exc()
             return ("", False, error_message, 0, "")
     
-    def validate_token_expiry(self, access_token: str, threshold_days: int = 7) -> tuple:
+    def validate_token_expiry(self, access_token: str, threshold_days: int = 7,
+                              cache_ttl_seconds: int = DEFAULT_CACHE_TTL) -> tuple:
         """
         驗證權杖並檢查是否需要重新整理
         """
@@ -190,15 +352,10 @@ class ThreadsTokenManagerNode:
             
             print("=== 驗證權杖到期狀態 ===")
             
-            # 嘗試使用權杖獲取用戶資訊來驗證有效性
+            # 嘗試使用權杖獲取用戶資訊來驗證有效性（與其他節點共用 /me 請求）
             api_version = "v1.0"
-            test_url = f"https://graph.threads.net/{api_version}/me"
-            test_params = {
-                'fields': 'id,username',
-                'access_token': access_token
-            }
-            
-            response = requests.get(test_url, params=test_params, timeout=30)
+            response = fetch_me(f"https://graph.threads.net/{api_version}", access_token, 'id,username',
+                                cache_ttl_seconds)
             
             if response.status_code == 200:
                 user_data = response.json()
@@ -230,7 +387,7 @@ class ThreadsTokenManagerNode:
             return ("", False, error_message, 0, "error")
     
     def manage_token(self, action: str, access_token: str, client_secret: str = "",
-                    auto_refresh_threshold_days: int = 7):
+                    auto_refresh_threshold_days: int = 7, cache_ttl_seconds: int = DEFAULT_CACHE_TTL):
         """
         主要的權杖管理函數
         """
@@ -244,7 +401,7 @@ class ThreadsTokenManagerNode:
                 return self.refresh_long_lived_token(access_token)
                 
             elif action == "validate_token":
-                return self.validate_token_expiry(access_token, auto_refresh_threshold_days)
+                return self.validate_token_expiry(access_token, auto_refresh_threshold_days, cache_ttl_seconds)
                 
             else:
                 return ("", False, f"❌ 不支援的操作: {action}", 0, "")
@@ -278,6 +435,12 @@ class ThreadsTokenValidatorNode:
                     "min": 1,
                     "max": 30
                 }),
+                # 只讀結果的緩存時間（秒），0 表示每次都重新請求
+                "cache_ttl_seconds": ("INT", {
+                    "default": 300,
+                    "min": 0,
+                    "max": 86400
+                }),
             }
         }
     
@@ -286,12 +449,16 @@ class ThreadsTokenValidatorNode:
     CATEGORY = "Social Media/Threads"
     FUNCTION = "validate_token"
     
+    @classmethod
+    def IS_CHANGED(cls, access_token: str = "", cache_ttl_seconds: int = DEFAULT_CACHE_TTL, **kwargs):
+        return cache_bucket(access_token, cache_ttl_seconds)
+    
     def __init__(self):
         self.api_version = "v1.0"
         self.base_url = f"https://graph.threads.net/{self.api_version}"
     
     def validate_token(self, access_token: str, check_expiry_warning: bool = True,
-                      warning_days_threshold: int = 7):
+                      warning_days_threshold: int = 7, cache_ttl_seconds: int = DEFAULT_CACHE_TTL):
         """
         驗證 Token 有效性和權限，並檢查是否需要重新整理
         """
@@ -320,14 +487,8 @@ class ThreadsTokenValidatorNode:
             # 2. API 連接測試
             validation_report.append("\n2. API 連接測試:")
             
-            # 獲取用戶信息
-            user_url = f"{self.base_url}/me"
-            user_params = {
-                'fields': 'id,username,name',
-                'access_token': access_token
-            }
-            
-            user_response = requests.get(user_url, params=user_params, timeout=30)
+            # 獲取用戶信息（與其他節點共用 /me 請求）
+            user_response = fetch_me(self.base_url, access_token, 'id,username,name', cache_ttl_seconds)
             
             validation_report.append(f"   狀態碼: {user_response.status_code}")
             
@@ -364,13 +525,17 @@ class ThreadsTokenValidatorNode:
                 test_create_url = f"{self.base_url}/{user_id}/threads"
                 test_headers = {'Authorization': f'Bearer {access_token}'}
                 
-                # 使用 HEAD 請求測試權限
-                test_response = requests.head(test_create_url, headers=test_headers, timeout=10)
+                # 使用 HEAD 請求測試權限，結果與 /me 響應共用緩存時間
+                permission_key = ('permission_probe', test_create_url, token_fingerprint(access_token))
+                test_status = get_response_cache().get(permission_key, cache_ttl_seconds) if cache_ttl_seconds > 0 else None
+                if test_status is None:
+                    test_status = requests.head(test_create_url, headers=test_headers, timeout=10).status_code
+                    get_response_cache().put(permission_key, test_status)
                 
-                if test_response.status_code in [200, 405]:  # 405 表示方法不允許但端點存在
+                if test_status in [200, 405]:  # 405 表示方法不允許但端點存在
                     validation_report.append("   ✅ 具有基本發布權限")
                     permissions = "threads_basic,threads_content_publish"
-                elif test_response.status_code == 403:
+                elif test_status == 403:
                     validation_report.append("   ⚠️ 可能缺少發布權限")
                     permissions = "threads_basic"
                 else:
@@ -454,6 +619,10 @@ class ThreadsOfficialFormatNode:
                     "default": "",
                     "multiline": False
                 }),
+                # 只做離線預檢，不上傳、不發出任何網絡請求
+                "dry_run": ("BOOLEAN", {
+                    "default": False
+                }),
             }
         }
     
@@ -462,6 +631,9 @@ class ThreadsOfficialFormatNode:
     CATEGORY = "Social Media/Threads"
     FUNCTION = "publish_official_format"
     
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
     def __init__(self):
         self.api_version = "v1.0"
         self.base_url = f"https://graph.threads.net/{self.api_version}"
@@ -563,61 +735,68 @@ class ThreadsOfficialFormatNode:
                                  auto_refresh: bool = False, client_secret: str = "") -> tuple:
         """
         發布 Threads 容器 - 增強權杖處理
+        優先使用此帳戶記錄的可用發布端點，端點形式不被接受時作廢記錄並回退到另一個端點
         """
         try:
-            url = f"{self.base_url}/me/threads_publish"
-            
-            data = {
-                'creation_id': creation_id,
-                'access_token': access_token
-            }
-            
+            capabilities = get_capability_cache()
+            capability_key = account_key(access_token, resolve_me_user_id)
             headers = {
                 'Content-Type': 'application/x-www-form-urlencoded'
             }
+            error_msg = "發布失敗"
             
-            print(f"發布 Threads 容器...")
-            print(f"URL: {url}")
-            print(f"POST 數據: {data}")
-            
-            response = requests.post(url, data=data, headers=headers, timeout=30)
-            
-            print(f"發布響應狀態: {response.status_code}")
-            print(f"發布響應內容: {response.text}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ 發布成功: {result}")
-                return (result, access_token, "發布成功")
+            for method in capabilities.order(capability_key, (THREADS_PUBLISH, CONTAINER_PUBLISH)):
+                url, data = build_publish_request(method, self.base_url, creation_id, access_token)
                 
-            elif response.status_code == 190:  # 權杖過期
-                print("⚠️ 權杖可能已過期，嘗試處理...")
-                new_token, refresh_success, refresh_message = self.handle_token_expiry(
-                    access_token, client_secret, auto_refresh
-                )
+                print(f"發布 Threads 容器 ({method})...")
+                print(f"URL: {url}")
+                print(f"POST 數據: {dict(data, access_token='[HIDDEN]')}")
                 
-                if refresh_success:
-                    # 使用新權杖重試
-                    data['access_token'] = new_token
-                    retry_response = requests.post(url, data=data, headers=headers, timeout=30)
+                response = requests.post(url, data=data, headers=headers, timeout=30)
+                
+                print(f"發布響應狀態: {response.status_code}")
+                print(f"發布響應內容: {response.text}")
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    capabilities.remember(capability_key, method)
+                    print(f"✅ 發布成功: {result}")
+                    return (result, access_token, "發布成功")
                     
-                    if retry_response.status_code == 200:
-                        result = retry_response.json()
-                        print(f"✅ 使用新權杖發布成功: {result}")
-                        return (result, new_token, f"權杖已重新整理並發布成功: {refresh_message}")
+                elif response.status_code == 190:  # 權杖過期
+                    print("⚠️ 權杖可能已過期，嘗試處理...")
+                    new_token, refresh_success, refresh_message = self.handle_token_expiry(
+                        access_token, client_secret, auto_refresh
+                    )
+                    
+                    if refresh_success:
+                        # 使用新權杖重試
+                        data['access_token'] = new_token
+                        retry_response = requests.post(url, data=data, headers=headers, timeout=30)
+                        
+                        if retry_response.status_code == 200:
+                            result = retry_response.json()
+                            capabilities.remember(account_key(new_token, resolve_me_user_id), method)
+                            print(f"✅ 使用新權杖發布成功: {result}")
+                            return (result, new_token, f"權杖已重新整理並發布成功: {refresh_message}")
+                        else:
+                            return (None, new_token, f"使用新權杖發布失敗: {retry_response.text}")
                     else:
-                        return (None, new_token, f"使用新權杖發布失敗: {retry_response.text}")
+                        return (None, access_token, refresh_message)
                 else:
-                    return (None, access_token, refresh_message)
-            else:
-                try:
-                    error_data = response.json()
-                    error_detail = error_data.get('error', {})
-                    error_msg = f"發布失敗: {error_detail.get('message', response.text)}"
-                except:
-                    error_msg = f"發布失敗: {response.text}"
-                
-                return (None, access_token, error_msg)
+                    try:
+                        error_data = response.json()
+                        error_detail = error_data.get('error', {})
+                        error_msg = f"發布失敗: {error_detail.get('message', response.text)}"
+                    except:
+                        error_msg = f"發布失敗: {response.text}"
+                    
+                    if not is_endpoint_shape_error(response):
+                        return (None, access_token, error_msg)
+                    capabilities.invalidate(capability_key, method)
+                    print(f"⚠️ 發布端點 {method} 不被接受，嘗試下一個端點")
+            
+            return (None, access_token, error_msg)
                 
         except Exception as e:
             error_msg = f"發布時發生異常: {str(e)}"
@@ -628,11 +807,21 @@ class ThreadsOfficialFormatNode:
     
     def publish_official_format(self, access_token: str, text: str, threads_user_id: str,
                                media_type: str = "TEXT", image_url: str = "", video_url: str = "",
-                               auto_refresh_token: bool = False, client_secret: str = ""):
+                               auto_refresh_token: bool = False, client_secret: str = "", dry_run: bool = False):
         """
         主發布函數 - 增強長期權杖支援
         """
         try:
+            if dry_run:
+                verdict = preflight_post(access_token, text, media_type, threads_user_id,
+                                         media_url=image_url if media_type == "IMAGE" else video_url)
+                if media_type != "TEXT":
+                    verdict["errors"].append("此節點目前只支援發布純文本帖子")
+                    verdict["ok"] = False
+                status_message = format_verdict(verdict) + "\n" + json.dumps(verdict, ensure_ascii=False)
+                print(status_message)
+                return ("", "", verdict["ok"], status_message, access_token)
+            
             print("=== Threads 官方格式發布開始（支援長期權杖）===")
             print(f"用戶ID: {threads_user_id}")
             print(f"媒體類型: {media_type}")
@@ -666,6 +855,7 @@ class ThreadsOfficialFormatNode:
                # 獲取結果
                 post_id = publish_result.get('id', '')
                 permalink = f"https://threads.net/post/{post_id}"
+                record_published_post(post_id, threads_user_id, media_type, "official_format", text)
                
                 success_message = f"✅ 成功發布到 Threads!\n帖子 ID: {post_id}\n媒體類型: {media_type}"
                 if final_token != access_token:
@@ -695,7 +885,7 @@ class ThreadsMediaUploaderNode:
    def INPUT_TYPES(cls):
        return {
            "required": {
-               "upload_service": (["imgur", "temp_host", "base64_embed", "local_server"], {
+               "upload_service": (["imgur", "temp_host", "base64_embed", "local_server", "s3"], {
                    "default": "imgur"
                }),
                "media_file_path": ("STRING", {
@@ -718,14 +908,57 @@ class ThreadsMediaUploaderNode:
                "temp_host_service": (["imgbb", "postimages", "imgur_anonymous"], {
                    "default": "imgur_anonymous"
                }),
+               
+               # S3 相容存儲配置（留空時使用 THREADS_S3_* 環境變數）
+               "s3_endpoint_url": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               "s3_bucket": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               "s3_access_key": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               "s3_secret_key": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               "s3_region": ("STRING", {
+                   "default": "us-east-1",
+                   "multiline": False
+               }),
+               "s3_public_base_url": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               
+               # 共享媒體句柄（提供時忽略 media_file_path）
+               "media": (THREADS_MEDIA,),
+               
+               # ComfyUI 圖片批次：在多個進程中編碼，每張編碼完成即開始上傳，media_url 每行一個
+               "images": ("IMAGE",),
+               "encode_format": (list(ENCODE_FORMATS), {
+                   "default": "JPEG"
+               }),
+               "jpeg_quality": ("INT", {
+                   "default": DEFAULT_JPEG_QUALITY,
+                   "min": 50,
+                   "max": 100
+               }),
            }
        }
    
-   RETURN_TYPES = ("STRING", "BOOLEAN", "STRING", "STRING")
-   RETURN_NAMES = ("media_url", "success", "upload_method", "status_message")
+   RETURN_TYPES = ("STRING", "BOOLEAN", "STRING", "STRING", THREADS_MEDIA)
+   RETURN_NAMES = ("media_url", "success", "upload_method", "status_message", "media")
    CATEGORY = "Social Media/Threads/Media"
    FUNCTION = "upload_media"
    
+   # 有副作用的節點永遠重新執行
+   IS_CHANGED = classmethod(never_cached)
+   
    def upload_to_imgur(self, file_path: str, client_id: str = None) -> tuple:
        """
        上傳到 Imgur
@@ -752,7 +985,7 @@ class ThreadsMediaUploaderNode:
            }
            
            response = requests.post(
-               'https://api.imgur.com/3/image',
+               IMGUR_UPLOAD_URL,
                headers=headers,
                data=data,
                timeout=30
@@ -791,7 +1024,7 @@ class ThreadsMediaUploaderNode:
            }
            
            response = requests.post(
-               'https://api.imgbb.com/1/upload',
+               IMGBB_UPLOAD_URL,
                data=data,
                timeout=30
            )
@@ -809,42 +1042,57 @@ class ThreadsMediaUploaderNode:
        except Exception as e:
            return ("", False, f"Upload error: {str(e)}")
    
-   def create_temp_server(self, file_path: str, port: int = 8000) -> tuple:
+   def create_temp_server(self, file_path: str, port: int = 8000, lifetime: int = 300) -> tuple:
        """
-       創建臨時本地服務器
+       創建臨時本地服務器 - 只發佈暫存區中的這個文件，lifetime 秒後自動關閉
        """
        try:
            import http.server
            import socketserver
            import threading
-           import time
+           from functools import partial
            
            if not os.path.exists(file_path):
                return ("", False, "File not found")
            
-           # 創建臨時目錄
-           temp_dir = tempfile.mkdtemp()
-           file_name = os.path.basename(file_path)
-           temp_file_path = os.path.join(temp_dir, file_name)
+           # 複製到受管理的暫存區（同一文件重用已有副本），服務期間固定不被淘汰
+           scratch = get_scratch_space()
+           stat = os.stat(file_path)
+           key = token_fingerprint(f"{os.path.realpath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+           served_path = scratch.put_file(file_path, key)
+           file_name = os.path.basename(served_path)
            
-           # 複製文件到臨時目錄
-           shutil.copy2(file_path, temp_file_path)
+           class SingleFileHandler(http.server.SimpleHTTPRequestHandler):
+               # 只允許下載這一個文件，不列出暫存區中的其他內容
+               def send_head(self):
+                   if self.path.split("?")[0] != f"/{file_name}":
+                       self.send_error(404, "File not found")
+                       return None
+                   return super().send_head()
            
-           # 啟動簡單HTTP服務器
-           handler = http.server.SimpleHTTPRequestHandler
+           class TempServer(socketserver.ThreadingTCPServer):
+               allow_reuse_address = True
+               daemon_threads = True
            
-           def start_server():
-               os.chdir(temp_dir)
-               with socketserver.TCPServer(("", port), handler) as httpd:
-                   httpd.timeout = 300  # 5分鐘超時
-                   httpd.serve_forever()
+           # 以 directory 參數指定根目錄，不再切換整個進程的工作目錄
+           try:
+               httpd = TempServer(("", port), partial(SingleFileHandler, directory=os.path.dirname(served_path)))
+           except OSError:
+               scratch.release(served_path)
+               raise
            
-           # 在後台線程啟動服務器
-           server_thread = threading.Thread(target=start_server, daemon=True)
-           server_thread.start()
+           def serve():
+               try:
+                   httpd.serve_forever()
+               finally:
+                   httpd.server_close()
+                   scratch.release(served_path)
            
-           # 等待服務器啟動
-           time.sleep(2)
+           # 在後台線程啟動服務器，到期後關閉並解除固定
+           threading.Thread(target=serve, daemon=True).start()
+           shutdown_timer = threading.Timer(lifetime, httpd.shutdown)
+           shutdown_timer.daemon = True
+           shutdown_timer.start()
            
            # 獲取本地IP
            import socket
@@ -853,7 +1101,7 @@ class ThreadsMediaUploaderNode:
            
            media_url = f"http://{local_ip}:{port}/{file_name}"
            
-           return (media_url, True, f"Local Server (Port {port})")
+           return (media_url, True, f"Local Server (Port {port}, {lifetime}s)")
            
        except Exception as e:
            return ("", False, f"Server error: {str(e)}")
@@ -898,70 +1146,361 @@ class ThreadsMediaUploaderNode:
        except Exception as e:
            return ("", False, f"Base64 error: {str(e)}")
    
-   def upload_media(self, upload_service: str, media_file_path: str, media_type: str,
-                   imgur_client_id: str = "", custom_server_url: str = "",
-                   temp_host_service: str = "imgur_anonymous"):
+   def upload_to_s3(self, file_path: str, s3_config: dict = None) -> tuple:
        """
-       主要的媒體上傳函數
+       上傳到 S3 相容存儲（大文件自動使用並行分段上傳）
        """
        try:
-           print(f"=== 媒體上傳開始 ===")
-           print(f"服務: {upload_service}")
-           print(f"文件: {media_file_path}")
-           print(f"類型: {media_type}")
+           uploader = S3CompatibleUploader.from_config(**(s3_config or {}))
+           progress_log = []
+           media_url, success, method = uploader.upload_file(file_path, progress_log=progress_log)
+           for line in progress_log:
+               print(line)
+           return (media_url, success, method)
            
-           if not media_file_path or not os.path.exists(media_file_path):
-               return ("", False, upload_service, "❌ 文件路徑無效或文件不存在")
+       except Exception as e:
+           return ("", False, f"S3 error: {str(e)}")
+   
+   def upload_media_handle(self, media: MediaHandle, upload_service: str, imgur_client_id: str = "",
+                           custom_server_url: str = "", temp_host_service: str = "imgur_anonymous",
+                           s3_config: dict = None) -> tuple:
+       """
+       將 THREADS_MEDIA 句柄解析為託管 URL - 同一媒體在同一服務只上傳一次
+       """
+       media_store = get_media_store()
+       s3_config = s3_config or {}
+       
+       # 可重用的託管 URL 以服務配置為鍵緩存；Data URL 和本地服務器不緩存
+       if upload_service == "s3":
+           service_key = f"s3:{s3_config.get('endpoint_url', '')}/{s3_config.get('bucket', '')}"
+       elif upload_service == "temp_host":
+           service_key = f"temp_host:{temp_host_service}"
+       elif upload_service == "imgur":
+           service_key = "imgur"
+       else:
+           service_key = ""
+       
+       if service_key:
+           cached_url = media_store.get_hosted_url(media, service_key)
+           if cached_url:
+               status_message = f"✅ 使用已上傳的媒體 URL\n方法: {upload_service} (cached)\nURL: {cached_url[:100]}..."
+               print(status_message)
+               return (cached_url, True, f"{upload_service} (cached)", status_message)
+       
+       media_file_path = media_store.file_path(media)
+       
+       # 根據選擇的服務進行上傳
+       if upload_service == "imgur":
+           media_url, success, method = self.upload_to_imgur(
+               media_file_path, imgur_client_id
+           )
            
-           # 根據選擇的服務進行上傳
-           if upload_service == "imgur":
-               media_url, success, method = self.upload_to_imgur(
-                   media_file_path, imgur_client_id
+       elif upload_service == "temp_host":
+           if temp_host_service == "imgur_anonymous":
+               media_url, success, method = self.upload_to_imgur(media_file_path)
+           elif temp_host_service == "imgbb":
+               media_url, success, method = self.upload_to_imgbb(
+                   media_file_path, imgur_client_id  # 重用字段作為API密鑰
                )
+           else:
+               media_url, success, method = self.upload_to_imgur(media_file_path)
                
-           elif upload_service == "temp_host":
-               if temp_host_service == "imgur_anonymous":
-                   media_url, success, method = self.upload_to_imgur(media_file_path)
-               elif temp_host_service == "imgbb":
-                   media_url, success, method = self.upload_to_imgbb(
-                       media_file_path, imgur_client_id  # 重用字段作為API密鑰
-                   )
+       elif upload_service == "base64_embed":
+           media_url, success, method = self.create_data_url(media_file_path)
+           
+       elif upload_service == "local_server":
+           # 解析端口號
+           try:
+               if ":" in custom_server_url:
+                   port = int(custom_server_url.split(":")[-1])
                else:
-                   media_url, success, method = self.upload_to_imgur(media_file_path)
-                   
-           elif upload_service == "base64_embed":
-               media_url, success, method = self.create_data_url(media_file_path)
-               
-           elif upload_service == "local_server":
-               # 解析端口號
-               try:
-                   if ":" in custom_server_url:
-                       port = int(custom_server_url.split(":")[-1])
-                   else:
-                       port = 8000
-               except:
                    port = 8000
-                   
-               media_url, success, method = self.create_temp_server(
-                   media_file_path, port
-               )
+           except:
+               port = 8000
+               
+           media_url, success, method = self.create_temp_server(
+               media_file_path, port
+           )
+       
+       elif upload_service == "s3":
+           media_url, success, method = self.upload_to_s3(media_file_path, s3_config)
+       
+       else:
+           return ("", False, upload_service, "❌ 不支援的上傳服務")
+       
+       if success:
+           if service_key:
+               media_store.set_hosted_url(media, service_key, media_url)
+           status_message = f"✅ 媒體上傳成功!\n方法: {method}\nURL: {media_url[:100]}..."
+           print(status_message)
+           return (media_url, True, method, status_message)
+       else:
+           status_message = f"❌ 媒體上傳失敗: {method}"
+           print(status_message)
+           return ("", False, method, status_message)
+   
+   def upload_image_batch(self, images, encode_format: str, jpeg_quality: int, upload_service: str,
+                          imgur_client_id: str = "", custom_server_url: str = "",
+                          temp_host_service: str = "imgur_anonymous", s3_config: dict = None) -> tuple:
+       """
+       批量編碼並上傳 IMAGE - 編碼在進程池中進行，每張圖片編碼完成後立即提交上傳，不等待整批完成
+       """
+       from concurrent.futures import ThreadPoolExecutor
+       
+       try:
+           print(f"=== 批量圖片編碼上傳開始 ({len(images)} 張, {encode_format}) ===")
+           start_time = time.time()
+           media_store = get_media_store()
+           handles = {}
+           uploads = {}
            
-           else:
-               return ("", False, upload_service, "❌ 不支援的上傳服務")
+           with ThreadPoolExecutor(max_workers=4) as executor:
+               for encoded in encode_images(images, encode_format, jpeg_quality):
+                   handle = media_store.put_bytes(encoded.data, encoded.file_name, encoded.mime_type)
+                   handles[encoded.index] = handle
+                   uploads[encoded.index] = executor.submit(
+                       self.upload_media_handle, handle, upload_service, imgur_client_id,
+                       custom_server_url, temp_host_service, s3_config
+                   )
+                   print(f"🖼️ 第 {encoded.index + 1} 張編碼完成 ({encoded.width}x{encoded.height}, "
+                         f"{len(encoded.data) / 1024:.0f}KB, {time.time() - start_time:.2f}s)，開始上傳")
+               results = [uploads[index].result() for index in sorted(uploads)]
            
-           if success:
-               status_message = f"✅ 媒體上傳成功!\n方法: {method}\nURL: {media_url[:100]}..."
-               print(status_message)
-               return (media_url, True, method, status_message)
-           else:
-               status_message = f"❌ 媒體上傳失敗: {method}"
-               print(status_message)
-               return ("", False, method, status_message)
+           media_urls = [result[0] for result in results]
+           failed = [index for index, result in zip(sorted(uploads), results) if not result[1]]
+           methods = sorted({result[2] for result in results if result[1]})
+           status_message = (f"{'✅' if not failed else '❌'} 批量上傳完成: {len(results) - len(failed)}/{len(results)} 張 "
+                             f"({time.time() - start_time:.2f}s)")
+           for index in failed:
+               status_message += f"\n❌ 第 {index + 1} 張: {results[sorted(uploads).index(index)][3]}"
+           print(status_message)
+           return ("\n".join(media_urls), not failed, ", ".join(methods) or upload_service,
+                   status_message, handles.get(0))
+           
+       except Exception as e:
+           error_message = f"❌ 批量編碼上傳異常: {str(e)}"
+           print(error_message)
+           return ("", False, upload_service, error_message, None)
+   
+   def upload_media(self, upload_service: str, media_file_path: str, media_type: str,
+                   imgur_client_id: str = "", custom_server_url: str = "",
+                   temp_host_service: str = "imgur_anonymous",
+                   s3_endpoint_url: str = "", s3_bucket: str = "", s3_access_key: str = "",
+                   s3_secret_key: str = "", s3_region: str = "us-east-1",
+                   s3_public_base_url: str = "", media: MediaHandle = None, images=None,
+                   encode_format: str = "JPEG", jpeg_quality: int = DEFAULT_JPEG_QUALITY):
+       """
+       主要的媒體上傳函數
+       """
+       s3_config = {
+           'endpoint_url': s3_endpoint_url,
+           'bucket': s3_bucket,
+           'access_key': s3_access_key,
+           'secret_key': s3_secret_key,
+           'region': s3_region,
+           'public_base_url': s3_public_base_url,
+       }
+       if images is not None:
+           return self.upload_image_batch(images, encode_format, jpeg_quality, upload_service,
+                                          imgur_client_id, custom_server_url, temp_host_service, s3_config)
+       
+       try:
+           print(f"=== 媒體上傳開始 ===")
+           print(f"服務: {upload_service}")
+           print(f"文件: {media if media is not None else media_file_path}")
+           print(f"類型: {media_type}")
+           
+           if media is None:
+               if not media_file_path or not os.path.exists(media_file_path):
+                   return ("", False, upload_service, "❌ 文件路徑無效或文件不存在", None)
+               media = get_media_store().put_file(media_file_path)
+           
+           media_url, success, method, status_message = self.upload_media_handle(
+               media, upload_service, imgur_client_id, custom_server_url, temp_host_service, s3_config
+           )
+           return (media_url, success, method, status_message, media)
                
        except Exception as e:
            error_message = f"❌ 上傳過程異常: {str(e)}"
            print(error_message)
-           return ("", False, upload_service, error_message)
+           return ("", False, upload_service, error_message, media)
+
+
+class ThreadsMediaHandleNode:
+    """
+    媒體句柄節點 - 將本地文件登記到共享媒體存儲，輸出輕量的 THREADS_MEDIA 句柄
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "media_file_path": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+            }
+        }
+    
+    RETURN_TYPES = (THREADS_MEDIA, "STRING", "INT", "INT")
+    RETURN_NAMES = ("media", "media_info", "width", "height")
+    CATEGORY = "Social Media/Threads/Media"
+    FUNCTION = "create_handle"
+
+    @classmethod
+    def IS_CHANGED(cls, media_file_path: str = "", **kwargs):
+        # 文件內容改變（修改時間或大小）時才重新建立句柄
+        try:
+            stat = os.stat(media_file_path)
+            return f"{stat.st_mtime_ns}:{stat.st_size}"
+        except OSError:
+            return never_cached()
+
+    def create_handle(self, media_file_path: str):
+        """
+        創建媒體句柄（不複製、不上傳，只計算元數據）
+        """
+        try:
+            if not media_file_path or not os.path.exists(media_file_path):
+                return (None, "❌ 文件路徑無效或文件不存在", 0, 0)
+            
+            media = get_media_store().put_file(media_file_path)
+            media_info = media.describe()
+            print(f"📎 媒體句柄已創建:\n{media_info}")
+            return (media, media_info, media.width, media.height)
+            
+        except Exception as e:
+            error_message = f"❌ 創建媒體句柄異常: {str(e)}"
+            print(error_message)
+            return (None, error_message, 0, 0)
+
+
+def resolve_me_user_id(access_token: str) -> str:
+    """
+    解析權杖對應的真實用戶 ID（與其他節點共用 /me 請求），失敗時返回空字符串
+    """
+    response = fetch_me("https://graph.threads.net/v1.0", access_token, 'id', DEFAULT_CACHE_TTL)
+    if response.status_code != 200:
+        return ""
+    return response.json().get('id', '')
+
+
+class ThreadsImageDedupeNode:
+    """
+    圖片近似重複過濾節點 - 整批計算感知雜湊，去掉與已發布圖片或同批次較早圖片過於相似的圖片
+    """
+    
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "threads_user_id": ("STRING", {
+                    "default": "me",
+                    "multiline": False
+                }),
+                "dedupe_threshold": ("INT", {
+                    "default": DEFAULT_DEDUPE_THRESHOLD,
+                    "min": 0,
+                    "max": 32
+                }),
+                "hash_method": (list(HASH_METHODS), {
+                    "default": "phash"
+                }),
+            },
+            "optional": {
+                # 每行一個圖片路徑或目錄
+                "media_paths": ("STRING", {
+                    "multiline": True,
+                    "default": ""
+                }),
+                "images": ("IMAGE",),
+                # threads_user_id 為 "me" 時用於解析真實帳戶
+                "access_token": ("STRING", {
+                    "multiline": False,
+                    "default": ""
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "IMAGE", "STRING")
+    RETURN_NAMES = ("kept_paths", "kept_images", "report")
+    CATEGORY = "Social Media/Threads/Media"
+    FUNCTION = "filter_duplicates"
+    
+    # 結果取決於不斷增長的已發布圖片索引
+    IS_CHANGED = classmethod(never_cached)
+    
+    def filter_duplicates(self, threads_user_id: str, dedupe_threshold: int, hash_method: str,
+                          media_paths: str = "", images=None, access_token: str = ""):
+        """
+        過濾一批圖片中的近似重複
+        IMAGE 批次全部重複時 kept_images 輸出原批次（ComfyUI 不接受空的圖片批次），報告中明確標示
+        """
+        try:
+            paths = []
+            for line in media_paths.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                if os.path.isdir(line):
+                    paths.extend(sorted(
+                        os.path.join(line, name) for name in os.listdir(line)
+                        if name.lower().endswith(self.IMAGE_EXTENSIONS)
+                    ))
+                else:
+                    paths.append(line)
+            
+            sources = list(paths)
+            if images is not None:
+                # ComfyUI 的 IMAGE 是 (B, H, W, C) 的 0-1 浮點張量
+                array = images.cpu().numpy() if hasattr(images, "cpu") else images
+                sources.extend(array[i] for i in range(len(array)))
+            if not sources:
+                return ("", images, "❌ 沒有提供圖片")
+            
+            try:
+                account = index_account_key(threads_user_id.strip(), access_token.strip(), resolve_me_user_id)
+            except ValueError as e:
+                return ("", images, f"❌ {str(e)}")
+            
+            start_time = time.time()
+            verdicts = filter_batch(sources, account, dedupe_threshold, hash_method)
+            elapsed = time.time() - start_time
+            
+            kept = [verdict["index"] for verdict in verdicts if not verdict["duplicate_of"]]
+            kept_paths = [paths[i] for i in kept if i < len(paths)]
+            kept_images = images
+            all_images_duplicate = False
+            if images is not None:
+                kept_image_indices = [i - len(paths) for i in kept if i >= len(paths)]
+                if kept_image_indices:
+                    kept_images = images[kept_image_indices]
+                else:
+                    all_images_duplicate = True
+            
+            names = paths + [f"image[{i}]" for i in range(len(sources) - len(paths))]
+            report = [f"🔍 近似重複過濾: {len(sources)} 張圖片，保留 {len(kept)} 張 ({elapsed * 1000:.0f}ms)"]
+            if all_images_duplicate:
+                report.append("⚠️ IMAGE 批次全部為近似重複，kept_images 輸出原批次（空批次無法傳給下游節點），請勿直接發布")
+            for verdict in verdicts:
+                if verdict["hashes"] is None:
+                    report.append(f"⚠️ {os.path.basename(names[verdict['index']])}: 無法讀取，已保留")
+                elif verdict["duplicate_of"]:
+                    duplicate_of = verdict["duplicate_of"]
+                    if duplicate_of.startswith("batch:"):
+                        duplicate_of = os.path.basename(names[int(duplicate_of[6:])])
+                    report.append(f"⏭️ {os.path.basename(names[verdict['index']])} ≈ {duplicate_of} "
+                                  f"(距離 {verdict['distance']})")
+            report_text = "\n".join(report)
+            print(report_text)
+            return ("\n".join(kept_paths), kept_images, report_text)
+            
+        except Exception as e:
+            error_message = f"❌ 近似重複過濾異常: {str(e)}"
+            print(error_message)
+            return (media_paths, images, error_message)
 
 
 class ThreadsAllInOneNode:
@@ -1044,36 +1583,104 @@ class ThreadsAllInOneNode:
                     "min": 1,
                     "max": 30
                 }),
-            }
-        }
-    
-    RETURN_TYPES = ("STRING", "STRING", "BOOLEAN", "STRING", "STRING", "STRING", "STRING")
-    RETURN_NAMES = ("post_id", "permalink", "success", "status_message", "media_url_used", "processing_log", "final_token")
-    CATEGORY = "Social Media/Threads"
-    FUNCTION = "publish_all_in_one"
-    
-    def __init__(self):
-        self.api_version = "v1.0"
-        self.base_url = f"https://graph.threads.net/{self.api_version}"
-        self.media_uploader = ThreadsMediaUploaderNode()
-        self.token_manager = ThreadsTokenManagerNode()
-    
-    def handle_api_error_with_token_refresh(self, response, current_token: str, client_secret: str, 
-                                          auto_refresh: bool) -> tuple:
-        """
-        處理API錯誤並嘗試權杖重新整理
-        """
-        if response.status_code == 190 and auto_refresh and client_secret:
-            print("🔄 檢測到權杖過期，嘗試自動重新整理...")
-            
-            new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
-            
-            if refresh_success:
-                print(f"✅ 權杖重新整理成功，新的有效期: {expires_days} 天")
-                return (new_token, True, f"權杖已自動重新整理: {expires_days} 天有效期")
-            else:
-                print(f"❌ 權杖重新整理失敗: {refresh_message}")
-                return (current_token, False, f"權杖重新整理失敗: {refresh_message}")
+                
+                # S3 相容存儲配置（留空時使用 THREADS_S3_* 環境變數）
+                "s3_endpoint_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_bucket": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_access_key": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_secret_key": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_region": ("STRING", {
+                    "default": "us-east-1",
+                    "multiline": False
+                }),
+                "s3_public_base_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                
+                # 共享媒體句柄（在創建容器時才解析為託管 URL）
+                "media": (THREADS_MEDIA,),
+                
+                # 長文本自動拆分為串文
+                "auto_thread": ("BOOLEAN", {
+                    "default": False
+                }),
+                # reply_to_root: 所有後續段落回覆第一篇，容器創建與發布流水線並行
+                # reply_chain: 每段回覆上一段，必須逐段串行
+                "thread_mode": (["reply_to_root", "reply_chain"], {
+                    "default": "reply_to_root"
+                }),
+                "thread_numbering": ("BOOLEAN", {
+                    "default": True
+                }),
+                # 只做離線預檢，不上傳、不發出任何網絡請求
+                "dry_run": ("BOOLEAN", {
+                    "default": False
+                }),
+                # 發布前檢查提供的 media_url 是否可達、類型和大小是否符合限制
+                "precheck_media_url": ("BOOLEAN", {
+                    "default": True
+                }),
+                # 加入持久化發布隊列，由獨立的工作進程發布，節點立即返回
+                "use_publish_queue": ("BOOLEAN", {
+                    "default": False
+                }),
+                # 與此帳戶已發布的圖片比較感知雜湊，flag 只記錄，skip 跳過近似重複的圖片
+                "dedupe_mode": (list(DEDUPE_MODES), {
+                    "default": "off"
+                }),
+                "dedupe_threshold": ("INT", {
+                    "default": DEFAULT_DEDUPE_THRESHOLD,
+                    "min": 0,
+                    "max": 32
+                }),
+                # 直接發布 ComfyUI 生成的圖片（批次中的第一張），編碼為 JPEG
+                "image": ("IMAGE",),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "BOOLEAN", "STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("post_id", "permalink", "success", "status_message", "media_url_used", "processing_log", "final_token")
+    CATEGORY = "Social Media/Threads"
+    FUNCTION = "publish_all_in_one"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    def __init__(self):
+        self.api_version = "v1.0"
+        self.base_url = f"https://graph.threads.net/{self.api_version}"
+        self.media_uploader = ThreadsMediaUploaderNode()
+        self.token_manager = ThreadsTokenManagerNode()
+    
+    def handle_api_error_with_token_refresh(self, response, current_token: str, client_secret: str, 
+                                          auto_refresh: bool) -> tuple:
+        """
+        處理API錯誤並嘗試權杖重新整理
+        """
+        if response.status_code == 190 and auto_refresh and client_secret:
+            print("🔄 檢測到權杖過期，嘗試自動重新整理...")
+            
+            new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
+            
+            if refresh_success:
+                print(f"✅ 權杖重新整理成功，新的有效期: {expires_days} 天")
+                return (new_token, True, f"權杖已自動重新整理: {expires_days} 天有效期")
+            else:
+                print(f"❌ 權杖重新整理失敗: {refresh_message}")
+                return (current_token, False, f"權杖重新整理失敗: {refresh_message}")
         else:
             return (current_token, False, f"API 錯誤: {response.status_code} - {response.text}")
     
@@ -1105,37 +1712,28 @@ class ThreadsAllInOneNode:
     def wait_for_container_ready(self, container_id: str, access_token: str, 
                                 timeout: int = 60, check_interval: int = 5) -> tuple:
         """
-        等待容器準備完成（主要用於視頻）
+        等待容器準備完成（主要用於視頻）- 由進程級輪詢器與其他容器合併檢查
         """
-        import time
-        
-        start_time = time.time()
         processing_log = []
         
         processing_log.append(f"⏳ 等待容器準備完成（最多 {timeout} 秒）...")
         
-        while time.time() - start_time < timeout:
-            success, status, error_message = self.check_container_status(container_id, access_token)
-            
-            if not success:
-                processing_log.append(f"❌ 狀態檢查失敗: {error_message}")
-                return (False, processing_log, error_message)
-            
+        watch = get_status_poller(self.base_url).wait(container_id, access_token, timeout, check_interval)
+        
+        for status in watch.history:
             processing_log.append(f"📊 容器狀態: {status}")
-            
-            if status == 'FINISHED':
-                processing_log.append("✅ 容器準備完成！")
-                return (True, processing_log, "容器準備完成")
-            elif status == 'ERROR':
-                error_msg = f"❌ 容器處理錯誤: {error_message}"
-                processing_log.append(error_msg)
-                return (False, processing_log, error_msg)
-            elif status in ['IN_PROGRESS', 'PROCESSING']:
-                processing_log.append(f"⏳ 容器正在處理中，{check_interval} 秒後重新檢查...")
-                time.sleep(check_interval)
-            else:
-                processing_log.append(f"⚠️ 未知狀態: {status}，繼續等待...")
-                time.sleep(check_interval)
+        
+        if not watch.success:
+            processing_log.append(f"❌ 狀態檢查失敗: {watch.error_message}")
+            return (False, processing_log, watch.error_message)
+        
+        if watch.status in ('FINISHED', 'PUBLISHED'):
+            processing_log.append("✅ 容器準備完成！")
+            return (True, processing_log, "容器準備完成")
+        elif watch.status in ('ERROR', 'EXPIRED'):
+            error_msg = f"❌ 容器處理錯誤: {watch.error_message or watch.status}"
+            processing_log.append(error_msg)
+            return (False, processing_log, error_msg)
         
         timeout_msg = f"⏰ 等待超時（{timeout} 秒），容器可能仍在處理中"
         processing_log.append(timeout_msg)
@@ -1238,7 +1836,8 @@ class ThreadsAllInOneNode:
     def create_threads_container_with_retry(self, threads_user_id: str, access_token: str,
                                           media_type: str, text: str, media_url: str = "",
                                           auto_refresh: bool = True, client_secret: str = "",
-                                          video_check_timeout: int = 60, video_check_interval: int = 5) -> tuple:
+                                          video_check_timeout: int = 60, video_check_interval: int = 5,
+                                          reply_to_id: str = "") -> tuple:
         """
         創建 Threads 容器並支援重試 - 增強視頻支援
         """
@@ -1283,6 +1882,9 @@ class ThreadsAllInOneNode:
                 if text.strip():
                     params['text'] = text
             
+            if reply_to_id:
+                params['reply_to_id'] = reply_to_id
+            
             processing_log.append(f"創建容器 URL: {url}")
             processing_log.append(f"創建容器參數: {dict(params, access_token='[HIDDEN]')}")
             
@@ -1331,87 +1933,253 @@ class ThreadsAllInOneNode:
                                            auto_refresh: bool = True, client_secret: str = "") -> tuple:
         """
         發布 Threads 容器並支援重試 - Step 2: 發布容器
+        優先使用此帳戶記錄的可用發布端點，端點形式不被接受時作廢記錄並回退到另一個端點
         """
         try:
             processing_log = []
             processing_log.append("🚀 開始發布容器...")
             
-            url = f"{self.base_url}/me/threads_publish"
             current_token = access_token
-            
-            data = {
-                'creation_id': creation_id,
-                'access_token': current_token
-            }
-            
+            capabilities = get_capability_cache()
+            capability_key = account_key(current_token, resolve_me_user_id)
             headers = {
                 'Content-Type': 'application/x-www-form-urlencoded'
             }
+            error_msg = "發布失敗"
             
-            processing_log.append(f"發布容器 URL: {url}")
-            processing_log.append(f"發布容器數據: {dict(data, access_token='[HIDDEN]')}")
-            
-            response = requests.post(url, data=data, headers=headers, timeout=30)
-            processing_log.append(f"發布響應: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                processing_log.append(f"✅ 發布成功: {result}")
-                return (result, current_token, "發布成功", processing_log)
+            for method in capabilities.order(capability_key, (THREADS_PUBLISH, CONTAINER_PUBLISH)):
+                url, data = build_publish_request(method, self.base_url, creation_id, current_token)
                 
-            elif response.status_code == 190:  # 權杖過期
-                new_token, refresh_success, refresh_message = self.handle_api_error_with_token_refresh(
-                    response, current_token, client_secret, auto_refresh
-                )
+                processing_log.append(f"發布容器 URL: {url} ({method})")
+                processing_log.append(f"發布容器數據: {dict(data, access_token='[HIDDEN]')}")
                 
-                if refresh_success:
-                    processing_log.append("✅ 權杖重新整理成功，重試發布...")
-                    # 使用新權杖重試
-                    data['access_token'] = new_token
-                    retry_response = requests.post(url, data=data, headers=headers, timeout=30)
+                response = requests.post(url, data=data, headers=headers, timeout=30)
+                processing_log.append(f"發布響應: {response.status_code}")
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    capabilities.remember(capability_key, method)
+                    processing_log.append(f"✅ 發布成功: {result}")
+                    return (result, current_token, "發布成功", processing_log)
                     
-                    if retry_response.status_code == 200:
-                        result = retry_response.json()
-                        processing_log.append(f"✅ 使用新權杖發布成功: {result}")
-                        return (result, new_token, f"權杖已重新整理，發布成功", processing_log)
+                elif response.status_code == 190:  # 權杖過期
+                    new_token, refresh_success, refresh_message = self.handle_api_error_with_token_refresh(
+                        response, current_token, client_secret, auto_refresh
+                    )
+                    
+                    if refresh_success:
+                        processing_log.append("✅ 權杖重新整理成功，重試發布...")
+                        # 使用新權杖重試
+                        data['access_token'] = new_token
+                        retry_response = requests.post(url, data=data, headers=headers, timeout=30)
+                        
+                        if retry_response.status_code == 200:
+                            result = retry_response.json()
+                            capabilities.remember(account_key(new_token, resolve_me_user_id), method)
+                            processing_log.append(f"✅ 使用新權杖發布成功: {result}")
+                            return (result, new_token, f"權杖已重新整理，發布成功", processing_log)
+                        else:
+                            processing_log.append(f"❌ 使用新權杖重試失敗: {retry_response.text}")
+                            return (None, new_token, f"使用新權杖重試失敗: {retry_response.text}", processing_log)
                     else:
-                        processing_log.append(f"❌ 使用新權杖重試失敗: {retry_response.text}")
-                        return (None, new_token, f"使用新權杖重試失敗: {retry_response.text}", processing_log)
+                        processing_log.append(f"❌ 權杖重新整理失敗: {refresh_message}")
+                        return (None, current_token, refresh_message, processing_log)
                 else:
-                    processing_log.append(f"❌ 權杖重新整理失敗: {refresh_message}")
-                    return (None, current_token, refresh_message, processing_log)
-            else:
-                error_msg = f"發布失敗: {response.status_code} - {response.text}"
-                processing_log.append(f"❌ {error_msg}")
-                return (None, current_token, error_msg, processing_log)
+                    error_msg = f"發布失敗: {response.status_code} - {response.text}"
+                    processing_log.append(f"❌ {error_msg}")
+                    if not is_endpoint_shape_error(response):
+                        # 限流、服務器錯誤、容器未就緒等與端點無關，保留記錄，不換端點重試
+                        return (None, current_token, error_msg, processing_log)
+                    capabilities.invalidate(capability_key, method)
+                    processing_log.append(f"⚠️ 發布端點 {method} 不被接受，嘗試下一個端點")
+            
+            return (None, current_token, error_msg, processing_log)
                 
         except Exception as e:
             error_msg = f"發布異常: {str(e)}"
             processing_log.append(f"❌ {error_msg}")
             return (None, current_token, error_msg, processing_log)
     
+    def publish_thread_replies(self, threads_user_id: str, access_token: str, parts: list, root_post_id: str,
+                               thread_mode: str = "reply_to_root", auto_refresh: bool = True,
+                               client_secret: str = "", pipeline_depth: int = 3) -> tuple:
+        """
+        將拆分後的段落作為回覆發布，返回 (reply_ids, token, error_message, log)
+        reply_to_root 模式下後續容器在背景預先創建，與前一段的發布重疊；發布仍按順序進行以保持串文順序
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        processing_log = []
+        reply_ids = []
+        current_token = access_token
+        
+        if thread_mode == "reply_chain":
+            # 每段的 reply_to_id 是上一段發布後的帖子 ID，無法預先創建
+            previous_id = root_post_id
+            for index, part in enumerate(parts, 2):
+                creation_id, current_token, create_message, container_log = self.create_threads_container_with_retry(
+                    threads_user_id, current_token, "TEXT", part, "", auto_refresh, client_secret,
+                    reply_to_id=previous_id
+                )
+                processing_log.extend(container_log)
+                if not creation_id:
+                    return (reply_ids, current_token, f"第 {index} 段容器創建失敗: {create_message}", processing_log)
+                
+                publish_result, current_token, publish_message, publish_log = self.publish_threads_container_with_retry(
+                    creation_id, current_token, auto_refresh, client_secret
+                )
+                processing_log.extend(publish_log)
+                if not publish_result:
+                    return (reply_ids, current_token, f"第 {index} 段發布失敗: {publish_message}", processing_log)
+                
+                previous_id = publish_result.get('id', '')
+                reply_ids.append(previous_id)
+                processing_log.append(f"🧵 第 {index}/{len(parts) + 1} 段已發布: {previous_id}")
+            return (reply_ids, current_token, "", processing_log)
+        
+        with ThreadPoolExecutor(max_workers=max(1, pipeline_depth)) as executor:
+            futures = [
+                executor.submit(
+                    self.create_threads_container_with_retry,
+                    threads_user_id, current_token, "TEXT", part, "", auto_refresh, client_secret,
+                    reply_to_id=root_post_id
+                )
+                for part in parts
+            ]
+            try:
+                for index, future in enumerate(futures, 2):
+                    creation_id, updated_token, create_message, container_log = future.result()
+                    processing_log.extend(container_log)
+                    current_token = updated_token or current_token
+                    if not creation_id:
+                        return (reply_ids, current_token, f"第 {index} 段容器創建失敗: {create_message}", processing_log)
+                    
+                    publish_result, current_token, publish_message, publish_log = self.publish_threads_container_with_retry(
+                        creation_id, current_token, auto_refresh, client_secret
+                    )
+                    processing_log.extend(publish_log)
+                    if not publish_result:
+                        return (reply_ids, current_token, f"第 {index} 段發布失敗: {publish_message}", processing_log)
+                    
+                    reply_ids.append(publish_result.get('id', ''))
+                    processing_log.append(f"🧵 第 {index}/{len(parts) + 1} 段已發布: {reply_ids[-1]}")
+            finally:
+                # 中途失敗時不再創建剩餘的容器
+                for future in futures:
+                    future.cancel()
+        
+        return (reply_ids, current_token, "", processing_log)
+    
+    def check_duplicate_image(self, media: MediaHandle, account: str, threshold: int) -> tuple:
+        """
+        計算圖片的感知雜湊並在帳戶的已發布圖片索引中查找，返回 (hashes, 訊息)；重複時訊息以 ⏭️ 開頭
+        account 為 index_account_key 返回的帳戶鍵
+        """
+        try:
+            hashes = compute_hashes([get_media_store().file_path(media)])[0]
+        except Exception as e:
+            return (None, f"⚠️ 無法計算圖片雜湊，略過重複檢查: {str(e)}")
+        if hashes is None:
+            return (None, "⚠️ 無法讀取圖片，略過重複檢查")
+        match = get_image_hash_index().lookup(account, hashes, threshold)
+        if match:
+            return (hashes, f"⏭️ 與已發布的帖子 {match[1]} 近似重複 (漢明距離 {match[0]})")
+        return (hashes, "✅ 未發現近似重複的已發布圖片")
+    
+    def enqueue_to_publish_queue(self, payload: dict, media: MediaHandle = None):
+        """
+        將發布參數加入持久化隊列；媒體句柄只存在於當前進程，先複製到數據目錄供工作進程讀取
+        """
+        try:
+            media_source = None
+            if media is not None and payload["post_type"] != "TEXT_ONLY" and not payload["media_url"]:
+                # 複製媒體與寫入任務在同一事務內完成，避免工作進程在兩者之間刪除同內容的隊列媒體
+                media_source = (get_media_store().file_path(media), media.sha256)
+                payload["auto_upload"] = True
+            job_id = enqueue_publish(payload, label=f"all_in_one {payload['post_type']}", media_source=media_source)
+            status_message = f"📥 已加入發布隊列 #{job_id}，將由工作進程發布"
+            print(status_message)
+            return ("", "", True, status_message, payload["media_url"],
+                    json.dumps({"queue_job_id": job_id}), payload["access_token"])
+        except Exception as e:
+            error_msg = f"❌ 加入發布隊列失敗: {str(e)}"
+            print(error_msg)
+            return ("", "", False, error_msg, "", error_msg, payload["access_token"])
+    
     def publish_all_in_one(self, access_token: str, text: str, threads_user_id: str, post_type: str,
                           media_file_path: str = "", media_url: str = "", auto_upload: bool = True,
                           upload_service: str = "imgur", auto_refresh_token: bool = True,
                           client_secret: str = "", imgur_client_id: str = "",
                           auto_optimize: bool = True, max_file_size_mb: float = 10.0,
-                          video_check_timeout: int = 60, video_check_interval: int = 5):
+                          video_check_timeout: int = 60, video_check_interval: int = 5,
+                          s3_endpoint_url: str = "", s3_bucket: str = "", s3_access_key: str = "",
+                          s3_secret_key: str = "", s3_region: str = "us-east-1",
+                          s3_public_base_url: str = "", media: MediaHandle = None,
+                          auto_thread: bool = False, thread_mode: str = "reply_to_root",
+                          thread_numbering: bool = True, dry_run: bool = False,
+                          precheck_media_url: bool = True, use_publish_queue: bool = False,
+                          dedupe_mode: str = "off", dedupe_threshold: int = DEFAULT_DEDUPE_THRESHOLD,
+                          image=None):
         """
         一體化發布函數 - 支援長期權杖自動管理和增強的視頻發布
         """
+        if image is not None and media is None and not media_url and post_type == "IMAGE_POST":
+            # auto_optimize 時縮小到 Threads 的最大顯示寬度再編碼
+            encoded = next(encode_images(image[:1], "JPEG",
+                                         max_width=DEFAULT_MAX_WIDTH if auto_optimize else 0))
+            media = get_media_store().put_bytes(encoded.data, encoded.file_name, encoded.mime_type)
+        
+        if use_publish_queue and not dry_run:
+            return self.enqueue_to_publish_queue(dict(
+                access_token=access_token, text=text, threads_user_id=threads_user_id, post_type=post_type,
+                media_file_path=media_file_path, media_url=media_url, auto_upload=auto_upload,
+                upload_service=upload_service, auto_refresh_token=auto_refresh_token,
+                client_secret=client_secret, imgur_client_id=imgur_client_id, auto_optimize=auto_optimize,
+                max_file_size_mb=max_file_size_mb, video_check_timeout=video_check_timeout,
+                video_check_interval=video_check_interval, s3_endpoint_url=s3_endpoint_url,
+                s3_bucket=s3_bucket, s3_access_key=s3_access_key, s3_secret_key=s3_secret_key,
+                s3_region=s3_region, s3_public_base_url=s3_public_base_url, auto_thread=auto_thread,
+                thread_mode=thread_mode, thread_numbering=thread_numbering,
+                precheck_media_url=precheck_media_url, dedupe_mode=dedupe_mode,
+                dedupe_threshold=dedupe_threshold
+            ), media)
+        
+        if dry_run:
+            # 預檢結果以 JSON 放在 processing_log 輸出中
+            verdict = preflight_post(
+                access_token, text, {"IMAGE_POST": "IMAGE", "VIDEO_POST": "VIDEO"}.get(post_type, "TEXT"),
+                threads_user_id, media_file_path if auto_upload else "", media_url, media,
+                max_file_size_mb, auto_thread
+            )
+            status_message = format_verdict(verdict)
+            print(status_message)
+            return ("", "", verdict["ok"], status_message, media_url,
+                    json.dumps(verdict, ensure_ascii=False), access_token)
+        
         try:
             processing_log = ["=== Threads 一體化發布開始（增強視頻支援）==="]
             processing_log.append(f"發布類型: {post_type}")
-            processing_log.append(f"文本長度: {len(text)} 字符")
+            processing_log.append(f"文本長度: {threads_length(text)} 字符")
             processing_log.append(f"自動權杖重新整理: {auto_refresh_token}")
             
+            current_token = access_token
+            media_url_used = ""
+            
+            # 超過字數限制時在本地提前處理，避免遠端創建容器失敗
+            thread_parts = []
+            if threads_length(text) > THREADS_TEXT_LIMIT:
+                if not auto_thread:
+                    error_msg = f"❌ 文本超過 Threads {THREADS_TEXT_LIMIT} 字符限制，請啟用 auto_thread 自動拆分為串文"
+                    processing_log.append(error_msg)
+                    return ("", "", False, error_msg, "", "\n".join(processing_log), current_token)
+                thread_parts = split_for_threads(text, THREADS_TEXT_LIMIT, thread_numbering)
+                text = thread_parts.pop(0)
+                processing_log.append(f"🧵 長文本已拆分為 {len(thread_parts) + 1} 段 ({thread_mode})")
+            
             if post_type == "VIDEO_POST":
                 processing_log.append(f"視頻檢查超時: {video_check_timeout} 秒")
                 processing_log.append(f"視頻檢查間隔: {video_check_interval} 秒")
             
-            current_token = access_token
-            media_url_used = ""
-            
             # 先驗證權杖
             if auto_refresh_token:
                 processing_log.append("\n🔐 權杖驗證階段")
@@ -1436,31 +2204,40 @@ class ThreadsAllInOneNode:
                     media_url_used = media_url
                     processing_log.append(f"使用提供的媒體URL: {media_url[:50]}...")
                     
-                elif media_file_path and auto_upload:
-                    processing_log.append(f"處理本地文件: {media_file_path}")
-                    
-                    # 上傳文件
-                    processing_log.append(f"📤 使用 {upload_service} 上傳...")
+                    if precheck_media_url:
+                        url_check = check_media_url(media_url, media_type)
+                        processing_log.append(format_url_check(url_check))
+                        if not url_check['ok']:
+                            error_msg = f"❌ 媒體 URL 預檢失敗: {'; '.join(url_check['errors'])}"
+                            return ("", "", False, error_msg, media_url, "\n".join(processing_log), current_token)
                     
-                    upload_result = self.media_uploader.upload_media(
-                        upload_service, media_file_path, media_type, imgur_client_id
-                    )
+                elif media is not None:
+                    processing_log.append(f"使用媒體句柄: {media.file_name} ({media.mime_type}, {media.size} bytes)")
                     
-                    media_url_result, upload_success, upload_method, upload_message = upload_result
+                elif media_file_path and auto_upload:
+                    processing_log.append(f"處理本地文件: {media_file_path}")
                     
-                    if upload_success:
-                        media_url_used = media_url_result
-                        processing_log.append(f"✅ 上傳成功: {upload_method}")
-                    else:
-                        error_msg = f"❌ 上傳失敗: {upload_message}"
+                    if not os.path.exists(media_file_path):
+                        error_msg = "❌ 上傳失敗: 文件路徑無效或文件不存在"
                         processing_log.append(error_msg)
                         return ("", "", False, error_msg, "", "\n".join(processing_log), current_token)
+                    
+                    media = get_media_store().put_file(media_file_path)
                         
                 else:
                     error_msg = f"❌ {post_type} 需要提供媒體文件或URL"
                     processing_log.append(error_msg)
                     return ("", "", False, error_msg, "", "\n".join(processing_log), current_token)
             
+            # 近似重複過濾（只適用於本地圖片；直接提供的 URL 不下載比較）
+            image_hashes = None
+            if dedupe_mode != "off" and post_type == "IMAGE_POST" and not media_url_used and media is not None:
+                dedupe_account = index_account_key(threads_user_id, current_token, resolve_me_user_id)
+                image_hashes, duplicate_message = self.check_duplicate_image(media, dedupe_account, dedupe_threshold)
+                processing_log.append(duplicate_message)
+                if dedupe_mode == "skip" and duplicate_message.startswith("⏭️"):
+                    return ("", "", False, duplicate_message, "", "\n".join(processing_log), current_token)
+            
             # 發布到 Threads
             processing_log.append(f"\n🚀 Threads 發布階段")
             
@@ -1472,6 +2249,29 @@ class ThreadsAllInOneNode:
             elif post_type == "VIDEO_POST":
                 media_type = "VIDEO"
             
+            # 媒體句柄延遲到創建容器前才解析為託管 URL
+            if media_type in ('IMAGE', 'VIDEO') and not media_url_used and media is not None:
+                processing_log.append(f"📤 使用 {upload_service} 上傳...")
+                
+                media_url_result, upload_success, upload_method, upload_message = self.media_uploader.upload_media_handle(
+                    media, upload_service, imgur_client_id, s3_config={
+                        'endpoint_url': s3_endpoint_url,
+                        'bucket': s3_bucket,
+                        'access_key': s3_access_key,
+                        'secret_key': s3_secret_key,
+                        'region': s3_region,
+                        'public_base_url': s3_public_base_url,
+                    }
+                )
+                
+                if upload_success:
+                    media_url_used = media_url_result
+                    processing_log.append(f"✅ 上傳成功: {upload_method}")
+                else:
+                    error_msg = f"❌ 上傳失敗: {upload_message}"
+                    processing_log.append(error_msg)
+                    return ("", "", False, error_msg, "", "\n".join(processing_log), current_token)
+            
             # 創建容器
             processing_log.append("📝 創建發布容器...")
             creation_id, updated_token, create_message, container_log = self.create_threads_container_with_retry(
@@ -1509,11 +2309,33 @@ class ThreadsAllInOneNode:
             processing_log.append(f"✅ 發布成功!")
             processing_log.append(f"帖子 ID: {post_id}")
             processing_log.append(f"鏈接: {permalink}")
+            record_published_post(post_id, threads_user_id, media_type, "all_in_one", text, media_url_used)
+            if image_hashes:
+                get_image_hash_index().add(dedupe_account, post_id, image_hashes)
+            
+            reply_ids = []
+            if thread_parts:
+                processing_log.append(f"\n🧵 串文發布階段 ({len(thread_parts)} 段回覆)")
+                reply_ids, final_token, thread_error, thread_log = self.publish_thread_replies(
+                    threads_user_id, final_token, thread_parts, post_id, thread_mode,
+                    auto_refresh_token, client_secret
+                )
+                processing_log.extend(thread_log)
+                for reply_id, part in zip(reply_ids, thread_parts):
+                    record_published_post(reply_id, threads_user_id, "TEXT", "auto_thread", part)
+                
+                if thread_error:
+                    # 第一篇已發布，返回其 ID 以便後續處理
+                    error_msg = f"❌ 串文未完整發布 ({len(reply_ids) + 1}/{len(thread_parts) + 1}): {thread_error}"
+                    processing_log.append(error_msg)
+                    return (post_id, permalink, False, error_msg, media_url_used, "\n".join(processing_log), final_token)
             
             if final_token != access_token:
                 processing_log.append("🔄 權杖已在發布過程中自動重新整理")
             
             success_message = f"✅ 成功發布到 Threads!\n帖子類型: {post_type}\n帖子 ID: {post_id}"
+            if reply_ids:
+                success_message += f"\n🧵 串文共 {len(reply_ids) + 1} 段"
             if media_url_used:
                 success_message += f"\n媒體URL: {media_url_used[:50]}..."
             if final_token != access_token:
@@ -1532,102 +2354,776 @@ class ThreadsAllInOneNode:
             return ("", "", False, error_message, media_url_used, "\n".join(processing_log), current_token)
 
 
-class ThreadsUserInfoNode:
-   """
-   獲取 Threads 用戶信息的節點 - 支援長期權杖
-   """
-   
-   @classmethod
-   def INPUT_TYPES(cls):
-       return {
-           "required": {
-               "access_token": ("STRING", {
-                   "default": "",
-                   "multiline": False
-               }),
-           },
-           "optional": {
-               "auto_refresh_token": ("BOOLEAN", {
-                   "default": True
-               }),
-               "client_secret": ("STRING", {
-                   "default": "",
-                   "multiline": False
-               }),
-           }
-       }
-   
-   RETURN_TYPES = ("STRING", "STRING", "STRING", "BOOLEAN", "STRING", "STRING")
-   RETURN_NAMES = ("user_id", "username", "user_info", "success", "message", "refreshed_token")
-   CATEGORY = "Social Media/Threads"
-   FUNCTION = "get_user_info"
-   
-   def __init__(self):
-       self.api_version = "v1.0"
-       self.base_url = f"https://graph.threads.net/{self.api_version}"
-       self.token_manager = ThreadsTokenManagerNode()
-   
-   def get_user_info(self, access_token: str, auto_refresh_token: bool = True, client_secret: str = ""):
-       """
-       獲取用戶信息 - 支援權杖自動重新整理
-       """
-       try:
-           if not access_token or access_token.strip() == "":
-               return ("", "", "", False, "請提供有效的 Access Token", access_token)
-           
-           print("獲取 Threads 用戶信息...")
-           current_token = access_token
-           
-           # 獲取用戶基本信息
-           url = f"{self.base_url}/me"
-           params = {
-               'fields': 'id,username,name,threads_profile_picture_url,threads_biography',
-               'access_token': current_token
-           }
-           
-           print(f"請求 URL: {url}")
-           print(f"請求參數: {dict(params, access_token='[HIDDEN]')}")
-           
-           response = requests.get(url, params=params, timeout=30)
-           
-           print(f"響應狀態: {response.status_code}")
-           print(f"響應內容: {response.text}")
-           
-           if response.status_code == 200:
-               user_data = response.json()
-               
-               user_id = user_data.get('id', '')
-               username = user_data.get('username', '')
-               name = user_data.get('name', '')
-               
-               # 格式化用戶信息
-               user_info_lines = [
-                   f"用戶 ID: {user_id}",
-                   f"用戶名: @{username}",
-                   f"顯示名稱: {name}",
-               ]
-               
-               if 'threads_profile_picture_url' in user_data:
-                   user_info_lines.append(f"頭像 URL: {user_data['threads_profile_picture_url']}")
-               
-               if 'threads_biography' in user_data:
-                   bio = user_data['threads_biography']
-                   if bio:
-                       user_info_lines.append(f"簡介: {bio}")
-               
-               user_info = "\n".join(user_info_lines)
-               
-               success_message = f"✅ 成功獲取用戶信息\n用戶ID: {user_id}\n用戶名: @{username}"
-               
-               print(success_message)
-               return (user_id, username, user_info, True, success_message, current_token)
-               
-           elif response.status_code == 190:  # 權杖過期
-               if auto_refresh_token and client_secret:
-                   print("🔄 權杖過期，嘗試自動重新整理...")
-                   
-                   new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
-                   
+class ThreadsFanOutPublishNode:
+    """
+    多帳戶分發發布節點 - 媒體只上傳一次，然後並行為每個帳戶創建、檢查和發布容器
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                # 每行一個帳戶: threads_user_id,access_token[,client_secret]
+                "accounts": ("STRING", {
+                    "multiline": True,
+                    "default": "me,ACCESS_TOKEN"
+                }),
+                "text": ("STRING", {
+                    "multiline": True,
+                    "default": "Hello from ComfyUI! 🚀"
+                }),
+                "post_type": (["TEXT_ONLY", "IMAGE_POST", "VIDEO_POST"], {
+                    "default": "TEXT_ONLY"
+                }),
+            },
+            "optional": {
+                "media_file_path": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "media_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "upload_service": (["imgur", "s3"], {
+                    "default": "imgur"
+                }),
+                "imgur_client_id": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "auto_refresh_token": ("BOOLEAN", {
+                    "default": True
+                }),
+                # 帳戶行未指定 client_secret 時使用
+                "client_secret": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 32
+                }),
+                "video_check_timeout": ("INT", {
+                    "default": 60,
+                    "min": 10,
+                    "max": 300
+                }),
+                "video_check_interval": ("INT", {
+                    "default": 5,
+                    "min": 1,
+                    "max": 30
+                }),
+                "s3_endpoint_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_bucket": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_access_key": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_secret_key": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "s3_region": ("STRING", {
+                    "default": "us-east-1",
+                    "multiline": False
+                }),
+                "s3_public_base_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "media": (THREADS_MEDIA,),
+                # 發布前檢查提供的 media_url 是否可達、類型和大小是否符合限制
+                "precheck_media_url": ("BOOLEAN", {
+                    "default": True
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "BOOLEAN", "INT", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("post_ids", "all_success", "success_count", "report", "media_url_used", "final_tokens")
+    CATEGORY = "Social Media/Threads"
+    FUNCTION = "publish_fan_out"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    def __init__(self):
+        self.publisher = ThreadsAllInOneNode()
+        self.media_uploader = self.publisher.media_uploader
+    
+    @staticmethod
+    def parse_accounts(accounts: str, default_client_secret: str = "") -> list:
+        """
+        解析帳戶列表，每行: threads_user_id,access_token[,client_secret]
+        """
+        parsed = []
+        for line in accounts.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split(',')]
+            if len(parts) < 2 or not parts[1]:
+                raise ValueError(f"帳戶格式錯誤（需要 threads_user_id,access_token）: {parts[0]}")
+            parsed.append({
+                'threads_user_id': parts[0] or 'me',
+                'access_token': parts[1],
+                'client_secret': parts[2] if len(parts) > 2 and parts[2] else default_client_secret,
+            })
+        return parsed
+    
+    def publish_for_account(self, account: dict, media_type: str, text: str, media_future,
+                            auto_refresh_token: bool, video_check_timeout: int,
+                            video_check_interval: int) -> dict:
+        """
+        單一帳戶的完整發布流程（權杖驗證 → 等待共享上傳 → 創建容器 → 發布），失敗只影響本帳戶
+        """
+        start_time = time.time()
+        threads_user_id = account['threads_user_id']
+        current_token = account['access_token']
+        client_secret = account['client_secret']
+        account_log = []
+        result = {
+            'threads_user_id': threads_user_id,
+            'success': False,
+            'post_id': '',
+            'permalink': '',
+            'message': '',
+            'final_token': current_token,
+            'log': account_log,
+        }
+        
+        try:
+            if auto_refresh_token:
+                is_valid, permissions, validation_report, needs_refresh = ThreadsTokenValidatorNode().validate_token(
+                    current_token, True, 7
+                )
+                if not is_valid:
+                    result['message'] = f"❌ 權杖驗證失敗: {validation_report.splitlines()[-1] if validation_report else ''}"
+                    return result
+                account_log.append("✅ 權杖驗證通過")
+            
+            media_url_used = ""
+            if media_future is not None:
+                media_url_used, upload_success, upload_method, upload_message = media_future.result()
+                if not upload_success:
+                    result['message'] = f"❌ 共享媒體{'URL 預檢' if upload_method == 'provided' else '上傳'}失敗: {upload_message}"
+                    return result
+            
+            creation_id, current_token, create_message, container_log = self.publisher.create_threads_container_with_retry(
+                threads_user_id, current_token, media_type, text, media_url_used,
+                auto_refresh_token, client_secret, video_check_timeout, video_check_interval
+            )
+            account_log.extend(container_log)
+            result['final_token'] = current_token
+            if not creation_id:
+                result['message'] = f"❌ {create_message}"
+                return result
+            
+            publish_result, current_token, publish_message, publish_log = self.publisher.publish_threads_container_with_retry(
+                creation_id, current_token, auto_refresh_token, client_secret
+            )
+            account_log.extend(publish_log)
+            result['final_token'] = current_token
+            if not publish_result:
+                result['message'] = f"❌ {publish_message}"
+                return result
+            
+            post_id = publish_result.get('id', '')
+            record_published_post(post_id, threads_user_id, media_type, "fan_out", text, media_url_used)
+            result.update({
+                'success': True,
+                'post_id': post_id,
+                'permalink': f"https://threads.net/post/{post_id}",
+                'message': "✅ 發布成功",
+            })
+            return result
+            
+        except Exception as e:
+            result['message'] = f"❌ 發布過程異常: {str(e)}"
+            return result
+        
+        finally:
+            result['elapsed'] = time.time() - start_time
+    
+    @staticmethod
+    def precheck_provided_url(media_url: str, media_type: str) -> tuple:
+        """
+        以共享媒體 future 的格式返回 URL 預檢結果: (url, success, method, message)
+        """
+        url_check = check_media_url(media_url, media_type)
+        print(format_url_check(url_check))
+        return (media_url, url_check['ok'], "provided", "; ".join(url_check['errors']))
+    
+    def publish_fan_out(self, accounts: str, text: str, post_type: str, media_file_path: str = "",
+                        media_url: str = "", upload_service: str = "imgur", imgur_client_id: str = "",
+                        auto_refresh_token: bool = True, client_secret: str = "", max_concurrency: int = 8,
+                        video_check_timeout: int = 60, video_check_interval: int = 5,
+                        s3_endpoint_url: str = "", s3_bucket: str = "", s3_access_key: str = "",
+                        s3_secret_key: str = "", s3_region: str = "us-east-1",
+                        s3_public_base_url: str = "", media: MediaHandle = None,
+                        precheck_media_url: bool = True):
+        """
+        多帳戶分發發布主函數
+        """
+        from concurrent.futures import ThreadPoolExecutor, Future
+        
+        try:
+            start_time = time.time()
+            account_list = self.parse_accounts(accounts, client_secret)
+            if not account_list:
+                return ("", False, 0, "❌ 請至少提供一個帳戶", "", "")
+            
+            media_type = {"TEXT_ONLY": "TEXT", "IMAGE_POST": "IMAGE", "VIDEO_POST": "VIDEO"}[post_type]
+            report = [f"=== Threads 多帳戶分發開始: {len(account_list)} 個帳戶 ==="]
+            
+            if media_type == 'TEXT' and not text.strip():
+                return ("", False, 0, "❌ 純文本帖子需要 text 參數", "", "")
+            
+            if media_type != 'TEXT' and not media_url and media is None:
+                if not media_file_path or not os.path.exists(media_file_path):
+                    return ("", False, 0, f"❌ {post_type} 需要提供媒體文件或URL", "", "")
+                media = get_media_store().put_file(media_file_path)
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(account_list)) + 1)) as executor:
+                # 媒體只上傳一次，與各帳戶的權杖驗證同時進行
+                media_future = None
+                if media_type != 'TEXT':
+                    if media_url and precheck_media_url:
+                        # URL 預檢與各帳戶的權杖驗證同時進行
+                        media_future = executor.submit(self.precheck_provided_url, media_url, media_type)
+                    elif media_url:
+                        media_future = Future()
+                        media_future.set_result((media_url, True, "provided", ""))
+                    else:
+                        report.append(f"📤 使用 {upload_service} 上傳共享媒體: {media.file_name}")
+                        media_future = executor.submit(
+                            self.media_uploader.upload_media_handle, media, upload_service, imgur_client_id,
+                            s3_config={
+                                'endpoint_url': s3_endpoint_url,
+                                'bucket': s3_bucket,
+                                'access_key': s3_access_key,
+                                'secret_key': s3_secret_key,
+                                'region': s3_region,
+                                'public_base_url': s3_public_base_url,
+                            }
+                        )
+                
+                futures = [
+                    executor.submit(self.publish_for_account, account, media_type, text, media_future,
+                                    auto_refresh_token, video_check_timeout, video_check_interval)
+                    for account in account_list
+                ]
+                results = [future.result() for future in futures]
+                media_url_used = media_future.result()[0] if media_future is not None else ""
+            
+            success_count = 0
+            for result in results:
+                status = "✅" if result['success'] else "❌"
+                report.append(f"\n{status} {result['threads_user_id']} ({result.get('elapsed', 0):.1f}s)")
+                report.append(f"   {result['message']}")
+                if result['success']:
+                    success_count += 1
+                    report.append(f"   帖子 ID: {result['post_id']}")
+                    report.append(f"   鏈接: {result['permalink']}")
+            
+            report.append(f"\n=== 分發完成: {success_count}/{len(results)} 成功，總耗時 {time.time() - start_time:.1f} 秒 ===")
+            report_text = "\n".join(report)
+            print(report_text)
+            
+            post_ids = "\n".join(result['post_id'] for result in results)
+            final_tokens = "\n".join(result['final_token'] for result in results)
+            return (post_ids, success_count == len(results), success_count, report_text, media_url_used, final_tokens)
+            
+        except Exception as e:
+            error_message = f"❌ 多帳戶分發異常: {str(e)}"
+            print(error_message)
+            import traceback
+            traceback.print_exc()
+            return ("", False, 0, error_message, "", "")
+
+
+def run_scheduled_post(payload: dict) -> tuple:
+    """
+    排程任務執行函數 - 使用一體化節點的容器創建和發布流程
+    """
+    post_id, permalink, success, status_message, media_url_used, processing_log, final_token = \
+        ThreadsAllInOneNode().publish_all_in_one(**payload)
+    return (success, {'post_id': post_id, 'permalink': permalink, 'message': status_message})
+
+
+class ThreadsSchedulerNode:
+    """
+    排程發布節點 - 將貼文加入持久化排程，或列出、取消排程任務
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "action": (["enqueue", "list", "cancel"], {
+                    "default": "enqueue"
+                }),
+                "access_token": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "text": ("STRING", {
+                    "multiline": True,
+                    "default": "Hello from ComfyUI! 🚀"
+                }),
+                "threads_user_id": ("STRING", {
+                    "default": "me",
+                    "multiline": False
+                }),
+                "post_type": (["TEXT_ONLY", "IMAGE_POST", "VIDEO_POST"], {
+                    "default": "TEXT_ONLY"
+                }),
+            },
+            "optional": {
+                # 本地時間 YYYY-MM-DD HH:MM[:SS]；留空時使用 delay_minutes
+                "publish_at": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "delay_minutes": ("INT", {
+                    "default": 60,
+                    "min": 0,
+                    "max": 525600
+                }),
+                "media_file_path": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "media_url": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "upload_service": (["imgur", "s3"], {
+                    "default": "imgur"
+                }),
+                "imgur_client_id": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "auto_refresh_token": ("BOOLEAN", {
+                    "default": True
+                }),
+                "client_secret": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "job_id": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 2147483647
+                }),
+                "list_status": (["all", "pending", "done", "failed", "cancelled", "interrupted"], {
+                    "default": "pending"
+                }),
+                "list_limit": ("INT", {
+                    "default": 50,
+                    "min": 1,
+                    "max": 1000
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("INT", "BOOLEAN", "STRING", "STRING")
+    RETURN_NAMES = ("job_id", "success", "status_message", "jobs_report")
+    CATEGORY = "Social Media/Threads/Schedule"
+    FUNCTION = "manage_schedule"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    @staticmethod
+    def format_jobs(jobs: list) -> str:
+        lines = [f"=== 排程任務 ({len(jobs)}) ==="]
+        for job in jobs:
+            due = datetime.datetime.fromtimestamp(job['due_at']).strftime('%Y-%m-%d %H:%M:%S')
+            line = f"#{job['id']} [{job['status']}] {due} {job['label']}"
+            post_id = job['result'].get('post_id')
+            if post_id:
+                line += f" → {post_id}"
+            elif job['result'].get('message'):
+                line += f" → {job['result']['message'].splitlines()[0]}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def manage_schedule(self, action: str, access_token: str, text: str, threads_user_id: str,
+                        post_type: str, publish_at: str = "", delay_minutes: int = 60,
+                        media_file_path: str = "", media_url: str = "", upload_service: str = "imgur",
+                        imgur_client_id: str = "", auto_refresh_token: bool = True,
+                        client_secret: str = "", job_id: int = 0, list_status: str = "pending",
+                        list_limit: int = 50):
+        """
+        主要的排程管理函數
+        """
+        try:
+            scheduler = get_post_scheduler(run_scheduled_post)
+            
+            if action == "enqueue":
+                if not access_token:
+                    return (0, False, "❌ 需要提供存取權杖", "")
+                if post_type == "TEXT_ONLY" and not text.strip():
+                    return (0, False, "❌ 純文本帖子需要 text 參數", "")
+                if post_type != "TEXT_ONLY" and not media_url and not media_file_path:
+                    return (0, False, f"❌ {post_type} 需要提供媒體文件或URL", "")
+                
+                if publish_at.strip():
+                    try:
+                        due_time = datetime.datetime.fromisoformat(publish_at.strip())
+                    except ValueError:
+                        return (0, False, f"❌ 無法解析發布時間: {publish_at}（格式: YYYY-MM-DD HH:MM）", "")
+                else:
+                    due_time = datetime.datetime.now() + datetime.timedelta(minutes=delay_minutes)
+                
+                # 權杖和密鑰會保存在本地排程數據庫中，執行時才使用
+                payload = {
+                    'access_token': access_token,
+                    'text': text,
+                    'threads_user_id': threads_user_id,
+                    'post_type': post_type,
+                    'media_file_path': media_file_path,
+                    'media_url': media_url,
+                    'upload_service': upload_service,
+                    'auto_refresh_token': auto_refresh_token,
+                    'client_secret': client_secret,
+                    'imgur_client_id': imgur_client_id,
+                }
+                label = f"{post_type} @{threads_user_id}: {text.strip()[:30]}"
+                new_job_id = scheduler.schedule(due_time.timestamp(), payload, label)
+                
+                status_message = f"✅ 已加入排程 #{new_job_id}\n發布時間: {due_time.strftime('%Y-%m-%d %H:%M:%S')}"
+                print(status_message)
+                return (new_job_id, True, status_message, "")
+            
+            elif action == "list":
+                status_filter = "" if list_status == "all" else list_status
+                jobs = scheduler.store.list_jobs(status_filter, list_limit)
+                return (0, True, f"✅ 共 {len(jobs)} 個排程任務", self.format_jobs(jobs))
+            
+            elif action == "cancel":
+                if not job_id:
+                    return (0, False, "❌ 請提供要取消的 job_id", "")
+                if scheduler.cancel(job_id):
+                    return (job_id, True, f"✅ 已取消排程任務 #{job_id}", "")
+                return (job_id, False, f"❌ 排程任務 #{job_id} 不存在或已不是待執行狀態", "")
+            
+            else:
+                return (0, False, f"❌ 不支援的操作: {action}", "")
+            
+        except Exception as e:
+            error_message = f"❌ 排程管理異常: {str(e)}"
+            print(error_message)
+            return (0, False, error_message, "")
+
+
+class ThreadsIngestNode:
+    """
+    監視資料夾服務控制節點 - 啟動、停止服務並查看處理狀態
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "action": (["status", "start", "stop", "recent"], {
+                    "default": "status"
+                }),
+            },
+            "optional": {
+                # start 時提供則寫入配置文件；留空時使用現有的 ingest.json
+                "config_json": ("STRING", {
+                    "multiline": True,
+                    "default": ""
+                }),
+                "recent_limit": ("INT", {
+                    "default": 20,
+                    "min": 1,
+                    "max": 500
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "BOOLEAN")
+    RETURN_NAMES = ("report", "running")
+    CATEGORY = "Social Media/Threads/Schedule"
+    FUNCTION = "manage_ingest"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    def manage_ingest(self, action: str, config_json: str = "", recent_limit: int = 20):
+        """
+        監視資料夾服務控制
+        """
+        try:
+            if action == "start":
+                config = None
+                if config_json.strip():
+                    config = json.loads(config_json)
+                    if not config.get("watches"):
+                        return ("❌ 配置中缺少 watches", False)
+                    with open(get_ingest_config_path(), "w", encoding="utf-8") as f:
+                        json.dump(config, f, ensure_ascii=False, indent=2)
+                service = start_ingest_service(run_scheduled_post, config)
+                if not service.running:
+                    return (f"❌ 沒有可監視的目錄，請在 {get_ingest_config_path()} 中配置 watches", False)
+            elif action == "stop":
+                stop_ingest_service()
+                return ("⏹️ 監視資料夾服務已停止", False)
+            
+            service = get_ingest_service()
+            if service is None:
+                return (f"ℹ️ 監視資料夾服務未啟動\n配置文件: {get_ingest_config_path()}", False)
+            
+            status = service.status()
+            report = [
+                f"📂 監視資料夾服務: {'運行中' if status['running'] else '已停止'} ({status['mode']})",
+                f"監視目錄: {', '.join(status['watches'])}",
+                f"等待寫入完成: {status['settling']}，等待發布: {status['queued']}",
+                f"累計: {json.dumps(status['totals'], ensure_ascii=False)}",
+            ]
+            if action == "recent":
+                report.append("")
+                for path, file_status, post_id, message, updated_at in service.store.recent(recent_limit):
+                    updated = datetime.datetime.fromtimestamp(updated_at).strftime("%Y-%m-%d %H:%M:%S")
+                    report.append(f"{updated} [{file_status}] {os.path.basename(path)} {post_id}")
+            report_text = "\n".join(report)
+            print(report_text)
+            return (report_text, status['running'])
+            
+        except Exception as e:
+            error_message = f"❌ 監視資料夾服務操作異常: {str(e)}"
+            print(error_message)
+            return (error_message, False)
+
+
+class ThreadsPublishQueueNode:
+    """
+    發布隊列控制節點 - 查看隊列狀態、啟動或停止工作進程、取消排隊中的任務
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "action": (["status", "start_workers", "stop_workers", "cancel"], {
+                    "default": "status"
+                }),
+            },
+            "optional": {
+                # 0 表示使用 THREADS_QUEUE_WORKERS 或 CPU 核心數（最多 4）
+                "workers": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 32
+                }),
+                "job_id": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 2147483647
+                }),
+                "list_status": (["all", "queued", "leased", "done", "failed", "cancelled"], {
+                    "default": "all"
+                }),
+                "list_limit": ("INT", {
+                    "default": 20,
+                    "min": 1,
+                    "max": 500
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "INT")
+    RETURN_NAMES = ("report", "active_jobs")
+    CATEGORY = "Social Media/Threads/Schedule"
+    FUNCTION = "manage_queue"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    def manage_queue(self, action: str, workers: int = 0, job_id: int = 0, list_status: str = "all",
+                     list_limit: int = 20):
+        """
+        發布隊列控制
+        """
+        try:
+            queue = get_publish_queue()
+            report = []
+            if action == "start_workers":
+                started = get_queue_pool(workers).ensure_running()
+                report.append(f"▶️ 新啟動 {started} 個工作進程")
+            elif action == "stop_workers":
+                get_queue_pool().stop()
+                report.append("⏹️ 工作進程已停止，未完成的任務在租約過期後重新排隊")
+            elif action == "cancel":
+                if queue.cancel(job_id):
+                    report.append(f"✅ 已取消隊列任務 #{job_id}")
+                else:
+                    report.append(f"❌ 無法取消 #{job_id}（不存在或已開始執行）")
+            
+            report.append(f"📥 發布隊列: {json.dumps(queue.counts(), ensure_ascii=False)}")
+            report.append(f"工作進程: {get_queue_pool().alive()}")
+            for job in queue.list_jobs("" if list_status == "all" else list_status, list_limit):
+                updated = datetime.datetime.fromtimestamp(job['updated_at']).strftime("%Y-%m-%d %H:%M:%S")
+                line = f"#{job['id']} [{job['status']}] {updated} {job['label']}"
+                if job['result'].get('post_id'):
+                    line += f" → {job['result']['post_id']}"
+                elif job['result'].get('message'):
+                    line += f" → {job['result']['message'].splitlines()[0]}"
+                report.append(line)
+            report_text = "\n".join(report)
+            print(report_text)
+            return (report_text, queue.count_active())
+            
+        except Exception as e:
+            error_message = f"❌ 發布隊列操作異常: {str(e)}"
+            print(error_message)
+            return (error_message, 0)
+
+
+class ThreadsUserInfoNode:
+   """
+   獲取 Threads 用戶信息的節點 - 支援長期權杖
+   """
+   
+   @classmethod
+   def INPUT_TYPES(cls):
+       return {
+           "required": {
+               "access_token": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+           },
+           "optional": {
+               "auto_refresh_token": ("BOOLEAN", {
+                   "default": True
+               }),
+               "client_secret": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               # 只讀結果的緩存時間（秒），0 表示每次都重新請求
+               "cache_ttl_seconds": ("INT", {
+                   "default": 300,
+                   "min": 0,
+                   "max": 86400
+               }),
+               # 下載頭像並以媒體句柄輸出
+               "fetch_profile_picture": ("BOOLEAN", {
+                   "default": False
+               }),
+           }
+       }
+   
+   RETURN_TYPES = ("STRING", "STRING", "STRING", "BOOLEAN", "STRING", "STRING", THREADS_MEDIA)
+   RETURN_NAMES = ("user_id", "username", "user_info", "success", "message", "refreshed_token", "profile_picture")
+   CATEGORY = "Social Media/Threads"
+   FUNCTION = "get_user_info"
+   
+   @classmethod
+   def IS_CHANGED(cls, access_token: str = "", cache_ttl_seconds: int = DEFAULT_CACHE_TTL, **kwargs):
+       return cache_bucket(access_token, cache_ttl_seconds)
+   
+   def __init__(self):
+       self.api_version = "v1.0"
+       self.base_url = f"https://graph.threads.net/{self.api_version}"
+       self.token_manager = ThreadsTokenManagerNode()
+   
+   def fetch_profile_picture(self, user_data: dict, cache_ttl_seconds: int):
+       """
+       下載頭像為媒體句柄；頭像 URL 帶簽名參數，內容同樣經過響應緩存
+       """
+       picture_url = user_data.get('threads_profile_picture_url', '')
+       if not picture_url:
+           return None
+       try:
+           response = cached_get(picture_url, None, cache_ttl_seconds)
+           if response.status_code != 200:
+               print(f"⚠️ 頭像下載失敗: {response.status_code}")
+               return None
+           content_type = response.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+           extension = mimetypes.guess_extension(content_type) or '.jpg'
+           return get_media_store().put_bytes(response.content, f"profile_picture{extension}", content_type)
+       except Exception as e:
+           print(f"⚠️ 頭像下載異常: {str(e)}")
+           return None
+   
+   def get_user_info(self, access_token: str, auto_refresh_token: bool = True, client_secret: str = "",
+                     cache_ttl_seconds: int = DEFAULT_CACHE_TTL, fetch_profile_picture: bool = False):
+       """
+       獲取用戶信息 - 支援權杖自動重新整理
+       """
+       try:
+           if not access_token or access_token.strip() == "":
+               return ("", "", "", False, "請提供有效的 Access Token", access_token, None)
+           
+           print("獲取 Threads 用戶信息...")
+           current_token = access_token
+           
+           # 獲取用戶基本信息
+           url = f"{self.base_url}/me"
+           params = {
+               'fields': 'id,username,name,threads_profile_picture_url,threads_biography',
+               'access_token': current_token
+           }
+           
+           print(f"請求 URL: {url}")
+           print(f"請求參數: {dict(params, access_token='[HIDDEN]')}")
+           
+           # 與權杖驗證等節點共用 /me 請求：欄位合併、並發請求只發出一次
+           response = fetch_me(self.base_url, current_token, params['fields'], cache_ttl_seconds)
+           
+           print(f"響應狀態: {response.status_code}")
+           print(f"響應內容: {response.text}")
+           
+           if response.status_code == 200:
+               user_data = response.json()
+               
+               user_id = user_data.get('id', '')
+               username = user_data.get('username', '')
+               name = user_data.get('name', '')
+               
+               # 格式化用戶信息
+               user_info_lines = [
+                   f"用戶 ID: {user_id}",
+                   f"用戶名: @{username}",
+                   f"顯示名稱: {name}",
+               ]
+               
+               if 'threads_profile_picture_url' in user_data:
+                   user_info_lines.append(f"頭像 URL: {user_data['threads_profile_picture_url']}")
+               
+               if 'threads_biography' in user_data:
+                   bio = user_data['threads_biography']
+                   if bio:
+                       user_info_lines.append(f"簡介: {bio}")
+               
+               user_info = "\n".join(user_info_lines)
+               
+               success_message = f"✅ 成功獲取用戶信息\n用戶ID: {user_id}\n用戶名: @{username}"
+               
+               print(success_message)
+               profile_picture = self.fetch_profile_picture(user_data, cache_ttl_seconds) if fetch_profile_picture else None
+               return (user_id, username, user_info, True, success_message, current_token, profile_picture)
+               
+           elif response.status_code == 190:  # 權杖過期
+               if auto_refresh_token and client_secret:
+                   print("🔄 權杖過期，嘗試自動重新整理...")
+                   
+                   new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
+                   
                    if refresh_success:
                        print(f"✅ 權杖重新整理成功，重試獲取用戶信息...")
                        
@@ -1661,217 +3157,856 @@ class ThreadsUserInfoNode:
                            success_message = f"✅ 權杖已重新整理並成功獲取用戶信息\n用戶ID: {user_id}\n用戶名: @{username}\n🔄 新權杖有效期: {expires_days} 天"
                            
                            print(success_message)
-                           return (user_id, username, user_info, True, success_message, new_token)
+                           profile_picture = self.fetch_profile_picture(user_data, cache_ttl_seconds) if fetch_profile_picture else None
+                           return (user_id, username, user_info, True, success_message, new_token, profile_picture)
                        else:
                            error_msg = f"❌ 使用新權杖重試失敗: {retry_response.text}"
-                           return ("", "", "", False, error_msg, new_token)
+                           return ("", "", "", False, error_msg, new_token, None)
                    else:
                        error_msg = f"❌ 權杖重新整理失敗: {refresh_message}"
-                       return ("", "", "", False, error_msg, current_token)
+                       return ("", "", "", False, error_msg, current_token, None)
                else:
                    error_msg = "❌ Access Token 無效或已過期\n💡 請提供 client_secret 以啟用自動權杖重新整理"
                    print(error_msg)
-                   return ("", "", "", False, error_msg, current_token)
+                   return ("", "", "", False, error_msg, current_token, None)
+               
+           elif response.status_code == 403:
+               error_msg = "❌ 權限不足，請檢查 Token 權限設置"
+               print(error_msg)
+               return ("", "", "", False, error_msg, current_token, None)
+               
+           else:
+               try:
+                   error_data = response.json()
+                   error_detail = error_data.get('error', {})
+                   error_msg = f"❌ 請求失敗: {response.status_code}\n錯誤: {error_detail.get('message', '未知錯誤')}"
+               except:
+                   error_msg = f"❌ 請求失敗: {response.status_code}\n響應: {response.text}"
+               
+               print(error_msg)
+               return ("", "", "", False, error_msg, current_token, None)
+               
+       except Exception as e:
+           error_message = f"❌ 獲取用戶信息時發生異常: {str(e)}"
+           print(error_message)
+           import traceback
+           traceback.print_exc()
+           return ("", "", "", False, error_message, access_token, None)
+
+
+METHOD_LABELS = {
+    CONTAINER_PUBLISH: "方法A: POST /{creation-id}/publish",
+    THREADS_PUBLISH: "方法B: POST /me/threads_publish",
+}
+
+
+class ThreadsQuickTestNode:
+   """
+   快速測試整個發布流程的節點 - 支援長期權杖
+   """
+   
+   @classmethod
+   def INPUT_TYPES(cls):
+       return {
+           "required": {
+               "access_token": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               "test_text": ("STRING", {
+                   "multiline": True,
+                   "default": "Quick test from ComfyUI"
+               }),
+               "threads_user_id": ("STRING", {
+                   "default": "me",
+                   "multiline": False
+               }),
+           },
+           "optional": {
+               "auto_refresh_token": ("BOOLEAN", {
+                   "default": True
+               }),
+               "client_secret": ("STRING", {
+                   "default": "",
+                   "multiline": False
+               }),
+               # concurrent_probe: 每個發布端點各創建一個容器並同時發布，報告各端點延遲（會發布多個測試帖子）
+               "test_mode": (["publish", "concurrent_probe"], {
+                   "default": "publish"
+               }),
+           }
+       }
+   
+   RETURN_TYPES = ("STRING", "BOOLEAN", "STRING", "STRING")
+   RETURN_NAMES = ("test_result", "success", "post_id", "final_token")
+   CATEGORY = "Social Media/Debug"
+   FUNCTION = "quick_test"
+   
+   # 有副作用的節點永遠重新執行
+   IS_CHANGED = classmethod(never_cached)
+   
+   def __init__(self):
+       self.api_version = "v1.0"
+       self.base_url = f"https://graph.threads.net/{self.api_version}"
+       self.token_manager = ThreadsTokenManagerNode()
+   
+   def probe_publish_method(self, method: str, threads_user_id: str, access_token: str, test_text: str) -> dict:
+       """
+       使用指定端點完成一次 創建容器 + 發布，記錄各階段延遲
+       """
+       result = {'method': method, 'success': False, 'post_id': '', 'create_ms': 0, 'publish_ms': 0, 'error': ''}
+       try:
+           started = time.perf_counter()
+           create_response = requests.post(f"{self.base_url}/{threads_user_id}/threads", params={
+               'media_type': 'TEXT',
+               'text': test_text,
+               'access_token': access_token
+           }, timeout=30)
+           result['create_ms'] = int((time.perf_counter() - started) * 1000)
+           if create_response.status_code != 200:
+               result['error'] = f"容器創建失敗: {create_response.status_code} - {create_response.text}"
+               return result
+           
+           publish_url, publish_data = build_publish_request(
+               method, self.base_url, create_response.json().get('id'), access_token
+           )
+           started = time.perf_counter()
+           publish_response = requests.post(publish_url, data=publish_data, timeout=30)
+           result['publish_ms'] = int((time.perf_counter() - started) * 1000)
+           if publish_response.status_code != 200:
+               result['error'] = f"{publish_response.status_code} - {publish_response.text}"
+               return result
+           
+           result['success'] = True
+           result['post_id'] = publish_response.json().get('id', '')
+           return result
+       except Exception as e:
+           result['error'] = str(e)
+           return result
+   
+   def probe_publish_methods(self, access_token: str, test_text: str, threads_user_id: str) -> tuple:
+       """
+       同時探測所有發布端點，記住最快的可用端點
+       """
+       from concurrent.futures import ThreadPoolExecutor
+       
+       test_log = ["=== Threads 發布端點並行探測 ==="]
+       with ThreadPoolExecutor(max_workers=len(PUBLISH_METHODS)) as executor:
+           results = list(executor.map(
+               lambda method: self.probe_publish_method(method, threads_user_id, access_token, test_text),
+               PUBLISH_METHODS
+           ))
+       
+       for result in results:
+           label = METHOD_LABELS[result['method']]
+           if result['success']:
+               test_log.append(f"✅ {label}: 創建 {result['create_ms']} ms，發布 {result['publish_ms']} ms，帖子ID: {result['post_id']}")
+               record_published_post(result['post_id'], threads_user_id, "TEXT", "quick_test", test_text)
+           else:
+               test_log.append(f"❌ {label}: {result['error']}（創建 {result['create_ms']} ms，發布 {result['publish_ms']} ms）")
+       
+       working = sorted((result for result in results if result['success']), key=lambda result: result['publish_ms'])
+       capability_key = account_key(access_token, resolve_me_user_id)
+       if not working:
+           get_capability_cache().invalidate(capability_key)
+           test_log.append("\n❌ 所有發布端點都失敗了")
+           return ("\n".join(test_log), False, "", access_token)
+       
+       get_capability_cache().remember(capability_key, working[0]['method'])
+       test_log.append(f"\n📌 已記錄此帳戶的發布端點: {METHOD_LABELS[working[0]['method']]}")
+       return ("\n".join(test_log), True, working[0]['post_id'], access_token)
+   
+   def quick_test(self, access_token: str, test_text: str, threads_user_id: str,
+                 auto_refresh_token: bool = True, client_secret: str = "", test_mode: str = "publish"):
+       """
+       快速測試完整流程 - 支援權杖自動重新整理
+       """
+       try:
+           if test_mode == "concurrent_probe":
+               return self.probe_publish_methods(access_token, test_text, threads_user_id)
+           
+           test_log = ["=== Threads 快速測試開始（支援長期權杖）==="]
+           current_token = access_token
+           
+           # 步驟0: 權杖驗證
+           if auto_refresh_token:
+               test_log.append("\n🔐 步驟0: 權杖驗證")
+               validator = ThreadsTokenValidatorNode()
+               is_valid, permissions, validation_report, needs_refresh = validator.validate_token(
+                   current_token, True, 7
+               )
                
-           elif response.status_code == 403:
-               error_msg = "❌ 權限不足，請檢查 Token 權限設置"
-               print(error_msg)
-               return ("", "", "", False, error_msg, current_token)
+               if not is_valid:
+                   test_log.append("❌ 權杖驗證失敗")
+                   test_log.append(validation_report)
+                   return ("\n".join(test_log), False, "", current_token)
                
-           else:
-               try:
-                   error_data = response.json()
-                   error_detail = error_data.get('error', {})
-                   error_msg = f"❌ 請求失敗: {response.status_code}\n錯誤: {error_detail.get('message', '未知錯誤')}"
-               except:
-                   error_msg = f"❌ 請求失敗: {response.status_code}\n響應: {response.text}"
+               test_log.append("✅ 權杖驗證通過")
+           
+           # 步驟1: 創建容器
+           test_log.append("\n📝 步驟1: 創建文本容器")
+           
+           create_url = f"{self.base_url}/{threads_user_id}/threads"
+           create_params = {
+               'media_type': 'TEXT',
+               'text': test_text,
+               'access_token': current_token
+           }
+           
+           test_log.append(f"創建URL: {create_url}")
+           test_log.append(f"創建參數: {dict(create_params, access_token='[HIDDEN]')}")
+           
+           create_response = requests.post(create_url, params=create_params, timeout=30)
+           test_log.append(f"創建狀態: {create_response.status_code}")
+           test_log.append(f"創建響應: {create_response.text}")
+           
+           if create_response.status_code == 190 and auto_refresh_token and client_secret:
+               test_log.append("🔄 權杖過期，嘗試自動重新整理...")
                
-               print(error_msg)
-               return ("", "", "", False, error_msg, current_token)
+               new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
+               
+               if refresh_success:
+                   test_log.append(f"✅ 權杖重新整理成功，有效期: {expires_days} 天")
+                   current_token = new_token
+                   
+                   # 使用新權杖重試
+                   create_params['access_token'] = current_token
+                   create_response = requests.post(create_url, params=create_params, timeout=30)
+                   test_log.append(f"重試創建狀態: {create_response.status_code}")
+                   test_log.append(f"重試創建響應: {create_response.text}")
+               else:
+                   test_log.append(f"❌ 權杖重新整理失敗: {refresh_message}")
+                   return ("\n".join(test_log), False, "", current_token)
+           
+           if create_response.status_code != 200:
+               test_log.append("❌ 容器創建失敗")
+               return ("\n".join(test_log), False, "", current_token)
+           
+           create_data = create_response.json()
+           creation_id = create_data.get('id')
+           test_log.append(f"✅ 容器創建成功: {creation_id}")
+           
+           # 步驟2: 嘗試發布（先使用此帳戶記錄的可用端點）
+           test_log.append(f"\n🚀 步驟2: 測試發布")
+           capabilities = get_capability_cache()
+           capability_key = account_key(current_token, resolve_me_user_id)
+           known_method = capabilities.get(capability_key)
+           if known_method:
+               test_log.append(f"📌 使用已記錄的發布端點: {METHOD_LABELS[known_method]}")
+           
+           for method in capabilities.order(capability_key, (CONTAINER_PUBLISH, THREADS_PUBLISH)):
+               label = METHOD_LABELS[method]
+               test_log.append(f"\n嘗試{label}")
+               publish_url, publish_data = build_publish_request(method, self.base_url, creation_id, current_token)
                
+               publish_response = requests.post(publish_url, data=publish_data, timeout=30)
+               test_log.append(f"狀態: {publish_response.status_code}")
+               
+               if publish_response.status_code == 190 and auto_refresh_token and client_secret:
+                   test_log.append("🔄 發布時權杖過期，使用已刷新的權杖重試...")
+                   publish_data['access_token'] = current_token
+                   publish_response = requests.post(publish_url, data=publish_data, timeout=30)
+                   test_log.append(f"重試狀態: {publish_response.status_code}")
+               
+               if publish_response.status_code == 200:
+                   test_log.append(f"✅ {label} 發布成功!")
+                   result_data = publish_response.json()
+                   post_id = result_data.get('id', '')
+                   test_log.append(f"帖子ID: {post_id}")
+                   capabilities.remember(account_key(current_token, resolve_me_user_id), method)
+                   record_published_post(post_id, threads_user_id, "TEXT", "quick_test", test_text)
+                   return ("\n".join(test_log), True, post_id, current_token)
+               else:
+                   test_log.append(f"{label} 失敗: {publish_response.text}")
+                   if not is_endpoint_shape_error(publish_response):
+                       break
+                   capabilities.invalidate(capability_key, method)
+           
+           test_log.append("\n❌ 所有發布方法都失敗了")
+           test_log.append("\n💡 建議:")
+           test_log.append("1. 檢查Token權限設置")
+           test_log.append("2. 確認帳戶狀態")
+           test_log.append("3. 使用 ThreadsTokenManagerNode 手動重新整理權杖")
+           test_log.append("4. 聯繫Meta支持")
+           
+           return ("\n".join(test_log), False, "", current_token)
+           
        except Exception as e:
-           error_message = f"❌ 獲取用戶信息時發生異常: {str(e)}"
+           error_message = f"❌ 測試過程異常: {str(e)}"
            print(error_message)
-           import traceback
-           traceback.print_exc()
-           return ("", "", "", False, error_message, access_token)
+           return (error_message, False, "", access_token)
+
+
+class ThreadsListPostsNode:
+    """
+    列出帳戶帖子的節點 - 游標分頁惰性讀取，頁面以 ETag 緩存
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "access_token": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "threads_user_id": ("STRING", {
+                    "default": "me",
+                    "multiline": False
+                }),
+                "limit": ("INT", {
+                    "default": 25,
+                    "min": 1,
+                    "max": 10000
+                }),
+            },
+            "optional": {
+                "fields": ("STRING", {
+                    "default": DEFAULT_POST_FIELDS,
+                    "multiline": False
+                }),
+                "page_size": ("INT", {
+                    "default": 25,
+                    "min": 1,
+                    "max": 100
+                }),
+                # Unix 時間戳或 YYYY-MM-DD
+                "since": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "until": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True
+                }),
+                # 只讀結果的緩存時間（秒），0 表示每次都重新請求
+                "cache_ttl_seconds": ("INT", {
+                    "default": 300,
+                    "min": 0,
+                    "max": 86400
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "INT", "BOOLEAN", "STRING")
+    RETURN_NAMES = ("post_ids", "posts_json", "count", "success", "status_message")
+    CATEGORY = "Social Media/Threads"
+    FUNCTION = "list_posts"
+    
+    @classmethod
+    def IS_CHANGED(cls, access_token: str = "", cache_ttl_seconds: int = DEFAULT_CACHE_TTL, **kwargs):
+        return cache_bucket(access_token, cache_ttl_seconds)
+    
+    def __init__(self):
+        self.api_version = "v1.0"
+        self.base_url = f"https://graph.threads.net/{self.api_version}"
+    
+    def list_posts(self, access_token: str, threads_user_id: str, limit: int = 25,
+                   fields: str = DEFAULT_POST_FIELDS, page_size: int = 25, since: str = "",
+                   until: str = "", use_cache: bool = True, cache_ttl_seconds: int = DEFAULT_CACHE_TTL):
+        """
+        列出帖子
+        """
+        try:
+            if not access_token:
+                return ("", "[]", 0, False, "❌ 需要提供存取權杖")
+            
+            cache = PageCache() if use_cache else None
+            posts = list(iter_user_threads(
+                self.base_url, threads_user_id, access_token, fields, limit, page_size,
+                since.strip(), until.strip(), cache
+            ))
+            
+            status_message = f"✅ 已列出 {len(posts)} 個帖子"
+            if cache is not None:
+                status_message += f"\n緩存: {cache.hits} 頁 304 重新驗證，{cache.misses} 頁完整下載"
+            print(status_message)
+            
+            post_ids = "\n".join(post.get('id', '') for post in posts)
+            return (post_ids, json.dumps(posts, ensure_ascii=False), len(posts), True, status_message)
+            
+        except Exception as e:
+            error_message = f"❌ 列出帖子異常: {str(e)}"
+            print(error_message)
+            return ("", "[]", 0, False, error_message)
+
+
+class ThreadsReplyManagerNode:
+    """
+    回覆管理節點 - 讀取帖子的新回覆或整個對話，並批量隱藏/取消隱藏回覆
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "access_token": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "post_id": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "action": (["fetch_new", "fetch_all", "hide", "unhide"], {
+                    "default": "fetch_new"
+                }),
+            },
+            "optional": {
+                # replies: 頂層回覆；conversation: 所有層級的回覆
+                "source": (list(REPLY_ENDPOINTS), {
+                    "default": "replies"
+                }),
+                # hide / unhide 的回覆 ID，每行或以逗號分隔
+                "reply_ids": ("STRING", {
+                    "default": "",
+                    "multiline": True
+                }),
+                # 讀取時自動隱藏包含這些關鍵字的新回覆，每行或以逗號分隔
+                "hide_keywords": ("STRING", {
+                    "default": "",
+                    "multiline": True
+                }),
+                "limit": ("INT", {
+                    "default": 1000,
+                    "min": 1,
+                    "max": 100000
+                }),
+                "fields": ("STRING", {
+                    "default": DEFAULT_REPLY_FIELDS,
+                    "multiline": False
+                }),
+                "max_workers": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "INT", "BOOLEAN", "STRING")
+    RETURN_NAMES = ("reply_ids", "replies_json", "count", "success", "status_message")
+    CATEGORY = "Social Media/Threads"
+    FUNCTION = "manage_replies"
+    # 讀取會推進本地游標，隱藏會修改回覆狀態
+    IS_CHANGED = classmethod(never_cached)
+    
+    def __init__(self):
+        self.api_version = "v1.0"
+        self.base_url = f"https://graph.threads.net/{self.api_version}"
+    
+    @staticmethod
+    def split_list(value: str) -> list:
+        return [item.strip() for item in value.replace(",", "\n").splitlines() if item.strip()]
+    
+    def moderate(self, reply_ids: list, access_token: str, hide: bool, max_workers: int) -> tuple:
+        results = moderate_replies(self.base_url, reply_ids, access_token, hide, max_workers)
+        succeeded = [reply_id for reply_id, success, _ in results if success]
+        lines = [f"⚠️ {reply_id}: {message}" for reply_id, success, message in results if not success]
+        return succeeded, lines
+    
+    def manage_replies(self, access_token: str, post_id: str, action: str, source: str = "replies",
+                       reply_ids: str = "", hide_keywords: str = "", limit: int = 1000,
+                       fields: str = DEFAULT_REPLY_FIELDS, max_workers: int = 4):
+        """
+        主要的回覆管理函數
+        """
+        try:
+            if not access_token:
+                return ("", "[]", 0, False, "❌ 需要提供存取權杖")
+            
+            if action in ("hide", "unhide"):
+                ids = self.split_list(reply_ids)
+                if not ids:
+                    return ("", "[]", 0, False, "❌ 需要提供回覆 ID")
+                succeeded, lines = self.moderate(ids, access_token, action == "hide", max_workers)
+                verb = "隱藏" if action == "hide" else "取消隱藏"
+                status_message = "\n".join([f"✅ 已{verb} {len(succeeded)}/{len(ids)} 條回覆"] + lines)
+                print(status_message)
+                return ("\n".join(succeeded), "[]", len(succeeded), len(succeeded) == len(ids), status_message)
+            
+            if action not in ("fetch_new", "fetch_all"):
+                return ("", "[]", 0, False, f"❌ 不支援的操作: {action}")
+            if not post_id.strip():
+                return ("", "[]", 0, False, "❌ 需要提供帖子 ID")
+            
+            replies = list(iter_new_replies(
+                self.base_url, post_id.strip(), access_token, source, fields, limit,
+                resume=action == "fetch_new"
+            ))
+            lines = [f"✅ 已讀取 {len(replies)} 條{'新' if action == 'fetch_new' else ''}回覆 ({source})"]
+            if len(replies) >= limit:
+                lines.append(f"⚠️ 已達到數量上限 {limit}，若還有更早的新回覆，下次 fetch_new 會從中斷處繼續讀取")
+            
+            keywords = self.split_list(hide_keywords)
+            if keywords and replies:
+                matched = [reply.get('id') for reply in match_keywords(replies, keywords)
+                           if reply.get('hide_status') != 'HIDDEN']
+                if matched:
+                    succeeded, failures = self.moderate(matched, access_token, True, max_workers)
+                    hidden = set(succeeded)
+                    for reply in replies:
+                        if reply.get('id') in hidden:
+                            reply['hide_status'] = 'HIDDEN'
+                    lines.append(f"🙈 已隱藏 {len(succeeded)}/{len(matched)} 條包含關鍵字的回覆")
+                    lines.extend(failures)
+            
+            status_message = "\n".join(lines)
+            print(status_message)
+            ids = "\n".join(reply.get('id', '') for reply in replies)
+            return (ids, json.dumps(replies, ensure_ascii=False), len(replies), True, status_message)
+            
+        except Exception as e:
+            error_message = f"❌ 回覆管理異常: {str(e)}"
+            print(error_message)
+            return ("", "[]", 0, False, error_message)
+
+
+class ThreadsBulkDeleteNode:
+    """
+    批量刪除帖子節點 - 按 ID、發布日誌或帳戶帖子列表篩選，並行刪除並逐條回報結果
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "access_token": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                # post_ids: 直接指定；journal: 本插件的發布日誌；listing: 帳戶的帖子列表
+                "selection": (["post_ids", "journal", "listing"], {
+                    "default": "journal"
+                }),
+                # 為 False 時只列出將被刪除的帖子
+                "confirm_delete": ("BOOLEAN", {
+                    "default": False
+                }),
+            },
+            "optional": {
+                # 每行或以逗號分隔
+                "post_ids": ("STRING", {
+                    "default": "",
+                    "multiline": True
+                }),
+                "threads_user_id": ("STRING", {
+                    "default": "me",
+                    "multiline": False
+                }),
+                # 發布日誌的來源，例如 quick_test、all_in_one、auto_thread；留空表示全部
+                "journal_source": ("STRING", {
+                    "default": "quick_test",
+                    "multiline": False
+                }),
+                # Unix 時間戳或 YYYY-MM-DD
+                "since": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "until": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "text_contains": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "limit": ("INT", {
+                    "default": 100,
+                    "min": 1,
+                    "max": 10000
+                }),
+                "max_workers": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "INT", "BOOLEAN", "STRING")
+    RETURN_NAMES = ("deleted_ids", "results_json", "deleted_count", "success", "status_message")
+    CATEGORY = "Social Media/Threads"
+    FUNCTION = "bulk_delete"
+    
+    # 有副作用的節點永遠重新執行
+    IS_CHANGED = classmethod(never_cached)
+    
+    def __init__(self):
+        self.api_version = "v1.0"
+        self.base_url = f"https://graph.threads.net/{self.api_version}"
+    
+    def select_posts(self, access_token: str, selection: str, post_ids: str, threads_user_id: str,
+                     journal_source: str, since: str, until: str, text_contains: str, limit: int) -> list:
+        if selection == "post_ids":
+            ids = [item.strip() for item in post_ids.replace(",", "\n").splitlines() if item.strip()]
+            return [{"post_id": post_id} for post_id in ids[:limit]]
+        if selection == "journal":
+            # 日誌中以 "me" 或真實用戶 ID 記錄，兩者都要包含
+            user_ids = [threads_user_id]
+            if threads_user_id == "me":
+                response = fetch_me(self.base_url, access_token, 'id', DEFAULT_CACHE_TTL)
+                if response.status_code == 200:
+                    user_ids.insert(0, response.json().get('id', 'me'))
+            return select_from_journal(user_ids, journal_source.strip(), since, until, text_contains, limit)
+        if selection == "listing":
+            return select_from_listing(self.base_url, threads_user_id, access_token, since, until,
+                                       text_contains, limit)
+        raise ValueError(f"不支援的選擇方式: {selection}")
+    
+    def bulk_delete(self, access_token: str, selection: str, confirm_delete: bool = False,
+                    post_ids: str = "", threads_user_id: str = "me", journal_source: str = "quick_test",
+                    since: str = "", until: str = "", text_contains: str = "", limit: int = 100,
+                    max_workers: int = 4):
+        """
+        主要的批量刪除函數
+        """
+        try:
+            if not access_token:
+                return ("", "[]", 0, False, "❌ 需要提供存取權杖")
+            
+            posts = self.select_posts(access_token, selection, post_ids, threads_user_id, journal_source,
+                                      since, until, text_contains, limit)
+            if not posts:
+                return ("", "[]", 0, True, "ℹ️ 沒有符合條件的帖子")
+            
+            if not confirm_delete:
+                lines = [f"🔎 預覽: {len(posts)} 個帖子將被刪除（勾選 confirm_delete 後執行）"]
+                lines.extend(f"   {post['post_id']} {post.get('text_preview', '')[:40]}" for post in posts[:50])
+                if len(posts) > 50:
+                    lines.append(f"   ... 另外 {len(posts) - 50} 個")
+                status_message = "\n".join(lines)
+                print(status_message)
+                return ("", json.dumps(posts, ensure_ascii=False), 0, True, status_message)
+            
+            print(f"🗑️ 開始刪除 {len(posts)} 個帖子（並發 {max_workers}）...")
+            results = []
+            for post_id, success, message in iter_bulk_delete(
+                self.base_url, [post['post_id'] for post in posts], access_token, max_workers
+            ):
+                print(f"{'✅' if success else '❌'} [{len(results) + 1}/{len(posts)}] {post_id}: {message}")
+                results.append({"post_id": post_id, "success": success, "message": message})
+            
+            deleted = [result['post_id'] for result in results if result['success']]
+            failed = [result for result in results if not result['success']]
+            lines = [f"🗑️ 已刪除 {len(deleted)}/{len(results)} 個帖子"]
+            lines.extend(f"⚠️ {result['post_id']}: {result['message']}" for result in failed)
+            status_message = "\n".join(lines)
+            print(status_message)
+            return ("\n".join(deleted), json.dumps(results, ensure_ascii=False), len(deleted), not failed,
+                    status_message)
+            
+        except Exception as e:
+            error_message = f"❌ 批量刪除異常: {str(e)}"
+            print(error_message)
+            return ("", "[]", 0, False, error_message)
 
 
-class ThreadsQuickTestNode:
-   """
-   快速測試整個發布流程的節點 - 支援長期權杖
-   """
-   
-   @classmethod
-   def INPUT_TYPES(cls):
-       return {
-           "required": {
-               "access_token": ("STRING", {
-                   "default": "",
-                   "multiline": False
-               }),
-               "test_text": ("STRING", {
-                   "multiline": True,
-                   "default": "Quick test from ComfyUI"
-               }),
-               "threads_user_id": ("STRING", {
-                   "default": "me",
-                   "multiline": False
-               }),
-           },
-           "optional": {
-               "auto_refresh_token": ("BOOLEAN", {
-                   "default": True
-               }),
-               "client_secret": ("STRING", {
-                   "default": "",
-                   "multiline": False
-               }),
-           }
-       }
-   
-   RETURN_TYPES = ("STRING", "BOOLEAN", "STRING", "STRING")
-   RETURN_NAMES = ("test_result", "success", "post_id", "final_token")
-   CATEGORY = "Social Media/Debug"
-   FUNCTION = "quick_test"
-   
-   def __init__(self):
-       self.api_version = "v1.0"
-       self.base_url = f"https://graph.threads.net/{self.api_version}"
-       self.token_manager = ThreadsTokenManagerNode()
-   
-   def quick_test(self, access_token: str, test_text: str, threads_user_id: str,
-                 auto_refresh_token: bool = True, client_secret: str = ""):
-       """
-       快速測試完整流程 - 支援權杖自動重新整理
-       """
-       try:
-           test_log = ["=== Threads 快速測試開始（支援長期權杖）==="]
-           current_token = access_token
-           
-           # 步驟0: 權杖驗證
-           if auto_refresh_token:
-               test_log.append("\n🔐 步驟0: 權杖驗證")
-               validator = ThreadsTokenValidatorNode()
-               is_valid, permissions, validation_report, needs_refresh = validator.validate_token(
-                   current_token, True, 7
-               )
-               
-               if not is_valid:
-                   test_log.append("❌ 權杖驗證失敗")
-                   test_log.append(validation_report)
-                   return ("\n".join(test_log), False, "", current_token)
-               
-               test_log.append("✅ 權杖驗證通過")
-           
-           # 步驟1: 創建容器
-           test_log.append("\n📝 步驟1: 創建文本容器")
-           
-           create_url = f"{self.base_url}/{threads_user_id}/threads"
-           create_params = {
-               'media_type': 'TEXT',
-               'text': test_text,
-               'access_token': current_token
-           }
-           
-           test_log.append(f"創建URL: {create_url}")
-           test_log.append(f"創建參數: {dict(create_params, access_token='[HIDDEN]')}")
-           
-           create_response = requests.post(create_url, params=create_params, timeout=30)
-           test_log.append(f"創建狀態: {create_response.status_code}")
-           test_log.append(f"創建響應: {create_response.text}")
-           
-           if create_response.status_code == 190 and auto_refresh_token and client_secret:
-               test_log.append("🔄 權杖過期，嘗試自動重新整理...")
-               
-               new_token, refresh_success, refresh_message, expires_days, token_type = self.token_manager.refresh_long_lived_token(current_token)
-               
-               if refresh_success:
-                   test_log.append(f"✅ 權杖重新整理成功，有效期: {expires_days} 天")
-                   current_token = new_token
-                   
-                   # 使用新權杖重試
-                   create_params['access_token'] = current_token
-                   create_response = requests.post(create_url, params=create_params, timeout=30)
-                   test_log.append(f"重試創建狀態: {create_response.status_code}")
-                   test_log.append(f"重試創建響應: {create_response.text}")
-               else:
-                   test_log.append(f"❌ 權杖重新整理失敗: {refresh_message}")
-                   return ("\n".join(test_log), False, "", current_token)
-           
-           if create_response.status_code != 200:
-               test_log.append("❌ 容器創建失敗")
-               return ("\n".join(test_log), False, "", current_token)
-           
-           create_data = create_response.json()
-           creation_id = create_data.get('id')
-           test_log.append(f"✅ 容器創建成功: {creation_id}")
-           
-           # 步驟2: 嘗試發布
-           test_log.append(f"\n🚀 步驟2: 測試發布")
-           
-           # 方法A: 標準方法
-           test_log.append("\n嘗試方法A: POST /{creation-id}/publish")
-           publish_url_a = f"{self.base_url}/{creation_id}/publish"
-           publish_data_a = {'access_token': current_token}
-           
-           publish_response_a = requests.post(publish_url_a, data=publish_data_a, timeout=30)
-           test_log.append(f"方法A狀態: {publish_response_a.status_code}")
-           
-           if publish_response_a.status_code == 190 and auto_refresh_token and client_secret:
-               test_log.append("🔄 發布時權杖過期，使用已刷新的權杖重試...")
-               publish_data_a['access_token'] = current_token
-               publish_response_a = requests.post(publish_url_a, data=publish_data_a, timeout=30)
-               test_log.append(f"方法A重試狀態: {publish_response_a.status_code}")
-           
-           if publish_response_a.status_code == 200:
-               test_log.append("✅ 方法A發布成功!")
-               result_data = publish_response_a.json()
-               post_id = result_data.get('id', '')
-               test_log.append(f"帖子ID: {post_id}")
-               return ("\n".join(test_log), True, post_id, current_token)
-           else:
-               test_log.append(f"方法A失敗: {publish_response_a.text}")
-           
-           # 方法B: 替代方法
-           test_log.append("\n嘗試方法B: POST /me/threads_publish")
-           publish_url_b = f"{self.base_url}/me/threads_publish"
-           publish_data_b = {
-               'creation_id': creation_id,
-               'access_token': current_token
-           }
-           
-           publish_response_b = requests.post(publish_url_b, data=publish_data_b, timeout=30)
-           test_log.append(f"方法B狀態: {publish_response_b.status_code}")
-           
-           if publish_response_b.status_code == 190 and auto_refresh_token and client_secret:
-               test_log.append("🔄 發布時權杖過期，使用已刷新的權杖重試...")
-               publish_data_b['access_token'] = current_token
-               publish_response_b = requests.post(publish_url_b, data=publish_data_b, timeout=30)
-               test_log.append(f"方法B重試狀態: {publish_response_b.status_code}")
-           
-           if publish_response_b.status_code == 200:
-               test_log.append("✅ 方法B發布成功!")
-               result_data = publish_response_b.json()
-               post_id = result_data.get('id', '')
-               test_log.append(f"帖子ID: {post_id}")
-               return ("\n".join(test_log), True, post_id, current_token)
-           else:
-               test_log.append(f"方法B失敗: {publish_response_b.text}")
-           
-           test_log.append("\n❌ 所有發布方法都失敗了")
-           test_log.append("\n💡 建議:")
-           test_log.append("1. 檢查Token權限設置")
-           test_log.append("2. 確認帳戶狀態")
-           test_log.append("3. 使用 ThreadsTokenManagerNode 手動重新整理權杖")
-           test_log.append("4. 聯繫Meta支持")
-           
-           return ("\n".join(test_log), False, "", current_token)
-           
-       except Exception as e:
-           error_message = f"❌ 測試過程異常: {str(e)}"
-           print(error_message)
-           return (error_message, False, "", access_token)
+class ThreadsInsightsNode:
+    """
+    Threads 洞察節點 - 增量同步帳戶和帖子洞察到本地存儲，並提供聚合報表
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "access_token": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+                "threads_user_id": ("STRING", {
+                    "default": "me",
+                    "multiline": False
+                }),
+                "action": (["sync", "top_posts", "engagement_by_hour", "account_summary"], {
+                    "default": "sync"
+                }),
+            },
+            "optional": {
+                "sync_posts": ("BOOLEAN", {
+                    "default": True
+                }),
+                "post_refresh_minutes": ("INT", {
+                    "default": 60,
+                    "min": 1,
+                    "max": 10080
+                }),
+                "post_max_age_days": ("INT", {
+                    "default": 30,
+                    "min": 1,
+                    "max": 365
+                }),
+                "top_n": ("INT", {
+                    "default": 10,
+                    "min": 1,
+                    "max": 100
+                }),
+                "days": ("INT", {
+                    "default": 30,
+                    "min": 1,
+                    "max": 365
+                }),
+                # 只讀結果的緩存時間（秒），0 表示每次都重新請求
+                "cache_ttl_seconds": ("INT", {
+                    "default": 300,
+                    "min": 0,
+                    "max": 86400
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "BOOLEAN")
+    RETURN_NAMES = ("report", "data_json", "success")
+    CATEGORY = "Social Media/Threads/Insights"
+    FUNCTION = "run_insights"
+    
+    @classmethod
+    def IS_CHANGED(cls, action: str = "", access_token: str = "",
+                   cache_ttl_seconds: int = DEFAULT_CACHE_TTL, **kwargs):
+        # 同步在 TTL 內只執行一次；報表只查詢本地數據庫，需反映其他節點剛完成的同步
+        if action == "sync":
+            return cache_bucket(access_token, cache_ttl_seconds)
+        return never_cached()
+    
+    def __init__(self):
+        self.api_version = "v1.0"
+        self.base_url = f"https://graph.threads.net/{self.api_version}"
+    
+    def resolve_user_ids(self, threads_user_id: str, access_token: str) -> list:
+        """
+        返回日誌查詢使用的用戶 ID 列表；"me" 同時包含解析後的真實 ID
+        """
+        if threads_user_id != "me":
+            return [threads_user_id]
+        
+        response = fetch_me(self.base_url, access_token, 'id', DEFAULT_CACHE_TTL)
+        if response.status_code != 200:
+            raise RuntimeError(f"無法解析用戶 ID: {response.status_code} - {response.text}")
+        return [response.json().get('id', 'me'), "me"]
+    
+    def run_insights(self, access_token: str, threads_user_id: str, action: str,
+                     sync_posts: bool = True, post_refresh_minutes: int = 60,
+                     post_max_age_days: int = 30, top_n: int = 10, days: int = 30,
+                     cache_ttl_seconds: int = DEFAULT_CACHE_TTL):
+        """
+        主要的洞察函數
+        """
+        try:
+            store = InsightsStore()
+            since = time.time() - days * 86400
+            
+            if action == "sync":
+                if not access_token:
+                    return ("❌ 需要提供存取權杖", "{}", False)
+                
+                report = ["=== Threads 洞察同步 ==="]
+                user_ids = self.resolve_user_ids(threads_user_id, access_token)
+                syncer = ThreadsInsightsSync(self.base_url, store)
+                
+                account_points = syncer.sync_account(user_ids[0], access_token, report)
+                synced_posts = 0
+                if sync_posts:
+                    synced_posts = syncer.sync_posts(
+                        user_ids, access_token, report, post_refresh_minutes * 60, post_max_age_days
+                    )
+                
+                report_text = "\n".join(report)
+                print(report_text)
+                data = {'account_points': account_points, 'synced_posts': synced_posts}
+                return (report_text, json.dumps(data), True)
+            
+            # 報表只讀取本地存儲；"me" 需要先解析為同步時使用的真實用戶 ID
+            if threads_user_id == "me" and access_token:
+                user_ids = self.resolve_user_ids(threads_user_id, access_token)
+            else:
+                user_ids = [threads_user_id]
+            
+            if action == "top_posts":
+                posts = store.top_posts(user_ids, top_n, since)
+                lines = [f"=== 近 {days} 天互動最高的帖子 ==="]
+                for index, post in enumerate(posts, 1):
+                    lines.append(f"{index}. {post['post_id']} 互動 {post['engagement']} / 瀏覽 {post['views']}"
+                                 f" - {post['text_preview'][:30]}")
+                return ("\n".join(lines), json.dumps(posts, ensure_ascii=False), True)
+            
+            elif action == "engagement_by_hour":
+                hours = store.engagement_by_hour(user_ids, since)
+                lines = [f"=== 近 {days} 天各發布時段的平均互動 ==="]
+                for row in hours:
+                    lines.append(f"{row['hour']:02d}:00  帖子 {row['posts']}  平均互動 {row['avg_engagement']:.1f}"
+                                 f"  平均瀏覽 {row['avg_views']:.1f}")
+                return ("\n".join(lines), json.dumps(hours), True)
+            
+            elif action == "account_summary":
+                totals = store.account_totals(user_ids[0], since)
+                lines = [f"=== 近 {days} 天帳戶洞察 ({user_ids[0]}) ==="]
+                for metric, value in sorted(totals.items()):
+                    lines.append(f"{metric}: {value}")
+                return ("\n".join(lines), json.dumps(totals), True)
+            
+            else:
+                return (f"❌ 不支援的操作: {action}", "{}", False)
+            
+        except Exception as e:
+            error_message = f"❌ 洞察處理異常: {str(e)}"
+            print(error_message)
+            return (error_message, "{}", False)
+
+
+class ThreadsProfilingNode:
+    """
+    節點剖析開關 - 在運行時啟用或關閉所有節點的執行剖析，設定在進程內保持到再次切換
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mode": (list(PROFILE_MODES), {
+                    "default": "off"
+                }),
+            },
+            "optional": {
+                "sample_interval_ms": ("INT", {
+                    "default": 5,
+                    "min": 1,
+                    "max": 1000
+                }),
+                # 留空時使用 THREADS_PROFILE_DIR 或數據目錄的 profiles
+                "output_dir": ("STRING", {
+                    "default": "",
+                    "multiline": False
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("status_message", "profile_dir")
+    CATEGORY = "Social Media/Debug"
+    FUNCTION = "set_profiling"
+    IS_CHANGED = classmethod(never_cached)
+    # 不剖析開關本身
+    PROFILER_EXEMPT = True
+    
+    def set_profiling(self, mode: str, sample_interval_ms: int = 5, output_dir: str = ""):
+        try:
+            profiler = get_node_profiler()
+            profiler.configure(mode, output_dir.strip(), sample_interval_ms)
+            if mode == "off":
+                status_message = f"🔬 節點剖析已關閉（本進程共保存 {profiler.saved} 次執行）"
+            else:
+                status_message = f"🔬 節點剖析已啟用 ({mode})，之後執行的節點會保存剖析文件到 {profiler.output_dir}"
+            print(status_message)
+            return (status_message, profiler.output_dir)
+        except Exception as e:
+            error_message = f"❌ 剖析設定異常: {str(e)}"
+            print(error_message)
+            return (error_message, "")
 
 
 # 節點註冊 - 更新版本
@@ -1884,12 +4019,27 @@ NODE_CLASS_MAPPINGS = {
    "ThreadsUserInfoNode": ThreadsUserInfoNode,
    "ThreadsTokenValidatorNode": ThreadsTokenValidatorNode,
    "ThreadsQuickTestNode": ThreadsQuickTestNode,
+   "ThreadsProfilingNode": ThreadsProfilingNode,
+   "ThreadsListPostsNode": ThreadsListPostsNode,
+   "ThreadsReplyManagerNode": ThreadsReplyManagerNode,
+   "ThreadsBulkDeleteNode": ThreadsBulkDeleteNode,
    
    # 媒體處理節點
    "ThreadsMediaUploaderNode": ThreadsMediaUploaderNode,
+   "ThreadsMediaHandleNode": ThreadsMediaHandleNode,
+   "ThreadsImageDedupeNode": ThreadsImageDedupeNode,
    
    # 一體化節點
    "ThreadsAllInOneNode": ThreadsAllInOneNode,
+   "ThreadsFanOutPublishNode": ThreadsFanOutPublishNode,
+   
+   # 排程節點
+   "ThreadsSchedulerNode": ThreadsSchedulerNode,
+   "ThreadsIngestNode": ThreadsIngestNode,
+   "ThreadsPublishQueueNode": ThreadsPublishQueueNode,
+   
+   # 洞察節點
+   "ThreadsInsightsNode": ThreadsInsightsNode,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -1901,11 +4051,53 @@ NODE_DISPLAY_NAME_MAPPINGS = {
    "ThreadsUserInfoNode": "👤 Get Threads User Info (Enhanced)",
    "ThreadsTokenValidatorNode": "🔐 Validate Threads Token (Enhanced)",
    "ThreadsQuickTestNode": "⚡ Threads Quick Test (Enhanced)",
+   "ThreadsProfilingNode": "🔬 Threads Node Profiling",
+   "ThreadsListPostsNode": "📜 List Threads Posts",
+   "ThreadsReplyManagerNode": "💬 Threads Reply Manager",
+   "ThreadsBulkDeleteNode": "🗑️ Threads Bulk Delete",
    
    # 媒體處理
    "ThreadsMediaUploaderNode": "📤 Threads Media Uploader",
+   "ThreadsMediaHandleNode": "📎 Threads Media Handle",
+   "ThreadsImageDedupeNode": "🔍 Threads Image Dedupe",
    
    # 一體化
    "ThreadsAllInOneNode": "🎯 Threads All-in-One (Enhanced)",
+   "ThreadsFanOutPublishNode": "📣 Threads Multi-Account Fan-Out",
+   
+   # 排程
+   "ThreadsSchedulerNode": "⏰ Threads Scheduled Posts",
+   "ThreadsIngestNode": "📂 Threads Watch Folder",
+   "ThreadsPublishQueueNode": "📥 Threads Publish Queue",
+   
+   # 洞察
+   "ThreadsInsightsNode": "📊 Threads Insights",
 }
-                
\ No newline at end of file
+
+# THREADS_CASSETTE 設定時錄製或重放所有 HTTP 請求
+# 重放設定無效時拒絕所有請求，不會退回真實網絡
+start_cassette_from_env()
+
+# THREADS_PROFILE 設定時包裝節點方法；未設定時不做任何改動
+try:
+    setup_node_profiling(NODE_CLASS_MAPPINGS)
+except Exception as e:
+    print(f"⚠️ 節點剖析啟用失敗: {str(e)}")
+
+# 重新啟動後恢復尚未執行的排程貼文
+try:
+    resume_pending_schedules(run_scheduled_post)
+except Exception as e:
+    print(f"⚠️ 排程器恢復失敗: {str(e)}")
+
+# 有監視配置時啟動監視資料夾服務
+try:
+    resume_ingest_service(run_scheduled_post)
+except Exception as e:
+    print(f"⚠️ 監視資料夾服務啟動失敗: {str(e)}")
+
+# 有未完成的隊列任務時啟動發布隊列工作進程
+try:
+    resume_publish_queue()
+except Exception as e:
+    print(f"⚠️ 發布隊列恢復失敗: {str(e)}")
@@ -0,0 +1,248 @@
+"""
+Threads 只讀請求的進程級響應緩存
+配合節點的 IS_CHANGED 時間分桶，同一權杖在 TTL 內重複執行的工作流不會重複請求 API
+"""
+
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+try:
+    from .threads_common import token_fingerprint
+except ImportError:
+    from threads_common import token_fingerprint
+
+DEFAULT_CACHE_TTL = 300
+MAX_CACHE_ENTRIES = 512
+
+
+def cache_bucket(access_token: str, ttl_seconds: int):
+    """
+    IS_CHANGED 的返回值：TTL 時間桶 + 權杖雜湊；TTL 為 0 時返回 NaN（永遠視為已變更）
+    """
+    if not ttl_seconds or ttl_seconds <= 0:
+        return float("nan")
+    return f"{int(time.time() // ttl_seconds)}:{token_fingerprint(access_token)}"
+
+
+def never_cached(*args, **kwargs):
+    """
+    有副作用的節點（發布、上傳、權杖交換）使用：NaN 不等於自身，ComfyUI 每次都會重新執行
+    """
+    return float("nan")
+
+
+class CachedResponse:
+    """
+    requests.Response 的精簡快照，只保留節點使用的屬性
+    """
+
+    __slots__ = ("status_code", "content", "headers", "encoding")
+
+    def __init__(self, response: requests.Response):
+        self.status_code = response.status_code
+        self.content = response.content
+        self.headers = dict(response.headers)
+        self.encoding = response.encoding or "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class TTLCache:
+    """
+    執行緒安全的 TTL + LRU 緩存
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, ttl_seconds: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class _FlightCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    同一鍵的並發調用只執行一次，其他調用者等待並共享結果
+    memo_ttl 大於 0 時，memo_if 判定為成功的結果會保留一段時間，
+    讓稍後才發現錯誤、仍持有舊鍵的調用者直接取得同一結果，而不是再發起一次請求
+    """
+
+    def __init__(self, memo_ttl: float = 0, memo_if=None):
+        self.memo_ttl = memo_ttl
+        self.memo_if = memo_if
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._memo = TTLCache()
+
+    def do(self, key, func):
+        """
+        返回 (結果, 是否共享)；func 拋出的異常會傳遞給所有等待者
+        """
+        with self._lock:
+            if self.memo_ttl > 0:
+                memoized = self._memo.get(key, self.memo_ttl)
+                if memoized is not None:
+                    return memoized, True
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _FlightCall()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # 先寫入記憶再移除進行中的調用，兩者之間到達的調用者不會重複執行
+                if call.error is None and self.memo_ttl > 0 and (self.memo_if is None or self.memo_if(call.result)):
+                    self._memo.put(key, call.result)
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+_response_cache = TTLCache()
+
+
+def get_response_cache() -> TTLCache:
+    return _response_cache
+
+
+def cached_get(url: str, params: dict = None, ttl_seconds: int = DEFAULT_CACHE_TTL,
+               timeout: int = 30):
+    """
+    帶緩存的 GET：只緩存 200 響應；TTL 為 0 時直接請求
+    緩存鍵使用權杖雜湊而不是權杖本身
+    """
+    params = params or {}
+    if not ttl_seconds or ttl_seconds <= 0 or (isinstance(ttl_seconds, float) and math.isnan(ttl_seconds)):
+        return requests.get(url, params=params, timeout=timeout)
+
+    key = (url, tuple(sorted(
+        (k, token_fingerprint(v) if k == 'access_token' else str(v)) for k, v in params.items()
+    )))
+    cached = _response_cache.get(key, ttl_seconds)
+    if cached is not None:
+        return cached
+
+    response = CachedResponse(requests.get(url, params=params, timeout=timeout))
+    if response.status_code == 200:
+        _response_cache.put(key, response)
+    return response
+
+
+# 插件各節點讀取 /me 時使用的欄位聯集；任一節點的請求都取回全部欄位，供其他節點直接使用
+DEFAULT_PROFILE_FIELDS = ("id", "username", "name", "threads_profile_picture_url", "threads_biography")
+
+
+class ProfileFetcher:
+    """
+    跨節點共用的 /me 讀取器
+    同一權杖的請求合併欄位後只發出一次，並發的調用者共享進行中的請求，之後的調用者在 TTL 內直接使用緩存
+    """
+
+    def __init__(self, default_fields: tuple = DEFAULT_PROFILE_FIELDS):
+        self.default_fields = tuple(default_fields)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._fields = {}
+        self._cache = TTLCache()
+        self._flight = SingleFlight()
+
+    def _request(self, base_url: str, access_token: str, key: str) -> tuple:
+        with self._lock:
+            fields = set(self.default_fields) | self._fields.get(key, set())
+            self.requests += 1
+        ordered = [field for field in self.default_fields if field in fields] + \
+            sorted(fields - set(self.default_fields))
+        response = CachedResponse(requests.get(f"{base_url}/me", params={
+            'fields': ",".join(ordered),
+            'access_token': access_token
+        }, timeout=30))
+        if response.status_code == 200:
+            self._cache.put(key, (fields, response))
+        return fields, response
+
+    def fetch(self, base_url: str, access_token: str, fields: str = "", ttl_seconds: int = DEFAULT_CACHE_TTL):
+        """
+        返回 /me 的響應（CachedResponse），包含至少 fields 中的欄位；只緩存 200 響應
+        """
+        wanted = {field.strip() for field in (fields or "id").split(",") if field.strip()}
+        key = f"{base_url}:{token_fingerprint(access_token)}"
+        use_cache = bool(ttl_seconds) and ttl_seconds > 0 and not (
+            isinstance(ttl_seconds, float) and math.isnan(ttl_seconds))
+        with self._lock:
+            self._fields.setdefault(key, set()).update(wanted)
+
+        if use_cache:
+            cached = self._cache.get(key, ttl_seconds)
+            if cached is not None and wanted <= cached[0]:
+                return cached[1]
+
+        # 共享的請求若在本次調用登記欄位之前已經發出，可能缺少欄位，此時再請求一次
+        for _ in range(2):
+            (fetched_fields, response), shared = self._flight.do(
+                key, lambda: self._request(base_url, access_token, key)
+            )
+            if response.status_code != 200 or wanted <= fetched_fields:
+                return response
+        return response
+
+
+_profile_fetcher = ProfileFetcher()
+
+
+def get_profile_fetcher() -> ProfileFetcher:
+    return _profile_fetcher
+
+
+def fetch_me(base_url: str, access_token: str, fields: str = "", ttl_seconds: int = DEFAULT_CACHE_TTL):
+    return _profile_fetcher.fetch(base_url, access_token, fields, ttl_seconds)
@@ -0,0 +1,142 @@
+"""
+Threads 發布端點能力緩存
+記住每個帳戶上次成功的發布端點和參數形式，下次直接使用；端點形式不被接受時作廢並回退到其他端點
+"""
+
+import json
+import os
+import threading
+import time
+
+try:
+    from .threads_common import get_data_dir, token_fingerprint
+except ImportError:
+    from threads_common import get_data_dir, token_fingerprint
+
+# 方法A: POST /{creation_id}/publish（只帶權杖）
+CONTAINER_PUBLISH = "container_publish"
+# 方法B: POST /me/threads_publish（表單帶 creation_id）
+THREADS_PUBLISH = "threads_publish"
+PUBLISH_METHODS = (CONTAINER_PUBLISH, THREADS_PUBLISH)
+CAPABILITY_TTL = 24 * 3600
+# 端點形式錯誤：3 未知方法、100 無效參數 / 不支援的請求、2500 未知路徑
+ENDPOINT_SHAPE_ERROR_CODES = {3, 100, 2500}
+ENDPOINT_SHAPE_STATUS = {404, 405}
+
+
+def build_publish_request(method: str, base_url: str, creation_id: str, access_token: str) -> tuple:
+    """
+    返回指定發布方法的 (url, form_data)
+    """
+    if method == CONTAINER_PUBLISH:
+        return (f"{base_url}/{creation_id}/publish", {'access_token': access_token})
+    return (f"{base_url}/me/threads_publish", {'creation_id': creation_id, 'access_token': access_token})
+
+
+def is_endpoint_shape_error(response) -> bool:
+    """
+    判斷發布失敗是否因為端點或參數形式不被接受；只有這類錯誤才需要作廢記錄並換端點
+    限流、5xx、容器未就緒等錯誤換端點也不會成功，直接返回給調用方
+    """
+    if response.status_code in ENDPOINT_SHAPE_STATUS:
+        return True
+    if response.status_code == 429 or response.status_code >= 500:
+        return False
+    try:
+        error = response.json().get('error', {})
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(error, dict) and error.get('code') in ENDPOINT_SHAPE_ERROR_CODES
+
+
+def account_key(access_token: str, resolve_user_id=None) -> str:
+    """
+    能力記錄的帳戶鍵：用 resolve_user_id(權杖) 解析出的真實用戶 ID，權杖重新整理後仍對應同一記錄
+    無法解析時退回權杖指紋
+    """
+    if resolve_user_id is not None:
+        try:
+            user_id = resolve_user_id(access_token)
+        except Exception as e:
+            print(f"⚠️ 無法解析用戶 ID，發布能力記錄改用權杖指紋: {str(e)}")
+            user_id = ""
+        if user_id:
+            return user_id
+    return f"token:{token_fingerprint(access_token)}"
+
+
+class PublishCapabilityCache:
+    """
+    每個帳戶成功過的發布方法，保存在數據目錄的 publish_capabilities.json
+    """
+
+    def __init__(self, path: str = "", ttl: float = CAPABILITY_TTL):
+        self.path = path or os.path.join(get_data_dir(), "publish_capabilities.json")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 發布能力緩存寫入失敗: {str(e)}")
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or time.time() - entry["updated_at"] > self.ttl:
+                return None
+            return entry["method"]
+
+    def remember(self, key: str, method: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["method"] == method and time.time() - entry["updated_at"] < self.ttl / 2:
+                # 近期已記錄，避免每次發布都寫文件
+                return
+            self._entries[key] = {"method": method, "updated_at": time.time()}
+            self._save()
+
+    def invalidate(self, key: str, method: str = "") -> None:
+        """
+        作廢記錄；指定 method 時只在記錄的正是該方法時作廢
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (not method or entry["method"] == method):
+                del self._entries[key]
+                self._save()
+
+    def order(self, key: str, default: tuple = PUBLISH_METHODS) -> list:
+        """
+        嘗試順序：記錄的方法優先，其餘按 default 順序
+        """
+        known = self.get(key)
+        methods = list(default)
+        for method in PUBLISH_METHODS:
+            if method not in methods:
+                methods.append(method)
+        if known in methods:
+            methods.remove(known)
+            methods.insert(0, known)
+        return methods
+
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+def get_capability_cache() -> PublishCapabilityCache:
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is None:
+            _capabilities = PublishCapabilityCache()
+        return _capabilities
@@ -0,0 +1,360 @@
+"""
+HTTP 錄製 / 重放（卡帶）
+在傳輸層（requests 的 HTTPAdapter.send）錄製真實運行中的 Graph API 和圖床請求到 JSONL 卡帶文件，
+權杖、密鑰等敏感值在寫入前替換為 REDACTED；重放模式按錄製順序返回響應，可按原始或縮放後的耗時延遲，
+讓一體化節點、快速測試和權杖節點完全離線運行，用於剖析和回歸基準測試
+
+    THREADS_CASSETTE=record:/path/session.jsonl   錄製
+    THREADS_CASSETTE=replay:/path/session.jsonl   重放
+    THREADS_CASSETTE_TIMING=0.5                   重放耗時倍率（默認 1 為原始耗時，0 為不延遲）
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+REDACTED = "REDACTED"
+CASSETTE_MODES = ("record", "replay")
+# 查詢參數、表單欄位和 JSON 響應中按名稱脫敏的欄位
+SECRET_FIELDS = {
+    "access_token", "client_secret", "client_id", "fb_exchange_token", "code", "key", "api_key",
+    "refresh_token", "secret_access_key",
+}
+SECRET_HEADERS = {"authorization", "cookie", "set-cookie", "x-amz-security-token"}
+# 超過此大小的響應體只記錄雜湊，不保存內容
+MAX_RECORDED_BODY = 5 * 1024 * 1024
+MAX_RECORDED_FIELD = 200
+
+
+class CassetteMiss(requests.ConnectionError):
+    """
+    重放時沒有對應的錄製響應
+    """
+
+
+def _redact_query(url: str, secrets: set = None) -> str:
+    parts = urlsplit(url)
+    query = [(name, REDACTED if name in SECRET_FIELDS else value) for name, value in parse_qsl(parts.query, True)]
+    if secrets is not None:
+        secrets.update(value for name, value in parse_qsl(parts.query, True) if name in SECRET_FIELDS and value)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ""))
+
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SECRET_FIELDS and isinstance(value[key], str) else _redact_json(value[key])
+                for key in value}
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+
+def _scrub(text: str, secrets: set) -> str:
+    for secret in secrets:
+        if len(secret) >= 8:
+            text = text.replace(secret, REDACTED)
+    return text
+
+
+def _body_summary(body, secrets: set) -> dict:
+    """
+    請求體摘要：表單欄位脫敏並截斷，其他內容只記錄大小和雜湊（媒體上傳可能有數百 MB）
+    """
+    if body is None:
+        return {}
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, bytes):
+        return {"streamed": True}
+    summary = {"size": len(body), "sha256": hashlib.sha256(body).hexdigest()}
+    if len(body) <= MAX_RECORDED_BODY:
+        try:
+            fields = parse_qsl(body.decode("ascii"), True, True)
+        except (UnicodeDecodeError, ValueError):
+            fields = []
+        if fields:
+            secrets.update(value for name, value in fields if name in SECRET_FIELDS and value)
+            summary["form"] = {
+                name: REDACTED if name in SECRET_FIELDS else value[:MAX_RECORDED_FIELD] for name, value in fields
+            }
+    return summary
+
+
+def match_keys(method: str, url: str) -> tuple:
+    """
+    (完整鍵, 路徑鍵)：完整鍵包含脫敏後的查詢參數，找不到時退回只按方法和路徑匹配
+    """
+    redacted = _redact_query(url)
+    parts = urlsplit(redacted)
+    return f"{method.upper()} {redacted}", f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class Cassette:
+    """
+    一個卡帶文件；錄製時逐條追加，重放時按鍵分組並依序返回，用盡後重複最後一條（輪詢類請求）
+    """
+
+    def __init__(self, path: str, mode: str, timing_scale: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"不支援的卡帶模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing_scale = max(0.0, timing_scale)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._secrets = set()
+        self._lock = threading.Lock()
+        self._by_key = defaultdict(list)
+        self._by_path = defaultdict(list)
+        self._cursors = defaultdict(int)
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                interaction = json.loads(line)
+                full_key, path_key = match_keys(interaction["method"], interaction["url"])
+                self._by_key[full_key].append(interaction)
+                self._by_path[path_key].append(interaction)
+
+    def _next(self, table: dict, key: str):
+        interactions = table.get(key)
+        if not interactions:
+            return None
+        cursor_key = (id(table), key)
+        index = self._cursors[cursor_key]
+        self._cursors[cursor_key] = index + 1
+        return interactions[min(index, len(interactions) - 1)]
+
+    def record(self, request, response, elapsed: float, read_body: bool = True) -> None:
+        with self._lock:
+            headers = dict(request.headers)
+            for name, value in headers.items():
+                if name.lower() == "authorization" and " " in value:
+                    self._secrets.add(value.split(" ", 1)[1])
+            url = _redact_query(request.url, self._secrets)
+            request_body = _body_summary(request.body, self._secrets)
+
+            content = response.content if response._content_consumed or read_body else None
+            interaction = {
+                "method": request.method,
+                "url": _scrub(url, self._secrets),
+                "request_body": request_body,
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {
+                    name: REDACTED if name.lower() in SECRET_HEADERS else _scrub(value, self._secrets)
+                    for name, value in response.headers.items()
+                },
+                "elapsed": round(elapsed, 4),
+                "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
+            interaction.update(self._encode_body(content))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def _encode_body(self, content) -> dict:
+        if content is None:
+            return {"body_omitted": True}
+        if len(content) > MAX_RECORDED_BODY:
+            return {"body_omitted": True, "body_size": len(content),
+                    "body_sha256": hashlib.sha256(content).hexdigest()}
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError:
+            return {"body_base64": base64.b64encode(content).decode("ascii")}
+        try:
+            document = json.loads(text)
+        except ValueError:
+            return {"body_text": _scrub(text, self._secrets)}
+        # 響應中新發放的權杖也加入脫敏集合，後續請求中出現時同樣替換
+        self._collect_secrets(document)
+        return {"body_json": json.loads(_scrub(json.dumps(_redact_json(document), ensure_ascii=False), self._secrets))}
+
+    def _collect_secrets(self, value) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in SECRET_FIELDS and isinstance(item, str) and item:
+                    self._secrets.add(item)
+                else:
+                    self._collect_secrets(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._collect_secrets(item)
+
+    def replay(self, request):
+        full_key, path_key = match_keys(request.method, request.url)
+        with self._lock:
+            interaction = self._next(self._by_key, full_key) or self._next(self._by_path, path_key)
+            if interaction is None:
+                self.misses += 1
+                raise CassetteMiss(f"卡帶 {os.path.basename(self.path)} 中沒有 {request.method} {urlsplit(request.url).path} 的錄製響應")
+            self.replayed += 1
+
+        if self.timing_scale and interaction.get("elapsed"):
+            time.sleep(interaction["elapsed"] * self.timing_scale)
+
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction.get("reason", "")
+        response.headers = CaseInsensitiveDict(interaction.get("headers", {}))
+        response.headers.pop("Content-Encoding", None)
+        response.headers.pop("Transfer-Encoding", None)
+        if "body_json" in interaction:
+            content = json.dumps(interaction["body_json"], ensure_ascii=False).encode("utf-8")
+        elif "body_text" in interaction:
+            content = interaction["body_text"].encode("utf-8")
+        elif "body_base64" in interaction:
+            content = base64.b64decode(interaction["body_base64"])
+        else:
+            content = b""
+        response._content = content
+        response._content_consumed = True
+        response.headers["Content-Length"] = str(len(content))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=interaction.get("elapsed", 0))
+        return response
+
+
+class BlockingCassette:
+    """
+    重放設定無效（卡帶文件不存在、格式錯誤、耗時倍率無法解析）時啟用：拒絕所有請求，
+    不會退回真實網絡，避免以為在離線重放時實際使用真實權杖發布
+    """
+
+    mode = "replay"
+
+    def __init__(self, reason: str, path: str = ""):
+        self.reason = reason
+        self.path = path
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def replay(self, request):
+        self.misses += 1
+        raise CassetteMiss(f"HTTP 卡帶重放設定無效（{self.reason}），已阻止 {request.method} "
+                           f"{urlsplit(request.url).path}")
+
+
+def _should_read(response, stream: bool) -> bool:
+    """
+    超過上限的響應不讀取；串流請求只在長度已知時讀取，避免為了錄製而下載整個媒體文件
+    """
+    length = response.headers.get("Content-Length", "")
+    if length.isdigit():
+        return int(length) <= MAX_RECORDED_BODY
+    return not stream
+
+
+_original_send = HTTPAdapter.send
+_active = None
+_active_lock = threading.Lock()
+
+
+def _cassette_send(adapter, request, **kwargs):
+    cassette = _active
+    if cassette is None:
+        return _original_send(adapter, request, **kwargs)
+    if cassette.mode == "replay":
+        return cassette.replay(request)
+    started = time.perf_counter()
+    response = _original_send(adapter, request, **kwargs)
+    # 在這裡讀完響應體，錄製的耗時包含下載時間
+    read_body = _should_read(response, kwargs.get("stream", False))
+    if read_body:
+        response.content
+    cassette.record(request, response, time.perf_counter() - started, read_body)
+    return response
+
+
+def _install(cassette):
+    global _active
+    with _active_lock:
+        _active = cassette
+        HTTPAdapter.send = _cassette_send
+    return cassette
+
+
+def start_cassette(path: str, mode: str, timing_scale: float = 1.0) -> Cassette:
+    """
+    啟用卡帶；同一時間只有一個卡帶生效
+    """
+    return _install(Cassette(path, mode, timing_scale))
+
+
+def block_requests(reason: str, path: str = "") -> BlockingCassette:
+    """
+    啟用拒絕所有請求的卡帶
+    """
+    return _install(BlockingCassette(reason, path))
+
+
+def stop_cassette():
+    global _active
+    with _active_lock:
+        cassette = _active
+        _active = None
+        HTTPAdapter.send = _original_send
+    return cassette
+
+
+def get_active_cassette():
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, timing_scale: float = 1.0):
+    cassette = start_cassette(path, mode, timing_scale)
+    try:
+        yield cassette
+    finally:
+        stop_cassette()
+
+
+def start_cassette_from_env():
+    """
+    按 THREADS_CASSETTE=record:<路徑> / replay:<路徑> 啟用卡帶
+    錄製設定無效時只警告並照常發送真實請求；其他無效設定（包括重放）一律拒絕所有請求，不會連接真實網絡
+    """
+    value = os.environ.get("THREADS_CASSETTE", "").strip()
+    if not value:
+        return None
+    mode, _, path = value.partition(":")
+    try:
+        if mode not in CASSETTE_MODES or not path:
+            raise ValueError(f"THREADS_CASSETTE 格式應為 record:<路徑> 或 replay:<路徑>，目前為: {value}")
+        timing_scale = 1.0
+        if mode == "replay":
+            timing_scale = float(os.environ.get("THREADS_CASSETTE_TIMING", "1") or 1)
+        cassette = start_cassette(path, mode, timing_scale)
+    except Exception as e:
+        if mode == "record":
+            print(f"⚠️ HTTP 卡帶錄製啟用失敗，照常發送真實請求: {str(e)}")
+            return None
+        print(f"❌ HTTP 卡帶重放啟用失敗，所有 HTTP 請求將被拒絕: {str(e)}")
+        return block_requests(str(e), path)
+    action = "錄製到" if mode == "record" else f"重放（耗時倍率 {timing_scale}）"
+    print(f"📼 HTTP 卡帶已啟用: {action} {path}")
+    return cassette
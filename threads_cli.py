@@ -0,0 +1,434 @@
+"""
+Threads 命令行批量發布
+在 ComfyUI 之外讀取 JSONL / CSV 清單逐行發布，適合歷史回填和 cron 任務
+
+    python threads_cli.py publish posts.jsonl --workers 4
+    python threads_cli.py publish posts.csv --dry-run
+    python threads_cli.py enqueue posts.jsonl && python threads_cli.py queue-status
+
+清單每行一個帖子，欄位：text, media_file_path (或 media_path), media_url, post_type,
+account / access_token, threads_user_id；其他欄位若是一體化節點 publish_all_in_one 的參數則原樣傳入。
+結果逐行追加到結果文件（默認為 <清單>.results.jsonl），中斷後重新執行會跳過已成功的行
+"""
+
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# 命令行進程不啟動 ComfyUI 用的後台排程器和監視資料夾服務
+os.environ.setdefault("THREADS_SCHEDULER_DISABLED", "1")
+os.environ.setdefault("THREADS_INGEST_DISABLED", "1")
+os.environ.setdefault("THREADS_QUEUE_DISABLED", "1")
+
+try:
+    from .threads_preflight import QuotaLedger, format_verdict, preflight_post
+    from .threads_queue import DEFAULT_IDLE_EXIT, DEFAULT_LEASE_SECONDS, PublishQueueStore, QueueWorker
+    from .threads_urlcheck import check_media_urls
+except ImportError:
+    from threads_preflight import QuotaLedger, format_verdict, preflight_post
+    from threads_queue import DEFAULT_IDLE_EXIT, DEFAULT_LEASE_SECONDS, PublishQueueStore, QueueWorker
+    from threads_urlcheck import check_media_urls
+
+POST_TYPES = {
+    "TEXT": "TEXT_ONLY", "TEXT_ONLY": "TEXT_ONLY", "TEXT_POST": "TEXT_ONLY",
+    "IMAGE": "IMAGE_POST", "IMAGE_POST": "IMAGE_POST",
+    "VIDEO": "VIDEO_POST", "VIDEO_POST": "VIDEO_POST",
+}
+VIDEO_EXTENSIONS = (".mp4", ".mov")
+ACCOUNT_TOKEN_ENV = "THREADS_ACCESS_TOKEN"
+# 每批並行預檢的清單行數
+URL_PREFETCH_BATCH = 32
+
+
+def iter_manifest(path: str):
+    """
+    流式讀取清單，逐行產生 (行號, 欄位字典)；.csv 使用表頭作為欄位名，其餘按 JSONL 解析
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, {key: value for key, value in row.items() if key and value not in (None, "")}
+            return
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, {"_error": f"JSON 解析失敗: {str(e)}"}
+                continue
+            yield line_number, row if isinstance(row, dict) else {"_error": "每行必須是 JSON 物件"}
+
+
+def row_key(line_number: int, row: dict) -> str:
+    # 有 id 欄位時以 id 識別，清單插入或刪除行後仍能正確續傳
+    return str(row.get("id") or f"line:{line_number}")
+
+
+def load_completed(results_path: str) -> set:
+    """
+    從結果文件讀取已成功的行；失敗的行在下次執行時重試
+    """
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # 上次中斷時可能留下半行
+                continue
+            # 預檢結果不算完成
+            if result.get("success") and not result.get("dry_run"):
+                completed.add(result["key"])
+    return completed
+
+
+def load_accounts(path: str) -> dict:
+    """
+    帳戶文件格式: {"帳戶名": {"access_token": "...", "threads_user_id": "me", "client_secret": "..."}}
+    """
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_account(row: dict, accounts: dict) -> dict:
+    """
+    按 access_token 欄位 > accounts 文件 > THREADS_ACCESS_TOKEN_<帳戶名> > THREADS_ACCESS_TOKEN 取得帳戶設定
+    """
+    name = str(row.get("account", ""))
+    account = dict(accounts.get(name, {})) if name else {}
+    if row.get("access_token"):
+        account["access_token"] = row["access_token"]
+    if not account.get("access_token"):
+        env_name = f"{ACCOUNT_TOKEN_ENV}_{name.upper()}" if name else ACCOUNT_TOKEN_ENV
+        account["access_token"] = os.environ.get(env_name, "") or os.environ.get(ACCOUNT_TOKEN_ENV, "")
+    return account
+
+
+def coerce_value(default, value):
+    """
+    CSV 欄位都是字符串，按參數默認值的類型轉換
+    """
+    if not isinstance(value, str) or isinstance(default, str) or default is None:
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def row_post_type(row: dict) -> str:
+    """
+    清單行的 post_type；未填寫時按媒體文件或 URL 的副檔名推斷
+    """
+    post_type = str(row.get("post_type", "")).upper()
+    if not post_type:
+        media_name = (row.get("media_file_path") or row.get("media_path") or row.get("media_url", "")).lower()
+        media_name = media_name.split("?")[0]
+        post_type = "VIDEO" if media_name.endswith(VIDEO_EXTENSIONS) else "IMAGE" if media_name else "TEXT"
+    if post_type not in POST_TYPES:
+        raise ValueError(f"不支援的 post_type: {post_type}")
+    return post_type
+
+
+def prefetch_media_urls(rows, batch_size: int = URL_PREFETCH_BATCH):
+    """
+    逐批並行預檢清單行的 media_url 後再原樣產生這些行；結果寫入 URL 預檢緩存，
+    發布時一體化節點對每個帖子的單個預檢直接命中緩存，不再逐個串行請求
+    """
+    rows = iter(rows)
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        items = []
+        for _, _, row in batch:
+            if "_error" in row or not row.get("media_url"):
+                continue
+            try:
+                post_type = POST_TYPES[row_post_type(row)]
+            except ValueError:
+                continue
+            if post_type != "TEXT_ONLY":
+                items.append((str(row["media_url"]), post_type.replace("_POST", "")))
+        failed = [result for result in check_media_urls(items) if not result["ok"]]
+        if failed:
+            print(f"⚠️ {len(failed)}/{len(items)} 個媒體 URL 預檢失敗，對應的行將不會發布")
+        yield from batch
+
+
+def build_payload(row: dict, accounts: dict, defaults: dict, parameters: dict) -> dict:
+    """
+    將清單行轉換為 publish_all_in_one 的參數；parameters 為參數名到默認值的映射
+    """
+    account = resolve_account(row, accounts)
+    media_file_path = row.get("media_file_path") or row.get("media_path") or ""
+    media_url = row.get("media_url", "")
+    post_type = row_post_type(row)
+
+    payload = dict(defaults)
+    for source in (account, row):
+        payload.update({key: coerce_value(parameters[key], value)
+                        for key, value in source.items() if key in parameters})
+    payload.update({
+        "text": row.get("text", ""),
+        "threads_user_id": str(row.get("threads_user_id") or account.get("threads_user_id") or "me"),
+        "post_type": POST_TYPES[post_type],
+        "media_file_path": media_file_path,
+        "media_url": media_url,
+        "access_token": account.get("access_token", ""),
+    })
+    if payload["media_file_path"] and not os.path.isabs(payload["media_file_path"]):
+        payload["media_file_path"] = os.path.join(defaults.get("_base_dir", ""), payload["media_file_path"])
+    payload.pop("_base_dir", None)
+    return payload
+
+
+def publish_payload(payload: dict) -> dict:
+    """
+    使用一體化節點發布單個帖子
+    """
+    try:
+        from .threads_api import run_scheduled_post
+    except ImportError:
+        from threads_api import run_scheduled_post
+    success, result = run_scheduled_post(payload)
+    return dict(result, success=success)
+
+
+def run_queue_payload(payload: dict) -> tuple:
+    """
+    隊列工作進程的任務執行函數
+    """
+    payload = {key: value for key, value in payload.items() if key != "queue_media"}
+    result = publish_payload(payload)
+    return result.pop("success"), result
+
+
+def preflight_payload(payload: dict, ledger: QuotaLedger) -> dict:
+    verdict = preflight_post(
+        payload["access_token"], payload["text"],
+        {"IMAGE_POST": "IMAGE", "VIDEO_POST": "VIDEO"}.get(payload["post_type"], "TEXT"),
+        payload["threads_user_id"], payload["media_file_path"], payload["media_url"],
+        max_file_size_mb=float(payload.get("max_file_size_mb", 0) or 0),
+        auto_thread=bool(payload.get("auto_thread")), ledger=ledger
+    )
+    return {"success": verdict["ok"], "message": format_verdict(verdict), "verdict": verdict}
+
+
+class ResultWriter:
+    """
+    結果逐行追加並立即寫入磁碟，進程被中斷時已完成的行不會丟失
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+
+    def write(self, result: dict) -> None:
+        with self._lock:
+            if result.get("success"):
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def publish_parameters() -> dict:
+    """
+    publish_all_in_one 的參數名到默認值的映射
+    """
+    try:
+        from .threads_api import ThreadsAllInOneNode
+    except ImportError:
+        from threads_api import ThreadsAllInOneNode
+    return {
+        name: parameter.default
+        for name, parameter in inspect.signature(ThreadsAllInOneNode.publish_all_in_one).parameters.items()
+        if name not in ("self", "media")
+    }
+
+
+def run_manifest(manifest_path: str, results_path: str = "", workers: int = 4, accounts_path: str = "",
+                 defaults: dict = None, dry_run: bool = False, limit: int = 0) -> dict:
+    """
+    執行整份清單；同時進行中的任務數不超過 workers 的兩倍，內存佔用與清單大小無關
+    """
+    results_path = results_path or f"{manifest_path}.results.jsonl"
+    completed = load_completed(results_path)
+    accounts = load_accounts(accounts_path)
+    parameters = publish_parameters()
+    defaults = dict(defaults or {}, _base_dir=os.path.dirname(os.path.abspath(manifest_path)))
+    ledger = QuotaLedger()
+    writer = ResultWriter(results_path)
+    skipped = 0
+    submitted = 0
+    started = time.time()
+
+    def iter_rows():
+        nonlocal skipped
+        for line_number, row in iter_manifest(manifest_path):
+            key = row_key(line_number, row)
+            if key in completed:
+                skipped += 1
+                continue
+            yield key, line_number, row
+
+    def run_row(key: str, line_number: int, row: dict) -> None:
+        result = {"key": key, "line": line_number, "dry_run": dry_run}
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            payload = build_payload(row, accounts, defaults, parameters)
+            result.update(preflight_payload(payload, ledger) if dry_run else publish_payload(payload))
+        except Exception as e:
+            result.update({"success": False, "message": f"❌ {str(e)}"})
+        result["finished_at"] = time.time()
+        writer.write(result)
+        print(f"{'✅' if result['success'] else '❌'} {key}: {result.get('post_id') or result['message'].splitlines()[0]}")
+
+    rows = itertools.islice(iter_rows(), limit or None)
+    if not dry_run and defaults.get("precheck_media_url", parameters.get("precheck_media_url", True)):
+        # 離線預檢不發網絡請求；正式發布時整批並行檢查 URL
+        rows = prefetch_media_urls(rows)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = set()
+    try:
+        for key, line_number, row in rows:
+            if len(pending) >= workers * 2:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.add(executor.submit(run_row, key, line_number, row))
+            submitted += 1
+        wait(pending)
+    finally:
+        executor.shutdown(wait=True)
+        writer.close()
+
+    return {
+        "submitted": submitted,
+        "succeeded": writer.succeeded,
+        "failed": writer.failed,
+        "skipped": skipped,
+        "elapsed": round(time.time() - started, 2),
+        "results_path": results_path,
+    }
+
+
+def enqueue_manifest(manifest_path: str, accounts_path: str = "", defaults: dict = None,
+                     db_path: str = "") -> dict:
+    """
+    將清單逐行加入持久化發布隊列，由 queue-worker 進程執行
+    """
+    store = PublishQueueStore(db_path)
+    accounts = load_accounts(accounts_path)
+    parameters = publish_parameters()
+    defaults = dict(defaults or {}, _base_dir=os.path.dirname(os.path.abspath(manifest_path)))
+    job_ids = []
+    errors = 0
+    for line_number, row in iter_manifest(manifest_path):
+        key = row_key(line_number, row)
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            job_ids.append(store.enqueue(build_payload(row, accounts, defaults, parameters), label=key))
+        except Exception as e:
+            errors += 1
+            print(f"❌ {key}: {str(e)}")
+    return {"enqueued": len(job_ids), "errors": errors,
+            "first_job_id": job_ids[0] if job_ids else 0, "last_job_id": job_ids[-1] if job_ids else 0}
+
+
+def parse_defaults(pairs: list) -> dict:
+    """
+    --set key=value 轉換為默認參數；值按 JSON 解析，失敗時作為字符串
+    """
+    defaults = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        try:
+            defaults[key.strip()] = json.loads(value)
+        except ValueError:
+            defaults[key.strip()] = value
+    return defaults
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="threads_cli", description="Threads 命令行批量發布")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="按清單批量發布")
+    publish.add_argument("manifest", help="JSONL 或 CSV 清單")
+    publish.add_argument("--results", default="", help="結果文件（默認為 <清單>.results.jsonl）")
+    publish.add_argument("--workers", type=int, default=4, help="並行發布數")
+    publish.add_argument("--accounts", default="", help="帳戶設定 JSON 文件")
+    publish.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                         help="所有行的默認發布參數，例如 --set upload_service=\"s3\"")
+    publish.add_argument("--dry-run", action="store_true", help="只做離線預檢，不發布")
+    publish.add_argument("--limit", type=int, default=0, help="本次最多處理的行數")
+
+    enqueue = subparsers.add_parser("enqueue", help="將清單加入持久化發布隊列")
+    enqueue.add_argument("manifest", help="JSONL 或 CSV 清單")
+    enqueue.add_argument("--accounts", default="", help="帳戶設定 JSON 文件")
+    enqueue.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="所有行的默認發布參數")
+    enqueue.add_argument("--db", default="", help="隊列數據庫路徑（默認為數據目錄的 publish_queue.db）")
+
+    worker = subparsers.add_parser("queue-worker", help="執行發布隊列中的任務")
+    worker.add_argument("--db", default="", help="隊列數據庫路徑")
+    worker.add_argument("--worker-id", default="", help="工作進程標識（用於租約）")
+    worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="租約秒數")
+    worker.add_argument("--idle-exit", type=float, default=DEFAULT_IDLE_EXIT,
+                        help="空閒多少秒後退出，0 表示一直運行")
+
+    status = subparsers.add_parser("queue-status", help="查看發布隊列")
+    status.add_argument("--db", default="", help="隊列數據庫路徑")
+    status.add_argument("--limit", type=int, default=20, help="列出最近的任務數")
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "publish":
+        summary = run_manifest(args.manifest, args.results, args.workers, args.accounts,
+                               parse_defaults(args.set), args.dry_run, args.limit)
+        print(json.dumps(summary, ensure_ascii=False))
+        return 0 if not summary["failed"] else 1
+    if args.command == "enqueue":
+        summary = enqueue_manifest(args.manifest, args.accounts, parse_defaults(args.set), args.db)
+        print(json.dumps(summary, ensure_ascii=False))
+        return 0 if not summary["errors"] else 1
+    if args.command == "queue-worker":
+        worker = QueueWorker(PublishQueueStore(args.db), run_queue_payload, args.worker_id, args.lease)
+        print(f"📥 發布隊列工作進程 {worker.worker_id} 已啟動")
+        processed = worker.run(args.idle_exit)
+        print(f"📥 工作進程 {worker.worker_id} 空閒退出，共處理 {processed} 個任務")
+        return 0
+    if args.command == "queue-status":
+        store = PublishQueueStore(args.db)
+        print(json.dumps({"counts": store.counts(), "recent": store.list_jobs(limit=args.limit)},
+                         ensure_ascii=False, indent=2))
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
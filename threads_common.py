@@ -0,0 +1,31 @@
+"""
+Threads 節點共用工具
+"""
+
+import hashlib
+import os
+
+
+def get_data_dir(*parts) -> str:
+    """
+    返回插件數據目錄（不存在時自動創建）
+    優先順序: THREADS_DATA_DIR 環境變數 > ComfyUI 用戶目錄 > 插件目錄下的 threads_data
+    """
+    base_dir = os.environ.get("THREADS_DATA_DIR", "")
+    if not base_dir:
+        try:
+            import folder_paths
+            base_dir = os.path.join(folder_paths.get_user_directory(), "threads_uploader")
+        except (ImportError, AttributeError):
+            base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "threads_data")
+
+    path = os.path.join(base_dir, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def token_fingerprint(access_token: str) -> str:
+    """
+    權杖的短雜湊，用於緩存鍵和日誌，避免保存或輸出權杖本身
+    """
+    return hashlib.sha256((access_token or "").encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,331 @@
+"""
+圖片近似重複過濾
+以 NumPy 對整批圖片向量化計算感知雜湊（pHash: 32x32 DCT 低頻 8x8；dHash: 9x8 水平梯度），
+再在每個帳戶已發布圖片的雜湊索引中按漢明距離查找，跳過或標記與已發布圖片（或同批次中較早圖片）過於相似的圖片
+"""
+
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+try:
+    from .threads_common import token_fingerprint
+    from .threads_journal import connect_posts_db, get_posts_db_path
+except ImportError:
+    from threads_common import token_fingerprint
+    from threads_journal import connect_posts_db, get_posts_db_path
+
+HASH_METHODS = ("phash", "dhash")
+DEFAULT_HASH_METHOD = "phash"
+# 64 位雜湊中相差不超過此位數視為近似重複
+DEFAULT_DEDUPE_THRESHOLD = 6
+DEDUPE_MODES = ("off", "flag", "skip")
+PHASH_SIZE = 32
+PHASH_LOW = 8
+DECODE_WORKERS = 4
+
+_popcount = getattr(int, "bit_count", None) or (lambda value: bin(value).count("1"))
+_BYTE_POPCOUNT = None
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("近似重複過濾需要 numpy 和 Pillow")
+
+
+def _dct_matrix(size: int):
+    # DCT-II 正交矩陣，批量變換為 D @ X @ D.T
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = None
+
+
+def _load_gray(source) -> tuple:
+    """
+    讀取單張圖片並縮小為灰度的 32x32 (pHash) 和 9x8 (dHash)；source 可以是路徑、字節或 RGB 陣列
+    """
+    if isinstance(source, np.ndarray):
+        array = source
+        if array.dtype != np.uint8:
+            array = (np.clip(array, 0, 1) * 255).astype(np.uint8)
+        image = Image.fromarray(array[..., :3] if array.ndim == 3 else array)
+    else:
+        image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        # JPEG 可直接以縮小尺寸解碼
+        image.draft("L", (PHASH_SIZE * 4, PHASH_SIZE * 4))
+    gray = image.convert("L")
+    small = gray.resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    tiny = small.resize((9, 8), Image.BILINEAR)
+    return np.asarray(small, dtype=np.float32), np.asarray(tiny, dtype=np.int16)
+
+
+def _pack_bits(bits) -> list:
+    # (N, 64) 布林陣列 -> N 個 64 位整數
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return [int(value) for value in packed.view(">u8").ravel()]
+
+
+def compute_hashes(sources: list, max_workers: int = DECODE_WORKERS) -> list:
+    """
+    批量計算 [{"phash": int, "dhash": int}, ...]；解碼在線程池中並行，雜湊對整批一次計算
+    無法讀取的圖片對應 None
+    """
+    global _DCT
+    _require_numpy()
+    if not sources:
+        return []
+    if _DCT is None:
+        _DCT = _dct_matrix(PHASH_SIZE)
+
+    def load(source):
+        try:
+            return _load_gray(source)
+        except Exception as e:
+            print(f"⚠️ 無法讀取圖片計算雜湊: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as executor:
+        loaded = list(executor.map(load, sources))
+    valid = [index for index, item in enumerate(loaded) if item is not None]
+    results = [None] * len(sources)
+    if not valid:
+        return results
+
+    smalls = np.stack([loaded[index][0] for index in valid])
+    tinies = np.stack([loaded[index][1] for index in valid])
+
+    # pHash: 低頻 8x8 DCT 係數與其中位數（不含直流分量）比較
+    coefficients = (_DCT @ smalls @ _DCT.T)[:, :PHASH_LOW, :PHASH_LOW].reshape(len(valid), -1)
+    medians = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+    phashes = _pack_bits(coefficients > medians)
+    # dHash: 每行相鄰像素的亮度梯度方向
+    dhashes = _pack_bits((tinies[:, :, 1:] > tinies[:, :, :-1]).reshape(len(valid), -1))
+
+    for position, index in enumerate(valid):
+        results[index] = {"phash": phashes[position], "dhash": dhashes[position]}
+    return results
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return _popcount(a ^ b)
+
+
+def popcount_array(values):
+    """
+    uint64 陣列逐元素的位元數；NumPy 2 使用 bitwise_count，舊版本按字節查表
+    """
+    global _BYTE_POPCOUNT
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    if _BYTE_POPCOUNT is None:
+        _BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def pairwise_distances(hashes: list):
+    """
+    批次內兩兩漢明距離矩陣 (N, N)
+    """
+    _require_numpy()
+    values = np.array(hashes, dtype=np.uint64)
+    return popcount_array(values[:, None] ^ values[None, :])
+
+
+class HashArray:
+    """
+    單個帳戶的雜湊集合，保存為連續的 uint64 陣列，查詢時對整個陣列一次 XOR 和位元計數
+    64 位感知雜湊的距離集中在 32 附近，BK 樹在閾值 6 時幾乎無法剪枝，向量化掃描反而快兩個數量級
+    """
+
+    def __init__(self):
+        self._values = np.zeros(0, dtype=np.uint64)
+        self._items = []
+        self._pending = []
+
+    @property
+    def size(self) -> int:
+        return len(self._items)
+
+    def add(self, value: int, item) -> None:
+        # 新增的雜湊先放在列表中，下次查詢時再合併，避免每次插入都複製陣列
+        self._pending.append(value)
+        self._items.append(item)
+
+    def search(self, value: int, threshold: int) -> list:
+        """
+        返回距離不超過閾值的 [(距離, 項目), ...]，按距離排序
+        """
+        if self._pending:
+            self._values = np.concatenate([self._values, np.array(self._pending, dtype=np.uint64)])
+            self._pending = []
+        if not self._items:
+            return []
+        distances = popcount_array(self._values ^ np.uint64(value))
+        positions = np.flatnonzero(distances <= threshold)
+        matches = [(int(distances[position]), self._items[position]) for position in positions]
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+def _to_signed(value: int) -> int:
+    # SQLite INTEGER 是有號 64 位
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def index_account_key(threads_user_id: str, access_token: str = "", resolve_user_id=None) -> str:
+    """
+    已發布圖片索引的帳戶鍵：明確的用戶 ID 直接使用；"me" 用 resolve_user_id(權杖) 解析為真實 ID，
+    無法解析時退回權杖指紋，不同帳戶不會共用同一個 "me" 索引
+    """
+    if threads_user_id and threads_user_id != "me":
+        return threads_user_id
+    if not access_token:
+        raise ValueError('threads_user_id 為 "me" 時需要 access_token 才能區分帳戶')
+    if resolve_user_id is not None:
+        try:
+            user_id = resolve_user_id(access_token)
+        except Exception as e:
+            print(f"⚠️ 無法解析用戶 ID，重複檢查改用權杖指紋: {str(e)}")
+            user_id = ""
+        if user_id:
+            return user_id
+    return f"token:{token_fingerprint(access_token)}"
+
+
+def _check_account(account: str) -> str:
+    if not account or account == "me":
+        raise ValueError('圖片索引需要已解析的帳戶鍵（見 index_account_key），不能使用 "me"')
+    return account
+
+
+class ImageHashIndex:
+    """
+    已發布圖片的雜湊索引：持久化在 threads_posts.db，每個帳戶的雜湊陣列在首次查詢時從數據庫載入並在內存中增量更新
+    threads_user_id 欄位保存 index_account_key 的結果
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or get_posts_db_path()
+        self._arrays = {}
+        self._lock = threading.Lock()
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS published_image_hashes (
+                    threads_user_id TEXT NOT NULL,
+                    post_id TEXT NOT NULL,
+                    phash INTEGER NOT NULL,
+                    dhash INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (threads_user_id, post_id)
+                )
+            """)
+
+    def _hash_array(self, threads_user_id: str, method: str) -> HashArray:
+        key = (_check_account(threads_user_id), method)
+        hash_array = self._arrays.get(key)
+        if hash_array is None:
+            _require_numpy()
+            hash_array = HashArray()
+            with connect_posts_db(self.db_path) as conn:
+                for post_id, value in conn.execute(
+                    f"SELECT post_id, {method} FROM published_image_hashes WHERE threads_user_id = ?",
+                    (key[0],)
+                ):
+                    hash_array.add(_to_unsigned(value), post_id)
+            self._arrays[key] = hash_array
+        return hash_array
+
+    def add(self, threads_user_id: str, post_id: str, hashes: dict) -> None:
+        threads_user_id = _check_account(threads_user_id)
+        with connect_posts_db(self.db_path) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO published_image_hashes "
+                "(threads_user_id, post_id, phash, dhash, created_at) VALUES (?, ?, ?, ?, ?)",
+                (threads_user_id, post_id, _to_signed(hashes["phash"]), _to_signed(hashes["dhash"]), time.time())
+            )
+            inserted = cursor.rowcount == 1
+        if inserted:
+            with self._lock:
+                for method in HASH_METHODS:
+                    hash_array = self._arrays.get((threads_user_id, method))
+                    if hash_array is not None:
+                        hash_array.add(hashes[method], post_id)
+
+    def lookup(self, threads_user_id: str, hashes: dict, threshold: int = DEFAULT_DEDUPE_THRESHOLD,
+               method: str = DEFAULT_HASH_METHOD):
+        """
+        返回最相似的已發布圖片 (距離, post_id)；沒有在閾值內的圖片時返回 None
+        """
+        with self._lock:
+            matches = self._hash_array(threads_user_id, method).search(hashes[method], threshold)
+        return matches[0] if matches else None
+
+    def size(self, threads_user_id: str, method: str = DEFAULT_HASH_METHOD) -> int:
+        with self._lock:
+            return self._hash_array(threads_user_id, method).size
+
+
+def filter_batch(sources: list, threads_user_id: str, threshold: int = DEFAULT_DEDUPE_THRESHOLD,
+                 method: str = DEFAULT_HASH_METHOD, index: "ImageHashIndex" = None) -> list:
+    """
+    對一批圖片判定是否重複，返回與輸入順序一致的
+    [{"index", "hashes", "duplicate_of", "distance"}, ...]；duplicate_of 為已發布的 post_id 或 "batch:<序號>"
+    threads_user_id 為 index_account_key 返回的帳戶鍵
+    """
+    index = index or get_image_hash_index()
+    hashes = compute_hashes(sources)
+    verdicts = []
+    valid = [position for position, value in enumerate(hashes) if value is not None]
+    distances = pairwise_distances([hashes[position][method] for position in valid]) if valid else None
+    kept = []
+
+    for order, position in enumerate(valid):
+        verdict = {"index": position, "hashes": hashes[position], "duplicate_of": "", "distance": -1}
+        match = index.lookup(threads_user_id, hashes[position], threshold, method)
+        if match:
+            verdict["distance"], verdict["duplicate_of"] = match
+        else:
+            # 與同批次中已保留的圖片比較
+            for kept_order in kept:
+                if distances[order, kept_order] <= threshold:
+                    verdict["distance"] = int(distances[order, kept_order])
+                    verdict["duplicate_of"] = f"batch:{valid[kept_order]}"
+                    break
+        if not verdict["duplicate_of"]:
+            kept.append(order)
+        verdicts.append(verdict)
+
+    for position, value in enumerate(hashes):
+        if value is None:
+            verdicts.append({"index": position, "hashes": None, "duplicate_of": "", "distance": -1})
+    verdicts.sort(key=lambda verdict: verdict["index"])
+    return verdicts
+
+
+_image_hash_index = None
+_image_hash_index_lock = threading.Lock()
+
+
+def get_image_hash_index() -> ImageHashIndex:
+    global _image_hash_index
+    with _image_hash_index_lock:
+        if _image_hash_index is None:
+            _image_hash_index = ImageHashIndex()
+        return _image_hash_index
@@ -0,0 +1,131 @@
+"""
+批量刪除已發布的帖子
+帖子可以直接指定 ID，或從發布日誌 / 帳戶帖子列表中篩選；刪除 (DELETE /{post_id}) 以有限並發執行，
+共享速率限制與重試策略，結果按完成順序逐條返回，成功刪除的帖子在發布日誌中標記為已刪除
+"""
+
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from .threads_http import RateLimitedSession
+    from .threads_journal import get_publish_journal
+    from .threads_listing import iter_user_threads
+except ImportError:
+    from threads_http import RateLimitedSession
+    from threads_journal import get_publish_journal
+    from threads_listing import iter_user_threads
+
+DEFAULT_DELETE_WORKERS = 4
+# Graph API 對已不存在的對象返回 code 100 / subcode 33
+MISSING_OBJECT_SUBCODE = 33
+
+
+def parse_time(value: str) -> float:
+    """
+    Unix 時間戳或 YYYY-MM-DD（本地時間）；空字符串返回 0
+    """
+    value = (value or "").strip()
+    if not value:
+        return 0
+    if value.replace(".", "", 1).isdigit():
+        return float(value)
+    return datetime.datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+
+def select_from_journal(threads_user_ids: list = None, source: str = "", since: str = "", until: str = "",
+                        text_contains: str = "", limit: int = 0) -> list:
+    """
+    從發布日誌篩選尚未刪除的帖子，返回 [{"post_id", "text_preview", ...}, ...]
+    """
+    selected = []
+    needle = text_contains.casefold()
+    for post in get_publish_journal().iter_posts(threads_user_ids, parse_time(since), parse_time(until), source):
+        if needle and needle not in post["text_preview"].casefold():
+            continue
+        selected.append(post)
+        if limit and len(selected) >= limit:
+            break
+    return selected
+
+
+def select_from_listing(base_url: str, threads_user_id: str, access_token: str, since: str = "",
+                        until: str = "", text_contains: str = "", limit: int = 0, session=None) -> list:
+    """
+    從帳戶帖子列表篩選（包括不是本插件發布的帖子）
+    """
+    selected = []
+    needle = text_contains.casefold()
+    for post in iter_user_threads(base_url, threads_user_id, access_token, "id,text,timestamp,permalink",
+                                  since=since.strip(), until=until.strip(), page_size=100,
+                                  session=session or RateLimitedSession()):
+        if needle and needle not in (post.get("text") or "").casefold():
+            continue
+        selected.append({"post_id": post.get("id", ""), "text_preview": (post.get("text") or "")[:200],
+                         "timestamp": post.get("timestamp", "")})
+        if limit and len(selected) >= limit:
+            break
+    return selected
+
+
+def delete_post(base_url: str, post_id: str, access_token: str, session=None) -> tuple:
+    """
+    刪除一個帖子，返回 (post_id, 是否成功, 訊息)；帖子已不存在時視為成功
+    """
+    session = session or RateLimitedSession()
+    try:
+        response = session.delete(f"{base_url}/{post_id}", params={'access_token': access_token})
+        if response.status_code == 200:
+            return (post_id, True, "已刪除")
+        try:
+            error = response.json().get('error', {})
+        except ValueError:
+            error = {}
+        if error.get('error_subcode') == MISSING_OBJECT_SUBCODE:
+            return (post_id, True, "帖子已不存在")
+        return (post_id, False, f"{response.status_code} - {error.get('message', response.text)}")
+    except Exception as e:
+        return (post_id, False, str(e))
+
+
+def iter_bulk_delete(base_url: str, post_ids: list, access_token: str,
+                     max_workers: int = DEFAULT_DELETE_WORKERS, session=None):
+    """
+    並行刪除並按完成順序產生 (post_id, 是否成功, 訊息)
+    同時進行的請求不超過 max_workers 個，提前停止迭代時不再提交剩餘的刪除
+    """
+    post_ids = list(dict.fromkeys(post_id for post_id in post_ids if post_id))
+    if not post_ids:
+        return
+    session = session or RateLimitedSession()
+    journal = get_publish_journal()
+    workers = max(1, min(max_workers, len(post_ids)))
+    remaining = iter(post_ids)
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for post_id in remaining:
+                pending.add(executor.submit(delete_post, base_url, post_id, access_token, session))
+                if len(pending) < workers:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _finish(journal, future.result())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _finish(journal, future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _finish(journal, result: tuple) -> tuple:
+    post_id, success, _ = result
+    if success:
+        try:
+            journal.mark_deleted(post_id)
+        except Exception as e:
+            print(f"⚠️ 發布日誌更新失敗: {str(e)}")
+    return result
@@ -0,0 +1,204 @@
+"""
+多進程圖片編碼
+將 ComfyUI 的 IMAGE 批次（B, H, W, C 的 0-1 浮點）轉換為可上傳的 JPEG/PNG：
+像素緩衝區放入共享內存，工作進程直接映射讀取而不經過 pickle；編碼完成的圖片按完成順序逐張返回，上傳可以立即開始
+"""
+
+import io
+import multiprocessing
+import os
+import site
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+ENCODE_FORMATS = ("JPEG", "PNG")
+DEFAULT_JPEG_QUALITY = 90
+# Threads 會將更寬的圖片縮放到 1440px，提前縮小可減少上傳量
+DEFAULT_MAX_WIDTH = 1440
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png"}
+# 工作進程按此頂層模組名導入工作函數
+WORKER_MODULE = "threads_encoding"
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_encode_workers() -> int:
+    configured = os.environ.get("THREADS_ENCODE_WORKERS", "")
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    return max(1, min(8, (os.cpu_count() or 2) - 1))
+
+
+class EncodedImage:
+    """
+    一張編碼完成的圖片
+    """
+
+    __slots__ = ("index", "data", "width", "height", "encode_format")
+
+    def __init__(self, index: int, data: bytes, width: int, height: int, encode_format: str):
+        self.index = index
+        self.data = data
+        self.width = width
+        self.height = height
+        self.encode_format = encode_format
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.encode_format]
+
+    @property
+    def file_name(self) -> str:
+        return f"image_{self.index:04d}{EXTENSIONS[self.encode_format]}"
+
+
+def encode_array(array, encode_format: str = "JPEG", quality: int = DEFAULT_JPEG_QUALITY,
+                 max_width: int = DEFAULT_MAX_WIDTH) -> tuple:
+    """
+    編碼單張 (H, W, C) 圖片，返回 (bytes, width, height)
+    """
+    if array.dtype != np.uint8:
+        array = (np.clip(array, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    if array.ndim == 3 and array.shape[2] == 1:
+        array = array[:, :, 0]
+    image = Image.fromarray(array)
+    if encode_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if max_width and image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if encode_format == "JPEG":
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "PNG", compress_level=6)
+    return buffer.getvalue(), image.width, image.height
+
+
+def _encode_shared(shm_name: str, shape: tuple, dtype: str, index: int, encode_format: str,
+                   quality: int, max_width: int) -> tuple:
+    """
+    工作進程入口：映射共享內存中的整個批次，只讀取第 index 張
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        batch = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        data, width, height = encode_array(batch[index], encode_format, quality, max_width)
+        del batch
+    finally:
+        shm.close()
+    return index, data, width, height
+
+
+def _pool_target():
+    """
+    以頂層模組名 threads_encoding 引用工作函數：ComfyUI 以包路徑載入插件，子進程無法按包名導入
+    父進程只在 sys.modules 中登記別名，不修改 sys.path；插件目錄由進程池的 initializer 加入子進程的 sys.path
+    """
+    module = sys.modules.setdefault(WORKER_MODULE, sys.modules[__name__])
+    target = module._encode_shared
+    target.__module__ = WORKER_MODULE
+    return target
+
+
+def _start_method() -> str:
+    """
+    不使用 fork：ComfyUI 是持有 CUDA / torch 狀態的多線程進程，fork 出的子進程可能死鎖
+    有 forkserver 時使用（子進程從單線程的服務進程分叉，啟動較快），否則使用 spawn（Windows）
+    """
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_encode_pool(workers: int = 0) -> ProcessPoolExecutor:
+    """
+    進程池在首次使用時創建並重用，避免每批都支付進程啟動成本
+    """
+    global _pool, _pool_workers
+    workers = workers or default_encode_workers()
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(_start_method()),
+                initializer=site.addsitedir, initargs=(PLUGIN_DIR,)
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _as_array(images):
+    if hasattr(images, "cpu"):
+        images = images.cpu().numpy()
+    array = np.asarray(images)
+    if array.ndim == 3:
+        array = array[None]
+    return np.ascontiguousarray(array)
+
+
+def encode_images(images, encode_format: str = "JPEG", quality: int = DEFAULT_JPEG_QUALITY,
+                  max_width: int = DEFAULT_MAX_WIDTH, workers: int = 0):
+    """
+    逐張產生 EncodedImage（按完成順序，index 為原批次中的位置）
+    單張圖片或只有一個工作進程時在當前進程內編碼
+    """
+    if np is None:
+        raise ImportError("圖片編碼需要 numpy 和 Pillow")
+    batch = _as_array(images)
+    count = len(batch)
+    workers = workers or default_encode_workers()
+
+    if count == 1 or workers == 1:
+        for index in range(count):
+            data, width, height = encode_array(batch[index], encode_format, quality, max_width)
+            yield EncodedImage(index, data, width, height, encode_format)
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=batch.nbytes)
+    pending = set()
+    try:
+        shared = np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)
+        shared[...] = batch
+        del shared
+        target = _pool_target()
+        pool = get_encode_pool(workers)
+        pending = {
+            pool.submit(target, shm.name, batch.shape, batch.dtype.str, index, encode_format, quality, max_width)
+            for index in range(count)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, data, width, height = future.result()
+                yield EncodedImage(index, data, width, height, encode_format)
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        # 調用方提前停止迭代時取消尚未開始的任務，等待執行中的任務釋放共享內存後再刪除
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,170 @@
+"""
+Threads API 共用的速率限制與重試策略
+RateLimitedSession 是 requests.Session 的子類，可以直接傳給接受 session 參數的分頁生成器；
+同一帳戶（權杖）的所有並發請求共享一個令牌桶，429、5xx 和 Graph API 限流錯誤按指數退避重試
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+
+try:
+    from .threads_common import token_fingerprint
+except ImportError:
+    from threads_common import token_fingerprint
+
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_BASE = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Graph API 的限流錯誤碼：應用、帳戶、頁面和 API 級別的調用次數限制
+RATE_LIMIT_ERROR_CODES = (4, 17, 32, 613)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "DELETE")
+
+
+class RateLimiter:
+    """
+    執行緒安全的令牌桶
+    """
+
+    def __init__(self, rate: float = 0, burst: int = DEFAULT_BURST):
+        self.rate = rate or float(os.environ.get("THREADS_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        取得一個令牌，返回等待的秒數
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, seconds: float) -> None:
+        """
+        收到限流響應後清空令牌桶，讓共享此桶的其他請求一起暫停
+        """
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class RetryPolicy:
+    """
+    重試判定與退避時間；優先使用 Retry-After 標頭
+    連線錯誤和超時時請求可能已經生效，默認只重試冪等方法；retry_unsafe = True 時 POST 也會重試（例如隱藏回覆）
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 retry_status_codes: tuple = RETRY_STATUS_CODES, retry_unsafe: bool = False):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.retry_status_codes = retry_status_codes
+        self.retry_unsafe = retry_unsafe
+
+    def can_retry_error(self, method: str, attempt: int) -> bool:
+        return attempt < self.max_attempts and (self.retry_unsafe or method.upper() in IDEMPOTENT_METHODS)
+
+    @staticmethod
+    def is_rate_limited(response) -> bool:
+        if response.status_code == 429:
+            return True
+        if response.status_code not in (400, 403):
+            return False
+        try:
+            return response.json().get('error', {}).get('code') in RATE_LIMIT_ERROR_CODES
+        except ValueError:
+            return False
+
+    def should_retry(self, response, attempt: int) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        return response.status_code in self.retry_status_codes or self.is_rate_limited(response)
+
+    def backoff(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(MAX_BACKOFF_SECONDS, float(retry_after))
+        delay = self.backoff_base * (2 ** (attempt - 1))
+        return min(MAX_BACKOFF_SECONDS, delay * random.uniform(0.5, 1.0) + delay * 0.5)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(access_token: str = "") -> RateLimiter:
+    """
+    每個帳戶（權杖雜湊）一個進程級共享的令牌桶
+    """
+    key = token_fingerprint(access_token)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter()
+        return limiter
+
+
+class RateLimitedSession(requests.Session):
+    """
+    每次請求前取得令牌，可重試的響應按策略退避後重發
+    未指定 limiter 時按請求中的 access_token 選擇共享令牌桶
+    """
+
+    def __init__(self, limiter: RateLimiter = None, policy: RetryPolicy = None):
+        super().__init__()
+        self.limiter = limiter
+        self.policy = policy or RetryPolicy()
+        self.retries = 0
+
+    def _limiter_for(self, kwargs: dict) -> RateLimiter:
+        if self.limiter is not None:
+            return self.limiter
+        params = kwargs.get('params') or {}
+        data = kwargs.get('data') or {}
+        access_token = (params.get('access_token') if isinstance(params, dict) else "") or \
+                       (data.get('access_token') if isinstance(data, dict) else "")
+        return get_rate_limiter(access_token or "")
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', 30)
+        limiter = self._limiter_for(kwargs)
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not self.policy.can_retry_error(method, attempt):
+                    raise
+                self.retries += 1
+                time.sleep(self.policy.backoff(attempt))
+                continue
+
+            if not self.policy.should_retry(response, attempt):
+                return response
+            delay = self.policy.backoff(attempt, response)
+            print(f"⏳ {method} 請求返回 {response.status_code}，{delay:.1f} 秒後重試 ({attempt}/{self.policy.max_attempts})")
+            self.retries += 1
+            if self.policy.is_rate_limited(response):
+                # 等待在共享令牌桶中進行，同一帳戶的其他請求也會一起暫停
+                limiter.penalize(delay)
+            else:
+                time.sleep(delay)
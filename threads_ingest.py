@@ -0,0 +1,606 @@
+"""
+Threads 監視資料夾自動發布服務
+監視 ComfyUI 輸出目錄（Linux 使用 inotify，其他平台輪詢），文件寫入穩定後讀取說明文字並發布
+已處理的文件記錄在 SQLite 中，內存只保存正在寫入或等待發布的文件，目錄中有數千個文件時內存佔用不變
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import json
+import os
+import select
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .threads_common import get_data_dir, token_fingerprint
+except ImportError:
+    from threads_common import get_data_dir, token_fingerprint
+
+DEFAULT_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.mp4", "*.mov")
+VIDEO_EXTENSIONS = (".mp4", ".mov")
+SIDECAR_EXTENSIONS = (".txt", ".caption")
+# PNG 文本塊中作為說明文字的鍵（ComfyUI 的 prompt/workflow 不會被使用）
+CAPTION_KEYS = ("threads_caption", "caption", "Description", "Comment")
+
+DEFAULT_SETTLE_SECONDS = 5
+DEFAULT_POLL_INTERVAL = 10
+DEFAULT_MAX_CONCURRENCY = 2
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_INTERRUPTED = "interrupted"
+
+# inotify 事件常量 (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def get_ingest_config_path() -> str:
+    return os.environ.get("THREADS_INGEST_CONFIG") or os.path.join(get_data_dir(), "ingest.json")
+
+
+def load_ingest_config(path: str = "") -> dict:
+    """
+    讀取監視配置；文件不存在時返回空配置
+    """
+    try:
+        with open(path or get_ingest_config_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def read_png_caption(file_path: str) -> str:
+    """
+    逐塊讀取 PNG 的 tEXt / zTXt / iTXt 說明文字，遇到圖像數據 (IDAT) 即停止，不讀入整個文件
+    """
+    try:
+        with open(file_path, "rb") as f:
+            if f.read(8) != b"\x89PNG\r\n\x1a\n":
+                return ""
+            found = {}
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                length, chunk_type = struct.unpack(">I4s", header)
+                if chunk_type in (b"IDAT", b"IEND"):
+                    break
+                if chunk_type not in (b"tEXt", b"zTXt", b"iTXt"):
+                    f.seek(length + 4, os.SEEK_CUR)
+                    continue
+
+                data = f.read(length)
+                f.seek(4, os.SEEK_CUR)
+                key, _, rest = data.partition(b"\x00")
+                key = key.decode("latin-1")
+                if key not in CAPTION_KEYS:
+                    continue
+                if chunk_type == b"tEXt":
+                    found[key] = rest.decode("latin-1")
+                elif chunk_type == b"zTXt":
+                    found[key] = zlib.decompress(rest[1:]).decode("latin-1")
+                else:
+                    compressed = rest[0]
+                    _language, _, rest = rest[2:].partition(b"\x00")
+                    _translated, _, text = rest.partition(b"\x00")
+                    found[key] = (zlib.decompress(text) if compressed else text).decode("utf-8")
+            for key in CAPTION_KEYS:
+                if found.get(key, "").strip():
+                    return found[key].strip()
+    except (OSError, struct.error, zlib.error, UnicodeDecodeError, IndexError):
+        pass
+    return ""
+
+
+def read_caption(file_path: str, default: str = "") -> str:
+    """
+    說明文字來源順序：同名 .txt / .caption 旁車文件 > PNG 文本塊 > 配置中的預設值
+    """
+    base = os.path.splitext(file_path)[0]
+    for extension in SIDECAR_EXTENSIONS:
+        try:
+            with open(base + extension, "r", encoding="utf-8") as f:
+                caption = f.read().strip()
+            if caption:
+                return caption
+        except OSError:
+            continue
+    if file_path.lower().endswith(".png"):
+        caption = read_png_caption(file_path)
+        if caption:
+            return caption
+    return default
+
+
+class IngestStore:
+    """
+    已處理文件和監視水位線的 SQLite 存儲
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or os.path.join(get_data_dir(), "ingest.db")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    path TEXT PRIMARY KEY,
+                    watch TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    post_id TEXT NOT NULL DEFAULT '',
+                    message TEXT NOT NULL DEFAULT '',
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_ingested_files_status ON ingested_files (status, mtime);
+                CREATE TABLE IF NOT EXISTS ingest_watermarks (
+                    watch TEXT PRIMARY KEY,
+                    since REAL NOT NULL
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get_watermark(self, watch: str, default: float) -> float:
+        with self._connect() as conn:
+            row = conn.execute("SELECT since FROM ingest_watermarks WHERE watch = ?", (watch,)).fetchone()
+            if row:
+                return row[0]
+            conn.execute("INSERT INTO ingest_watermarks (watch, since) VALUES (?, ?)", (watch, default))
+            return default
+
+    def set_watermark(self, watch: str, since: float) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO ingest_watermarks (watch, since) VALUES (?, ?)", (watch, since))
+
+    def is_known(self, path: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM ingested_files WHERE path = ?", (path,)).fetchone() is not None
+
+    def claim(self, path: str, watch: str, mtime: float, size: int) -> bool:
+        """
+        登記為 queued；文件已處理過時返回 False
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO ingested_files (path, watch, mtime, size, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, watch, mtime, size, STATUS_QUEUED, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def set_status(self, path: str, status: str, post_id: str = "", message: str = "") -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingested_files SET status = ?, post_id = ?, message = ?, updated_at = ? WHERE path = ?",
+                (status, post_id, message[:500], time.time(), path)
+            )
+
+    def recover(self) -> list:
+        """
+        啟動時：執行中的文件可能已發布，標記為 interrupted；仍在排隊的文件返回以便重新排隊
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingested_files SET status = ?, updated_at = ? WHERE status = ?",
+                (STATUS_INTERRUPTED, time.time(), STATUS_PROCESSING)
+            )
+            return conn.execute(
+                "SELECT path, watch FROM ingested_files WHERE status = ? ORDER BY mtime", (STATUS_QUEUED,)
+            ).fetchall()
+
+    def recent(self, limit: int = 20) -> list:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT path, status, post_id, message, updated_at FROM ingested_files "
+                "ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def counts(self) -> dict:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM ingested_files GROUP BY status"))
+
+
+class InotifyWatcher:
+    """
+    使用 ctypes 調用 libc 的 inotify；不可用時 available 為 False
+    """
+
+    def __init__(self):
+        self.fd = -1
+        self._paths = {}
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+            self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError, TypeError):
+            self.fd = -1
+
+    @property
+    def available(self) -> bool:
+        return self.fd >= 0
+
+    def add(self, directory: str) -> bool:
+        wd = self._add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            return False
+        self._paths[wd] = directory
+        return True
+
+    def read_events(self, timeout: float) -> list:
+        """
+        返回 [(path, mask)]；隊列溢出時返回 [(None, IN_Q_OVERFLOW)]
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\x00")
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, IN_Q_OVERFLOW))
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory and name:
+                events.append((os.path.join(directory, os.fsdecode(name)), mask))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class AccountQueues:
+    """
+    每個帳戶一個先進先出隊列：不同帳戶並行（受 max_concurrency 限制），同一帳戶嚴格按順序發布
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, handle_job):
+        self.executor = executor
+        self.handle_job = handle_job
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def submit(self, account: str, job) -> None:
+        with self._lock:
+            queue = self._queues.get(account)
+            if queue is not None:
+                queue.append(job)
+                return
+            self._queues[account] = deque([job])
+        self.executor.submit(self._drain, account)
+
+    def _drain(self, account: str) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[account]
+                if not queue:
+                    del self._queues[account]
+                    return
+                job = queue.popleft()
+            try:
+                self.handle_job(job)
+            except Exception as e:
+                print(f"❌ 監視資料夾發布異常: {str(e)}")
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+
+class IngestService:
+    """
+    監視資料夾服務：watcher 線程收集候選文件，settle 循環等待寫入穩定後交給帳戶隊列發布
+    """
+
+    def __init__(self, config: dict, run_job, store: IngestStore = None):
+        self.config = config
+        self.run_job = run_job
+        self.store = store or IngestStore()
+        self.settle_seconds = float(config.get("settle_seconds", DEFAULT_SETTLE_SECONDS))
+        self.poll_interval = float(config.get("poll_interval", DEFAULT_POLL_INTERVAL))
+        self.watches = [self._normalize_watch(watch) for watch in config.get("watches", [])]
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._executor = None
+        self._queues = None
+        self.mode = ""
+
+    @staticmethod
+    def _normalize_watch(watch: dict) -> dict:
+        watch = dict(watch)
+        path = watch.get("path", "")
+        if not path:
+            try:
+                import folder_paths
+                path = folder_paths.get_output_directory()
+            except ImportError:
+                raise ValueError("監視配置缺少 path")
+        watch["path"] = os.path.abspath(os.path.expanduser(path))
+        watch["patterns"] = tuple(watch.get("patterns") or DEFAULT_PATTERNS)
+        if not watch.get("access_token") and watch.get("access_token_env"):
+            watch["access_token"] = os.environ.get(watch["access_token_env"], "")
+        watch.setdefault("threads_user_id", "me")
+        return watch
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _watch_for(self, path: str):
+        for watch in self.watches:
+            root = watch["path"]
+            if path.startswith(root + os.sep):
+                relative = path[len(root) + 1:]
+                if os.sep in relative and not watch.get("recursive"):
+                    continue
+                name = os.path.basename(path)
+                if any(fnmatch.fnmatch(name.lower(), pattern.lower()) for pattern in watch["patterns"]):
+                    return watch
+        return None
+
+    def _note_candidate(self, path: str) -> None:
+        with self._pending_lock:
+            if path not in self._pending:
+                self._pending[path] = None
+
+    def _scan(self, watch: dict, since: float, root: str = "") -> None:
+        """
+        流式掃描目錄，只把水位線之後修改或移入的文件加入候選
+        """
+        stack = [root or watch["path"]]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if watch.get("recursive"):
+                                stack.append(entry.path)
+                            continue
+                        stat = entry.stat()
+                        if max(stat.st_mtime, stat.st_ctime) < since:
+                            continue
+                        if self._watch_for(entry.path) is watch and not self.store.is_known(entry.path):
+                            self._note_candidate(entry.path)
+            except OSError:
+                continue
+
+    def _scan_all(self, use_watermark: bool = True) -> None:
+        started = time.time()
+        for watch in self.watches:
+            since = self.store.get_watermark(watch["path"], started) if use_watermark else 0
+            self._scan(watch, since)
+            # 保留 settle 時間的重疊，避免掃描期間寫入的文件被漏掉
+            self.store.set_watermark(watch["path"], started - self.settle_seconds)
+
+    def _inotify_loop(self, watcher: InotifyWatcher) -> None:
+        try:
+            while not self._stopping.is_set():
+                for path, mask in watcher.read_events(1.0):
+                    if path is None:
+                        print("⚠️ inotify 隊列溢出，重新掃描監視目錄")
+                        self._scan_all()
+                    elif mask & IN_ISDIR:
+                        watch = self._watch_for_dir(path) if mask & (IN_CREATE | IN_MOVED_TO) else None
+                        if watch is not None:
+                            watcher.add(path)
+                            # 新目錄在加入監視前可能已經寫入了文件
+                            self._scan(watch, 0, path)
+                    elif self._watch_for(path) is not None:
+                        self._note_candidate(path)
+        finally:
+            watcher.close()
+
+    def _watch_for_dir(self, directory: str):
+        """
+        返回包含新建子目錄的遞歸監視；目錄不屬於任何遞歸監視時返回 None，事件被忽略
+        """
+        return next((watch for watch in self.watches
+                     if watch.get("recursive") and directory.startswith(watch["path"] + os.sep)), None)
+
+    def _poll_loop(self) -> None:
+        while not self._stopping.wait(self.poll_interval):
+            self._scan_all()
+
+    def _settle_loop(self) -> None:
+        """
+        每秒檢查候選文件；大小和修改時間在 settle_seconds 內沒有變化才視為寫入完成
+        """
+        while not self._stopping.wait(1.0):
+            now = time.time()
+            ready = []
+            with self._pending_lock:
+                candidates = list(self._pending.items())
+            for path, previous in candidates:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    with self._pending_lock:
+                        self._pending.pop(path, None)
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if previous is None or previous[0] != signature:
+                    with self._pending_lock:
+                        self._pending[path] = (signature, now)
+                elif stat.st_size > 0 and now - previous[1] >= self.settle_seconds:
+                    ready.append((stat.st_mtime, path, stat.st_size))
+                    with self._pending_lock:
+                        self._pending.pop(path, None)
+
+            for mtime, path, size in sorted(ready):
+                watch = self._watch_for(path)
+                if watch is not None and self.store.claim(path, watch["path"], mtime, size):
+                    self._enqueue(path, watch)
+
+    def _account_key(self, watch: dict) -> str:
+        return f"{watch['threads_user_id']}:{token_fingerprint(watch.get('access_token', ''))}"
+
+    def _enqueue(self, path: str, watch: dict) -> None:
+        self._queues.submit(self._account_key(watch), (path, watch))
+
+    def _handle_job(self, job) -> None:
+        path, watch = job
+        if not os.path.exists(path):
+            self.store.set_status(path, STATUS_FAILED, message="文件已不存在")
+            return
+
+        self.store.set_status(path, STATUS_PROCESSING)
+        is_video = path.lower().endswith(VIDEO_EXTENSIONS)
+        payload = dict(watch.get("publish_options", {}))
+        payload.update({
+            'access_token': watch.get('access_token', ''),
+            'text': read_caption(path, watch.get('default_caption', '')),
+            'threads_user_id': watch['threads_user_id'],
+            'post_type': "VIDEO_POST" if is_video else "IMAGE_POST",
+            'media_file_path': path,
+            'client_secret': watch.get('client_secret', ''),
+        })
+        # 只有監視設定明確指定時才覆蓋 publish_options 中的上傳服務
+        if 'upload_service' in watch:
+            payload['upload_service'] = watch['upload_service']
+        print(f"📂 監視資料夾發布: {os.path.basename(path)}")
+        try:
+            success, result = self.run_job(payload)
+        except Exception as e:
+            success, result = False, {'message': f"發布異常: {str(e)}"}
+        self.store.set_status(path, STATUS_DONE if success else STATUS_FAILED,
+                              result.get('post_id', ''), result.get('message', ''))
+        print(f"{'✅' if success else '❌'} {os.path.basename(path)}: {result.get('message', '').splitlines()[0] if result.get('message') else ''}")
+
+    def start(self) -> None:
+        if self.running or not self.watches:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(self.config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))),
+            thread_name_prefix="threads-ingest"
+        )
+        self._queues = AccountQueues(self._executor, self._handle_job)
+
+        for path, watch_path in self.store.recover():
+            watch = self._watch_for(path)
+            if watch is not None:
+                self._enqueue(path, watch)
+
+        watcher = InotifyWatcher() if not self.config.get("force_polling") else None
+        if watcher is not None and watcher.available and all(self._add_inotify(watcher, watch) for watch in self.watches):
+            self.mode = "inotify"
+            target, args = self._inotify_loop, (watcher,)
+        else:
+            if watcher is not None:
+                watcher.close()
+            self.mode = "polling"
+            target, args = self._poll_loop, ()
+
+        self._scan_all()
+        self._threads = [
+            threading.Thread(target=target, args=args, name="threads-ingest-watch", daemon=True),
+            threading.Thread(target=self._settle_loop, name="threads-ingest-settle", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"📂 Threads 監視資料夾服務已啟動 ({self.mode})，監視 {len(self.watches)} 個目錄")
+
+    def _add_inotify(self, watcher: InotifyWatcher, watch: dict) -> bool:
+        if not watcher.add(watch["path"]):
+            return False
+        if watch.get("recursive"):
+            for directory, subdirectories, _files in os.walk(watch["path"]):
+                for subdirectory in subdirectories:
+                    watcher.add(os.path.join(directory, subdirectory))
+        return True
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def status(self) -> dict:
+        with self._pending_lock:
+            settling = len(self._pending)
+        return {
+            "running": self.running,
+            "mode": self.mode,
+            "watches": [watch["path"] for watch in self.watches],
+            "settling": settling,
+            "queued": self._queues.pending() if self._queues else 0,
+            "totals": self.store.counts(),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ingest_service():
+    return _service
+
+
+def start_ingest_service(run_job, config: dict = None) -> IngestService:
+    """
+    按配置啟動（或重新啟動）進程級監視服務
+    """
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.stop()
+        _service = IngestService(config if config is not None else load_ingest_config(), run_job)
+        _service.start()
+        return _service
+
+
+def stop_ingest_service() -> None:
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.stop()
+            _service = None
+
+
+def resume_ingest_service(run_job) -> None:
+    """
+    ComfyUI 啟動時：有監視配置且未設定 THREADS_INGEST_DISABLED 時自動啟動
+    """
+    if os.environ.get("THREADS_INGEST_DISABLED"):
+        return
+    config = load_ingest_config()
+    if config.get("watches") and config.get("enabled", True):
+        start_ingest_service(run_job, config)
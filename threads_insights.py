@@ -0,0 +1,297 @@
+"""
+Threads 洞察數據同步與本地時間序列存儲
+帳戶洞察使用 since/until 水位線增量獲取，帖子洞察只刷新過期的快照
+所有聚合在 SQLite 中完成，不需要每次重新下載歷史數據
+"""
+
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from .threads_journal import connect_posts_db, get_posts_db_path, get_publish_journal
+except ImportError:
+    from threads_journal import connect_posts_db, get_posts_db_path, get_publish_journal
+
+POST_METRICS = ("views", "likes", "replies", "reposts", "quotes", "shares")
+ACCOUNT_METRICS = ("views", "likes", "replies", "reposts", "quotes", "followers_count")
+ENGAGEMENT_METRICS = ("likes", "replies", "reposts", "quotes")
+# Threads 洞察 API 不提供早於此時間（2024-04-13）的數據
+MIN_SINCE_TIMESTAMP = 1712991600
+DEFAULT_BACKFILL_DAYS = 30
+
+
+def _metric_value(item: dict):
+    """
+    解析洞察指標：lifetime/總量指標使用 total_value，時間序列指標使用 values
+    """
+    if "total_value" in item:
+        return [(None, item["total_value"].get("value", 0))]
+    return [(value.get("end_time"), value.get("value", 0)) for value in item.get("values", [])]
+
+
+def _parse_end_time(end_time: str, default: float) -> float:
+    if not end_time:
+        return default
+    try:
+        return datetime.datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except ValueError:
+        return default
+
+
+class InsightsStore:
+    """
+    洞察時間序列存儲
+    post_metrics: 帖子指標快照；post_latest: 每個帖子每個指標的最新值（用於聚合）
+    account_metrics: 帳戶指標；watermarks: 增量同步水位線
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or get_posts_db_path()
+        # 確保發布日誌表存在，聚合查詢需要與其關聯
+        get_publish_journal()
+        with connect_posts_db(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS post_metrics (
+                    post_id TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (post_id, metric, fetched_at)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS post_latest (
+                    post_id TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (post_id, metric)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS account_metrics (
+                    threads_user_id TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    end_time REAL NOT NULL,
+                    window_start REAL NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (threads_user_id, metric, end_time, window_start)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    scope TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                );
+            """)
+
+    def get_watermark(self, scope: str) -> float:
+        with connect_posts_db(self.db_path) as conn:
+            row = conn.execute("SELECT value FROM watermarks WHERE scope = ?", (scope,)).fetchone()
+            return row[0] if row else 0
+
+    def set_watermark(self, scope: str, value: float) -> None:
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO watermarks (scope, value) VALUES (?, ?)", (scope, value))
+
+    def add_post_snapshot(self, post_id: str, values: dict, fetched_at: float) -> None:
+        rows = [(post_id, metric, fetched_at, int(value)) for metric, value in values.items()]
+        with connect_posts_db(self.db_path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO post_metrics VALUES (?, ?, ?, ?)", rows)
+            conn.executemany("INSERT OR REPLACE INTO post_latest VALUES (?, ?, ?, ?)", rows)
+
+    def add_account_metrics(self, threads_user_id: str, rows: list) -> None:
+        """
+        rows: [(metric, end_time, window_start, value)]
+        """
+        with connect_posts_db(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO account_metrics VALUES (?, ?, ?, ?, ?)",
+                [(threads_user_id, metric, end_time, window_start, int(value))
+                 for metric, end_time, window_start, value in rows]
+            )
+
+    def stale_posts(self, threads_user_ids: list, refresh_seconds: float, max_age_days: float) -> list:
+        """
+        需要刷新的帖子：發布時間在 max_age_days 內，且最新快照早於 refresh_seconds
+        """
+        now = time.time()
+        placeholders = ",".join("?" * len(threads_user_ids))
+        with connect_posts_db(self.db_path) as conn:
+            return [row[0] for row in conn.execute(f"""
+                SELECT p.post_id FROM published_posts p
+                LEFT JOIN (SELECT post_id, MAX(fetched_at) AS fetched_at FROM post_latest GROUP BY post_id) l
+                    ON l.post_id = p.post_id
+                WHERE p.threads_user_id IN ({placeholders})
+                  AND p.deleted_at IS NULL
+                  AND p.published_at >= ?
+                  AND (l.fetched_at IS NULL OR l.fetched_at < ?)
+                ORDER BY p.published_at DESC
+            """, (*threads_user_ids, now - max_age_days * 86400, now - refresh_seconds))]
+
+    def top_posts(self, threads_user_ids: list, limit: int = 10, since: float = 0) -> list:
+        placeholders = ",".join("?" * len(threads_user_ids))
+        engagement = ",".join(f"'{metric}'" for metric in ENGAGEMENT_METRICS)
+        with connect_posts_db(self.db_path) as conn:
+            return [
+                {
+                    "post_id": row[0],
+                    "text_preview": row[1],
+                    "published_at": row[2],
+                    "views": row[3],
+                    "engagement": row[4],
+                }
+                for row in conn.execute(f"""
+                    SELECT p.post_id, p.text_preview, p.published_at,
+                           COALESCE(SUM(CASE WHEN l.metric = 'views' THEN l.value END), 0) AS views,
+                           COALESCE(SUM(CASE WHEN l.metric IN ({engagement}) THEN l.value END), 0) AS engagement
+                    FROM published_posts p
+                    JOIN post_latest l ON l.post_id = p.post_id
+                    WHERE p.threads_user_id IN ({placeholders}) AND p.published_at >= ?
+                    GROUP BY p.post_id
+                    ORDER BY engagement DESC, views DESC
+                    LIMIT ?
+                """, (*threads_user_ids, since, limit))
+            ]
+
+    def engagement_by_hour(self, threads_user_ids: list, since: float = 0) -> list:
+        """
+        按發布時段（本地時間 0-23 時）聚合的平均互動數
+        """
+        placeholders = ",".join("?" * len(threads_user_ids))
+        engagement = ",".join(f"'{metric}'" for metric in ENGAGEMENT_METRICS)
+        with connect_posts_db(self.db_path) as conn:
+            return [
+                {"hour": int(row[0]), "posts": row[1], "avg_engagement": row[2], "avg_views": row[3]}
+                for row in conn.execute(f"""
+                    SELECT hour, COUNT(*), AVG(engagement), AVG(views) FROM (
+                        SELECT strftime('%H', p.published_at, 'unixepoch', 'localtime') AS hour,
+                               COALESCE(SUM(CASE WHEN l.metric IN ({engagement}) THEN l.value END), 0) AS engagement,
+                               COALESCE(SUM(CASE WHEN l.metric = 'views' THEN l.value END), 0) AS views
+                        FROM published_posts p
+                        JOIN post_latest l ON l.post_id = p.post_id
+                        WHERE p.threads_user_id IN ({placeholders}) AND p.published_at >= ?
+                        GROUP BY p.post_id
+                    )
+                    GROUP BY hour
+                    ORDER BY hour
+                """, (*threads_user_ids, since))
+            ]
+
+    def account_series(self, threads_user_id: str, metric: str, since: float = 0) -> list:
+        with connect_posts_db(self.db_path) as conn:
+            return conn.execute(
+                "SELECT end_time, value FROM account_metrics "
+                "WHERE threads_user_id = ? AND metric = ? AND end_time >= ? AND window_start = 0 "
+                "ORDER BY end_time",
+                (threads_user_id, metric, since)
+            ).fetchall()
+
+    def account_totals(self, threads_user_id: str, since: float = 0) -> dict:
+        """
+        各指標總和：時間序列指標（window_start = 0）按日相加，區間指標按同步窗口相加
+        """
+        with connect_posts_db(self.db_path) as conn:
+            return {
+                row[0]: row[1]
+                for row in conn.execute(
+                    "SELECT metric, SUM(value) FROM account_metrics "
+                    "WHERE threads_user_id = ? AND end_time >= ? AND metric != 'followers_count' "
+                    "GROUP BY metric",
+                    (threads_user_id, since)
+                )
+            }
+
+
+class ThreadsInsightsSync:
+    """
+    洞察增量同步器
+    """
+
+    def __init__(self, base_url: str, store: InsightsStore = None):
+        self.base_url = base_url
+        self.store = store or InsightsStore()
+        self.session = requests.Session()
+
+    def _get(self, url: str, params: dict) -> dict:
+        response = self.session.get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            try:
+                message = response.json().get('error', {}).get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise RuntimeError(f"{response.status_code} - {message}")
+        return response.json()
+
+    def sync_account(self, threads_user_id: str, access_token: str, log: list) -> int:
+        """
+        從水位線同步到現在；首次同步回填 DEFAULT_BACKFILL_DAYS 天
+        """
+        scope = f"account:{threads_user_id}"
+        until = int(time.time())
+        since = int(self.store.get_watermark(scope)) or until - DEFAULT_BACKFILL_DAYS * 86400
+        since = max(since, MIN_SINCE_TIMESTAMP)
+        if until - since < 60:
+            log.append("ℹ️ 帳戶洞察已是最新")
+            return 0
+
+        result = self._get(f"{self.base_url}/{threads_user_id}/threads_insights", {
+            'metric': ",".join(ACCOUNT_METRICS),
+            'since': since,
+            'until': until,
+            'access_token': access_token
+        })
+
+        rows = []
+        for item in result.get('data', []):
+            for end_time, value in _metric_value(item):
+                if end_time is None:
+                    # 區間總量指標記錄其同步窗口，followers_count 為當前值
+                    rows.append((item.get('name'), until, since, value))
+                else:
+                    rows.append((item.get('name'), _parse_end_time(end_time, until), 0, value))
+
+        self.store.add_account_metrics(threads_user_id, rows)
+        self.store.set_watermark(scope, until)
+        log.append(f"✅ 帳戶洞察已同步: {len(rows)} 個數據點")
+        return len(rows)
+
+    def fetch_post_insights(self, post_id: str, access_token: str) -> dict:
+        result = self._get(f"{self.base_url}/{post_id}/insights", {
+            'metric': ",".join(POST_METRICS),
+            'access_token': access_token
+        })
+        values = {}
+        for item in result.get('data', []):
+            points = _metric_value(item)
+            if points:
+                values[item.get('name')] = points[-1][1]
+        return values
+
+    def sync_posts(self, threads_user_ids: list, access_token: str, log: list,
+                   refresh_seconds: float = 3600, max_age_days: float = 30, max_workers: int = 4) -> int:
+        """
+        只刷新過期的帖子快照，並行請求
+        """
+        post_ids = self.store.stale_posts(threads_user_ids, refresh_seconds, max_age_days)
+        if not post_ids:
+            log.append("ℹ️ 帖子洞察已是最新")
+            return 0
+
+        log.append(f"🔄 同步 {len(post_ids)} 個帖子的洞察...")
+        fetched_at = time.time()
+        synced = 0
+
+        def fetch(post_id):
+            try:
+                return (post_id, self.fetch_post_insights(post_id, access_token), "")
+            except Exception as e:
+                return (post_id, None, str(e))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for post_id, values, error in executor.map(fetch, post_ids):
+                if values is None:
+                    log.append(f"⚠️ 帖子 {post_id} 洞察獲取失敗: {error}")
+                    continue
+                self.store.add_post_snapshot(post_id, values, fetched_at)
+                synced += 1
+
+        log.append(f"✅ 帖子洞察已同步: {synced}/{len(post_ids)}")
+        return synced
@@ -0,0 +1,148 @@
+"""
+Threads 發布日誌
+記錄本插件發布的每一個帖子，供洞察同步、配額統計和批量刪除使用
+日誌與洞察數據共用同一個 SQLite 數據庫 (threads_posts.db)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from .threads_common import get_data_dir
+except ImportError:
+    from threads_common import get_data_dir
+
+# 這些來源的記錄是回覆，按 Threads 的回覆配額而不是發帖配額統計
+REPLY_SOURCES = ("auto_thread",)
+
+
+def get_posts_db_path() -> str:
+    return os.path.join(get_data_dir(), "threads_posts.db")
+
+
+def connect_posts_db(db_path: str = "") -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path or get_posts_db_path(), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class PublishJournal:
+    """
+    發布日誌 - 每個成功發布的帖子一行
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or get_posts_db_path()
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS published_posts (
+                    post_id TEXT PRIMARY KEY,
+                    threads_user_id TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    text_preview TEXT NOT NULL DEFAULT '',
+                    media_url TEXT NOT NULL DEFAULT '',
+                    published_at REAL NOT NULL,
+                    deleted_at REAL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_published_posts_user_time "
+                "ON published_posts (threads_user_id, published_at)"
+            )
+
+    def record(self, post_id: str, threads_user_id: str, media_type: str, source: str,
+               text: str = "", media_url: str = "") -> None:
+        # Data URL 等超長字符串不寫入日誌
+        if media_url.startswith("data:"):
+            media_url = "data:"
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO published_posts "
+                "(post_id, threads_user_id, media_type, source, text_preview, media_url, published_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (post_id, threads_user_id or "me", media_type, source, text[:200], media_url[:500], time.time())
+            )
+
+    def mark_deleted(self, post_id: str) -> None:
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute("UPDATE published_posts SET deleted_at = ? WHERE post_id = ?", (time.time(), post_id))
+
+    def iter_posts(self, threads_user_ids: list = None, since: float = 0, until: float = 0,
+                   source: str = "", include_deleted: bool = False):
+        """
+        逐行返回符合條件的帖子 (dict)，按發布時間排序
+        """
+        conditions = []
+        params = []
+        if threads_user_ids:
+            conditions.append(f"threads_user_id IN ({','.join('?' * len(threads_user_ids))})")
+            params.extend(threads_user_ids)
+        if since:
+            conditions.append("published_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("published_at < ?")
+            params.append(until)
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if not include_deleted:
+            conditions.append("deleted_at IS NULL")
+
+        query = ("SELECT post_id, threads_user_id, media_type, source, text_preview, media_url, published_at "
+                 "FROM published_posts")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY published_at"
+
+        with connect_posts_db(self.db_path) as conn:
+            for row in conn.execute(query, params):
+                yield {
+                    "post_id": row[0],
+                    "threads_user_id": row[1],
+                    "media_type": row[2],
+                    "source": row[3],
+                    "text_preview": row[4],
+                    "media_url": row[5],
+                    "published_at": row[6],
+                }
+
+    def count_since(self, threads_user_id: str, since: float, replies: bool = None) -> int:
+        """
+        統計時間點之後的發布數；replies 為 True/False 時只統計回覆/非回覆
+        """
+        query = "SELECT COUNT(*) FROM published_posts WHERE threads_user_id = ? AND published_at >= ?"
+        params = [threads_user_id or "me", since]
+        if replies is not None:
+            query += f" AND source {'IN' if replies else 'NOT IN'} ({','.join('?' * len(REPLY_SOURCES))})"
+            params.extend(REPLY_SOURCES)
+        with connect_posts_db(self.db_path) as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_publish_journal() -> PublishJournal:
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = PublishJournal()
+        return _journal
+
+
+def record_published_post(post_id: str, threads_user_id: str, media_type: str, source: str,
+                          text: str = "", media_url: str = "") -> None:
+    """
+    記錄發布結果；日誌寫入失敗不影響發布流程
+    """
+    if not post_id:
+        return
+    try:
+        get_publish_journal().record(post_id, threads_user_id, media_type, source, text, media_url)
+    except Exception as e:
+        print(f"⚠️ 發布日誌寫入失敗: {str(e)}")
@@ -0,0 +1,158 @@
+"""
+Threads 帖子列表 - 游標分頁的惰性生成器
+只請求需要的欄位，達到數量上限即停止；頁面以 ETag 緩存在磁碟上，重複刷新時以 If-None-Match 重新驗證
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+try:
+    from .threads_common import get_data_dir, token_fingerprint
+except ImportError:
+    from threads_common import get_data_dir, token_fingerprint
+
+DEFAULT_POST_FIELDS = "id,text,timestamp,permalink,media_type"
+MAX_PAGE_SIZE = 100
+PAGE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+class PageCache:
+    """
+    以 ETag 為驗證器的磁碟頁面緩存
+    """
+
+    def __init__(self, cache_dir: str = "", max_age: float = PAGE_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir or get_data_dir("page_cache")
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.max_age
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def cache_key(url: str, params: dict) -> str:
+        cacheable = {k: v for k, v in params.items() if k != 'access_token'}
+        cacheable['__token__'] = token_fingerprint(params.get('access_token', ''))
+        raw = url + "?" + json.dumps(cacheable, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            return cached["etag"], cached["body"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, etag: str, body: dict) -> None:
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "body": body}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def touch(self, key: str) -> None:
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+
+def fetch_page(url: str, params: dict, cache: PageCache = None, session: requests.Session = None) -> dict:
+    """
+    獲取一頁 JSON；有緩存時帶上 If-None-Match，304 時返回緩存內容
+    """
+    session = session or requests.Session()
+    headers = {}
+    cached = None
+    key = ""
+    if cache is not None:
+        key = cache.cache_key(url, params)
+        cached = cache.get(key)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+    response = session.get(url, params=params, headers=headers, timeout=30)
+
+    if response.status_code == 304 and cached:
+        cache.hits += 1
+        cache.touch(key)
+        return cached[1]
+
+    if response.status_code != 200:
+        try:
+            message = response.json().get('error', {}).get('message', response.text)
+        except ValueError:
+            message = response.text
+        raise RuntimeError(f"列表請求失敗: {response.status_code} - {message}")
+
+    body = response.json()
+    if cache is not None:
+        cache.misses += 1
+        etag = response.headers.get('ETag')
+        if etag:
+            cache.put(key, etag, body)
+    return body
+
+
+def iter_paginated(url: str, params: dict, limit: int = 0, page_size: int = 25,
+                   cache: PageCache = None, session: requests.Session = None):
+    """
+    通用游標分頁生成器 - 逐項返回 data 中的元素，limit > 0 時達到數量即停止
+    """
+    session = session or requests.Session()
+    params = dict(params)
+    yielded = 0
+
+    while True:
+        if limit:
+            params['limit'] = max(1, min(page_size, limit - yielded, MAX_PAGE_SIZE))
+        else:
+            params['limit'] = max(1, min(page_size, MAX_PAGE_SIZE))
+
+        page = fetch_page(url, params, cache, session)
+        for item in page.get('data', []):
+            yield item
+            yielded += 1
+            if limit and yielded >= limit:
+                return
+
+        paging = page.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not after or not paging.get('next') or not page.get('data'):
+            return
+        params['after'] = after
+
+
+def iter_user_threads(base_url: str, threads_user_id: str, access_token: str,
+                      fields: str = DEFAULT_POST_FIELDS, limit: int = 0, page_size: int = 25,
+                      since: str = "", until: str = "", cache: PageCache = None,
+                      session: requests.Session = None):
+    """
+    惰性列出帳戶的帖子 (GET /{threads_user_id}/threads)
+    """
+    params = {
+        'fields': fields or DEFAULT_POST_FIELDS,
+        'access_token': access_token
+    }
+    if since:
+        params['since'] = since
+    if until:
+        params['until'] = until
+    yield from iter_paginated(f"{base_url}/{threads_user_id}/threads", params, limit, page_size, cache, session)
@@ -0,0 +1,254 @@
+"""
+Threads 媒體句柄與共享媒體存儲
+節點之間只傳遞輕量的 THREADS_MEDIA 句柄，實際的字節或文件保存在引用計數的進程級存儲中
+"""
+
+import hashlib
+import mimetypes
+import os
+import struct
+import threading
+import time
+import weakref
+
+try:
+    from .threads_scratch import get_scratch_space
+except ImportError:
+    from threads_scratch import get_scratch_space
+
+THREADS_MEDIA = "THREADS_MEDIA"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+MAX_CACHED_DIGESTS = 1024
+# 託管 URL（例如預簽名 URL）可能過期，只在此時間內重用
+HOSTED_URL_TTL = 3600
+
+
+def sniff_image_size(header: bytes) -> tuple:
+    """
+    從文件頭解析圖片尺寸（PNG / JPEG / GIF / WEBP），無法識別時返回 (0, 0)
+    """
+    try:
+        if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", header[16:24])
+            return (width, height)
+
+        if header[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", header[6:10])
+            return (width, height)
+
+        if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+            chunk = header[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", header[26:30])
+                return (width & 0x3FFF, height & 0x3FFF)
+            if chunk == b"VP8L":
+                bits = int.from_bytes(header[21:25], "little")
+                return ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+            if chunk == b"VP8X":
+                width = int.from_bytes(header[24:27], "little") + 1
+                height = int.from_bytes(header[27:30], "little") + 1
+                return (width, height)
+
+        if header.startswith(b"\xff\xd8"):
+            offset = 2
+            while offset + 9 < len(header):
+                if header[offset] != 0xFF:
+                    offset += 1
+                    continue
+                marker = header[offset + 1]
+                # SOF0-SOF15（排除 DHT/JPG/DAC）包含圖片尺寸
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack(">HH", header[offset + 5:offset + 9])
+                    return (width, height)
+                segment_length = struct.unpack(">H", header[offset + 2:offset + 4])[0]
+                offset += 2 + segment_length
+    except struct.error:
+        pass
+    return (0, 0)
+
+
+class MediaHandle:
+    """
+    THREADS_MEDIA 句柄 - 只包含元數據和存儲鍵，複製和傳遞的成本與文件大小無關
+    """
+
+    __slots__ = ("key", "file_name", "mime_type", "size", "sha256", "width", "height", "__weakref__")
+
+    def __init__(self, key: str, file_name: str, mime_type: str, size: int, sha256: str,
+                 width: int = 0, height: int = 0):
+        self.key = key
+        self.file_name = file_name
+        self.mime_type = mime_type
+        self.size = size
+        self.sha256 = sha256
+        self.width = width
+        self.height = height
+
+    @property
+    def media_type(self) -> str:
+        return "VIDEO" if self.mime_type.startswith("video/") else "IMAGE"
+
+    def describe(self) -> str:
+        lines = [
+            f"文件: {self.file_name}",
+            f"類型: {self.mime_type}",
+            f"大小: {self.size / (1024 * 1024):.2f} MB",
+            f"SHA256: {self.sha256[:16]}...",
+        ]
+        if self.width and self.height:
+            lines.append(f"尺寸: {self.width}x{self.height}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"MediaHandle({self.file_name!r}, {self.mime_type}, {self.size} bytes)"
+
+
+class _MediaEntry:
+    __slots__ = ("path", "data", "owns_path", "refcount", "hosted_urls")
+
+    def __init__(self, path: str = "", data: bytes = None, owns_path: bool = False):
+        self.path = path
+        self.data = data
+        self.owns_path = owns_path
+        self.refcount = 0
+        self.hosted_urls = {}
+
+
+class MediaStore:
+    """
+    進程級媒體存儲 - 以內容雜湊為鍵，引用計數歸零時釋放字節和臨時文件
+    """
+
+    def __init__(self):
+        # 可重入：句柄的 finalize 可能在持有鎖的線程中因垃圾回收而觸發 _release
+        self._lock = threading.RLock()
+        self._entries = {}
+        # (realpath, size, mtime_ns) -> (sha256, width, height)，避免重複雜湊同一文件
+        self._file_digests = {}
+
+    def _new_handle(self, key: str, make_entry, file_name: str, mime_type: str, size: int,
+                    width: int, height: int) -> MediaHandle:
+        """
+        在同一段鎖內查找或創建條目並增加引用計數，避免與同一內容最後一個句柄的釋放交錯
+        """
+        handle = MediaHandle(key, file_name, mime_type, size, key, width, height)
+        with self._lock:
+            entry = self._entries.get(key) or make_entry()
+            entry.refcount += 1
+            self._entries[key] = entry
+        weakref.finalize(handle, self._release, key)
+        return handle
+
+    def put_file(self, file_path: str) -> MediaHandle:
+        """
+        以引用方式登記本地文件（不複製內容）
+        """
+        real_path = os.path.realpath(file_path)
+        stat = os.stat(real_path)
+        file_id = (real_path, stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            cached = self._file_digests.get(file_id)
+        if cached:
+            sha256, width, height = cached
+        else:
+            digest = hashlib.sha256()
+            with open(real_path, "rb") as f:
+                header = f.read(64 * 1024)
+                digest.update(header)
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+            width, height = sniff_image_size(header)
+            with self._lock:
+                if file_id not in self._file_digests and len(self._file_digests) >= MAX_CACHED_DIGESTS:
+                    self._file_digests.pop(next(iter(self._file_digests)))
+                self._file_digests[file_id] = (sha256, width, height)
+
+        mime_type = mimetypes.guess_type(real_path)[0] or "application/octet-stream"
+        return self._new_handle(sha256, lambda: _MediaEntry(path=real_path), os.path.basename(real_path),
+                                mime_type, stat.st_size, width, height)
+
+    def put_bytes(self, data: bytes, file_name: str, mime_type: str = "") -> MediaHandle:
+        """
+        登記內存中的字節（例如編碼後的圖片）
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        width, height = sniff_image_size(data[:64 * 1024])
+        mime_type = mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+        return self._new_handle(sha256, lambda: _MediaEntry(data=data), file_name, mime_type,
+                                len(data), width, height)
+
+    def _entry(self, handle: MediaHandle) -> _MediaEntry:
+        entry = self._entries.get(handle.key)
+        if entry is None:
+            raise KeyError(f"媒體已被釋放: {handle!r}")
+        return entry
+
+    def file_path(self, handle: MediaHandle) -> str:
+        """
+        返回可供上傳器讀取的文件路徑；內存字節只在第一次需要時寫入媒體暫存區，並在句柄釋放前保持固定
+        """
+        with self._lock:
+            entry = self._entry(handle)
+            if not entry.path:
+                suffix = os.path.splitext(handle.file_name)[1]
+                entry.path = get_scratch_space().put_bytes(entry.data, handle.key, suffix)
+                entry.owns_path = True
+            return entry.path
+
+    def read_bytes(self, handle: MediaHandle) -> bytes:
+        with self._lock:
+            entry = self._entry(handle)
+            if entry.data is not None:
+                return entry.data
+            path = entry.path
+        with open(path, "rb") as f:
+            return f.read()
+
+    def get_hosted_url(self, handle: MediaHandle, service: str) -> str:
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is None or service not in entry.hosted_urls:
+                return ""
+            url, stored_at = entry.hosted_urls[service]
+            if time.time() - stored_at > HOSTED_URL_TTL:
+                del entry.hosted_urls[service]
+                return ""
+            return url
+
+    def set_hosted_url(self, handle: MediaHandle, service: str, url: str) -> None:
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry:
+                entry.hosted_urls[service] = (url, time.time())
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            del self._entries[key]
+        if entry.owns_path:
+            # 解除固定後由暫存區按 LRU 淘汰，相同內容再次需要落地時可以直接重用
+            get_scratch_space().release(entry.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "in_memory_bytes": sum(len(e.data) for e in self._entries.values() if e.data is not None),
+                "references": sum(e.refcount for e in self._entries.values()),
+            }
+
+
+_media_store = MediaStore()
+
+
+def get_media_store() -> MediaStore:
+    return _media_store
@@ -0,0 +1,229 @@
+"""
+Threads 容器狀態共享輪詢器
+進程內所有等待中的容器按下一次檢查時間排入同一個堆，到期的容器合併為多 ID 請求
+(GET /?ids=a,b,c&fields=status,error_message)，API 調用次數隨輪詢輪數增長，而不是隨容器數量增長
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+import requests
+
+# Graph API 多 ID 讀取的單次上限
+MAX_IDS_PER_REQUEST = 50
+FINAL_STATUSES = ("FINISHED", "ERROR", "EXPIRED", "PUBLISHED")
+# 429 / 5xx 時整批退避重試的次數與最長等待
+MAX_TRANSIENT_RETRIES = 5
+MAX_BACKOFF_SECONDS = 120
+# Graph API 表示請求的 ID 不存在的錯誤碼
+BAD_ID_ERROR_CODES = (100, 803)
+
+
+def names_bad_id(response, container_ids: list) -> bool:
+    """
+    400 響應的錯誤是否指向請求中的某個 ID；只有這種情況才需要逐個重試以隔離無效 ID
+    """
+    if response.status_code != 400:
+        return False
+    try:
+        error = response.json().get('error', {})
+    except (ValueError, AttributeError):
+        return False
+    message = str(error.get('message', ''))
+    if any(container_id in message for container_id in container_ids):
+        return True
+    return error.get('code') in BAD_ID_ERROR_CODES and "does not exist" in message
+
+
+def retry_after_seconds(response, default: float) -> float:
+    try:
+        return max(float(response.headers.get('Retry-After', '')), default)
+    except ValueError:
+        return default
+
+
+class ContainerWatch:
+    """
+    單一容器的等待狀態；同一容器的多個等待者共用一個 ContainerWatch
+    """
+
+    def __init__(self, container_id: str, access_token: str, interval: float):
+        self.container_id = container_id
+        self.access_token = access_token
+        self.interval = interval
+        self.event = threading.Event()
+        self.success = True
+        self.status = "UNKNOWN"
+        self.error_message = ""
+        self.history = []
+        self.waiters = 0
+        # 暫時性錯誤的連續次數與下一次檢查前的退避時間（0 表示按 interval）
+        self.transient_errors = 0
+        self.backoff = 0
+
+    def record(self, status: str, error_message: str = "") -> None:
+        self.status = status
+        self.error_message = error_message
+        if not self.history or self.history[-1] != status:
+            self.history.append(status)
+
+    def fail(self, error_message: str) -> None:
+        self.success = False
+        self.status = "ERROR"
+        self.error_message = error_message
+        self.event.set()
+
+
+class ContainerStatusPoller:
+    """
+    進程級容器狀態輪詢器
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._heap = []
+        self._watches = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._session = requests.Session()
+        self.request_count = 0
+
+    def watch(self, container_id: str, access_token: str, interval: float = 5) -> ContainerWatch:
+        with self._condition:
+            watch = self._watches.get(container_id)
+            if watch is None:
+                watch = ContainerWatch(container_id, access_token, interval)
+                self._watches[container_id] = watch
+                # 第一次檢查立即進行
+                heapq.heappush(self._heap, (time.time(), next(self._sequence), container_id))
+                self._condition.notify()
+            else:
+                watch.interval = min(watch.interval, interval)
+            watch.waiters += 1
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="threads-status-poller", daemon=True)
+                self._thread.start()
+            return watch
+
+    def unwatch(self, watch: ContainerWatch) -> None:
+        with self._condition:
+            watch.waiters -= 1
+            if watch.waiters <= 0 and self._watches.get(watch.container_id) is watch:
+                # 堆中剩餘的條目在到期時因找不到 watch 而被跳過
+                del self._watches[watch.container_id]
+
+    def wait(self, container_id: str, access_token: str, timeout: float,
+             interval: float = 5) -> ContainerWatch:
+        """
+        阻塞直到容器進入最終狀態或超時，返回 ContainerWatch（event 未設定表示超時）
+        """
+        watch = self.watch(container_id, access_token, interval)
+        try:
+            watch.event.wait(timeout)
+            return watch
+        finally:
+            self.unwatch(watch)
+
+    def _loop(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=delay)
+
+                now = time.time()
+                due = {}
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, container_id = heapq.heappop(self._heap)
+                    watch = self._watches.get(container_id)
+                    if watch is not None and not watch.event.is_set():
+                        # 多 ID 請求只能合併同一權杖的容器
+                        due.setdefault(watch.access_token, []).append(watch)
+
+            for access_token, watches in due.items():
+                for start in range(0, len(watches), MAX_IDS_PER_REQUEST):
+                    self._check_batch(access_token, watches[start:start + MAX_IDS_PER_REQUEST])
+
+            with self._condition:
+                now = time.time()
+                for watches in due.values():
+                    for watch in watches:
+                        if not watch.event.is_set() and self._watches.get(watch.container_id) is watch:
+                            heapq.heappush(self._heap, (now + (watch.backoff or watch.interval),
+                                                        next(self._sequence), watch.container_id))
+
+    def _check_batch(self, access_token: str, watches: list) -> None:
+        ids = ",".join(watch.container_id for watch in watches)
+        try:
+            self.request_count += 1
+            response = self._session.get(f"{self.base_url}/", params={
+                'ids': ids,
+                'fields': 'status,error_message',
+                'access_token': access_token
+            }, timeout=30)
+        except requests.RequestException as e:
+            for watch in watches:
+                watch.fail(f"狀態檢查異常: {str(e)}")
+            return
+
+        if response.status_code == 429 or response.status_code >= 500:
+            # 限流或服務端錯誤與個別 ID 無關，整批退避後重試，不拆分成單 ID 請求
+            for watch in watches:
+                watch.transient_errors += 1
+                if watch.transient_errors > MAX_TRANSIENT_RETRIES:
+                    watch.fail(f"狀態檢查失敗: {response.status_code} - {response.text}")
+                    continue
+                watch.backoff = retry_after_seconds(
+                    response, min(watch.interval * 2 ** watch.transient_errors, MAX_BACKOFF_SECONDS)
+                )
+            return
+
+        if response.status_code != 200:
+            if len(watches) > 1 and names_bad_id(response, [watch.container_id for watch in watches]):
+                # 單一無效 ID 會使整個多 ID 請求失敗，逐個重試以隔離錯誤
+                for watch in watches:
+                    self._check_batch(access_token, [watch])
+                return
+            for watch in watches:
+                watch.fail(f"狀態檢查失敗: {response.status_code} - {response.text}")
+            return
+
+        try:
+            results = response.json()
+        except ValueError:
+            for watch in watches:
+                watch.fail(f"狀態檢查響應無法解析: {response.text[:200]}")
+            return
+
+        for watch in watches:
+            watch.transient_errors = 0
+            watch.backoff = 0
+            result = results.get(watch.container_id)
+            if result is None:
+                watch.fail("狀態檢查響應中缺少此容器")
+                continue
+            watch.record(result.get('status', 'UNKNOWN'), result.get('error_message', ''))
+            if watch.status in FINAL_STATUSES:
+                watch.event.set()
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_status_poller(base_url: str) -> ContainerStatusPoller:
+    with _pollers_lock:
+        poller = _pollers.get(base_url)
+        if poller is None:
+            poller = ContainerStatusPoller(base_url)
+            _pollers[base_url] = poller
+        return poller
@@ -0,0 +1,292 @@
+"""
+Threads 發布前離線預檢（dry run）
+只做本地檢查：文本長度、權杖格式、媒體文件頭識別與大小、每日配額，不發出任何網絡請求
+"""
+
+import os
+import re
+import struct
+import time
+
+try:
+    from .threads_media import sniff_image_size
+    from .threads_text import THREADS_TEXT_LIMIT, split_for_threads, threads_length
+    from .threads_journal import get_publish_journal
+except ImportError:
+    from threads_media import sniff_image_size
+    from threads_text import THREADS_TEXT_LIMIT, split_for_threads, threads_length
+    from threads_journal import get_publish_journal
+
+# Threads API 限制
+DAILY_POST_LIMIT = 250
+DAILY_REPLY_LIMIT = 1000
+MAX_LINKS_PER_POST = 5
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+MAX_VIDEO_BYTES = 1024 * 1024 * 1024
+MAX_VIDEO_SECONDS = 300
+MIN_IMAGE_WIDTH = 320
+MAX_IMAGE_WIDTH = 1440
+MAX_ASPECT_RATIO = 10
+
+SNIFF_BYTES = 64 * 1024
+_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_\-|.]{20,}$")
+_LINK_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
+# ISO BMFF (ftyp) 品牌：HEIF 系列是圖片格式，不能當作 MP4 視頻
+HEIF_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"heim": "image/heic", b"heis": "image/heic",
+    b"hevc": "image/heic-sequence", b"hevx": "image/heic-sequence",
+    b"mif1": "image/heif", b"msf1": "image/heif-sequence",
+    b"avif": "image/avif", b"avis": "image/avif",
+}
+MP4_BRAND_PREFIXES = (b"iso", b"mp4", b"avc1", b"M4V", b"dash", b"f4v")
+
+
+def sniff_media_format(header: bytes) -> str:
+    """
+    按文件頭（magic bytes）識別格式，返回 MIME 類型；無法識別時返回空字符串
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        return _ftyp_media_format(header)
+    return ""
+
+
+def _ftyp_media_format(header: bytes) -> str:
+    """
+    按 ftyp 盒子的主品牌識別，主品牌不認識時再看兼容品牌列表
+    """
+    box_size = struct.unpack(">I", header[:4])[0]
+    box_end = min(box_size, len(header)) if box_size >= 16 else 16
+    # 主品牌、次版本之後是 4 字節一組的兼容品牌
+    brands = [header[8:12]] + [header[offset:offset + 4] for offset in range(16, box_end - 3, 4)]
+    for brand in brands:
+        if brand in HEIF_BRANDS:
+            return HEIF_BRANDS[brand]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand.startswith(MP4_BRAND_PREFIXES):
+            return "video/mp4"
+    return ""
+
+
+def read_mp4_duration(file_path: str) -> float:
+    """
+    從 moov/mvhd 讀取 MP4/MOV 時長（秒），只讀取盒子頭，無法解析時返回 0
+    """
+    try:
+        with open(file_path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            end = file_size
+            offset = 0
+            while offset + 8 <= end:
+                f.seek(offset)
+                size, box_type = struct.unpack(">I4s", f.read(8))
+                header_size = 8
+                if size == 1:
+                    size = struct.unpack(">Q", f.read(8))[0]
+                    header_size = 16
+                elif size == 0:
+                    size = end - offset
+                if size < header_size:
+                    return 0
+                if box_type == b"moov":
+                    # 進入 moov 容器，繼續掃描其子盒子
+                    end = offset + size
+                    offset += header_size
+                    continue
+                if box_type == b"mvhd":
+                    version = f.read(1)[0]
+                    f.read(3)
+                    if version == 1:
+                        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+                    else:
+                        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+                    return duration / timescale if timescale else 0
+                offset += size
+    except (OSError, struct.error, IndexError):
+        pass
+    return 0
+
+
+class QuotaLedger:
+    """
+    配額賬本：每個帳戶的已用量只從發布日誌讀取一次，之後在內存中累計本批次計劃發布的數量
+    """
+
+    def __init__(self, now: float = 0):
+        self.since = (now or time.time()) - 86400
+        self._used = {}
+
+    def _load(self, threads_user_id: str) -> dict:
+        used = self._used.get(threads_user_id)
+        if used is None:
+            journal = get_publish_journal()
+            used = {
+                "posts": journal.count_since(threads_user_id, self.since, replies=False),
+                "replies": journal.count_since(threads_user_id, self.since, replies=True),
+            }
+            self._used[threads_user_id] = used
+        return used
+
+    def reserve(self, threads_user_id: str, posts: int = 1, replies: int = 0) -> dict:
+        used = self._load(threads_user_id or "me")
+        used["posts"] += posts
+        used["replies"] += replies
+        return {
+            "posts_used": used["posts"],
+            "posts_limit": DAILY_POST_LIMIT,
+            "replies_used": used["replies"],
+            "replies_limit": DAILY_REPLY_LIMIT,
+        }
+
+
+def check_token_format(access_token: str, errors: list, warnings: list) -> None:
+    if not access_token or not access_token.strip():
+        errors.append("缺少存取權杖")
+        return
+    if access_token != access_token.strip() or any(char.isspace() for char in access_token):
+        errors.append("權杖包含空白字符（可能複製時帶入了換行或空格）")
+        return
+    if not _TOKEN_PATTERN.match(access_token):
+        errors.append("權杖格式不正確")
+        return
+    if not access_token.startswith("TH"):
+        warnings.append("權杖不是以 TH 開頭，可能不是 Threads 權杖")
+
+
+def check_media_file(file_path: str, media_type: str, max_file_size_mb: float,
+                     errors: list, warnings: list) -> dict:
+    """
+    檢查本地媒體文件：只讀取文件頭，返回媒體元數據
+    """
+    info = {"path": file_path}
+    if not os.path.isfile(file_path):
+        errors.append(f"媒體文件不存在: {file_path}")
+        return info
+
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        header = f.read(SNIFF_BYTES)
+    mime_type = sniff_media_format(header)
+    info.update({"size": size, "mime_type": mime_type})
+
+    check_media_metadata(media_type, mime_type, size, max_file_size_mb, errors, warnings)
+    if media_type == "IMAGE" and mime_type.startswith("image/"):
+        info["width"], info["height"] = sniff_image_size(header)
+        check_image_dimensions(info["width"], info["height"], errors, warnings)
+    elif media_type == "VIDEO" and mime_type.startswith("video/"):
+        info["duration"] = round(read_mp4_duration(file_path), 2)
+        if info["duration"] > MAX_VIDEO_SECONDS:
+            errors.append(f"視頻時長 {info['duration']} 秒超過 {MAX_VIDEO_SECONDS} 秒限制")
+    return info
+
+
+def check_media_metadata(media_type: str, mime_type: str, size: int, max_file_size_mb: float,
+                         errors: list, warnings: list) -> None:
+    if not mime_type:
+        errors.append("無法識別的媒體格式")
+    elif media_type == "IMAGE" and mime_type not in ("image/jpeg", "image/png"):
+        errors.append(f"Threads 圖片只支援 JPEG/PNG，當前為 {mime_type}")
+    elif media_type == "VIDEO" and mime_type not in ("video/mp4", "video/quicktime"):
+        errors.append(f"Threads 視頻只支援 MP4/MOV，當前為 {mime_type}")
+
+    platform_limit = MAX_IMAGE_BYTES if media_type == "IMAGE" else MAX_VIDEO_BYTES
+    if size > platform_limit:
+        errors.append(f"文件大小 {size / 1024 / 1024:.1f}MB 超過 Threads 限制 {platform_limit / 1024 / 1024:.0f}MB")
+    elif max_file_size_mb and size > max_file_size_mb * 1024 * 1024:
+        # 實際發布不強制 max_file_size_mb，預檢只提示，避免拒絕能夠正常發布的文件
+        warnings.append(f"文件大小 {size / 1024 / 1024:.1f}MB 超過設定上限 {max_file_size_mb}MB")
+
+
+def check_image_dimensions(width: int, height: int, errors: list, warnings: list) -> None:
+    if not width or not height:
+        warnings.append("無法讀取圖片尺寸")
+        return
+    if max(width, height) / min(width, height) > MAX_ASPECT_RATIO:
+        errors.append(f"圖片長寬比超過 {MAX_ASPECT_RATIO}:1")
+    if width < MIN_IMAGE_WIDTH or width > MAX_IMAGE_WIDTH:
+        warnings.append(f"圖片寬度 {width}px 不在 {MIN_IMAGE_WIDTH}-{MAX_IMAGE_WIDTH}px 之間，Threads 會縮放")
+
+
+def preflight_post(access_token: str, text: str, media_type: str, threads_user_id: str = "me",
+                   media_file_path: str = "", media_url: str = "", media=None,
+                   max_file_size_mb: float = 0, auto_thread: bool = False,
+                   ledger: QuotaLedger = None) -> dict:
+    """
+    對單個帖子執行全部離線檢查，返回結構化判定：
+    {"ok", "errors", "warnings", "media_type", "text_length", "parts", "media", "quota"}
+    """
+    errors = []
+    warnings = []
+    check_token_format(access_token, errors, warnings)
+
+    text = text or ""
+    text_length = threads_length(text)
+    parts = 1
+    if media_type == "TEXT" and not text.strip():
+        errors.append("純文本帖子需要 text")
+    if text_length > THREADS_TEXT_LIMIT:
+        if auto_thread:
+            parts = len(split_for_threads(text, THREADS_TEXT_LIMIT))
+            warnings.append(f"文本將拆分為 {parts} 段串文")
+        else:
+            errors.append(f"文本長度 {text_length} 超過 {THREADS_TEXT_LIMIT} 字符限制")
+    if len(set(_LINK_PATTERN.findall(text))) > MAX_LINKS_PER_POST:
+        errors.append(f"文本包含超過 {MAX_LINKS_PER_POST} 個不同的鏈接")
+
+    media_info = {}
+    if media_type in ("IMAGE", "VIDEO"):
+        if media_url:
+            media_info = {"url": media_url}
+            if media_url.startswith("data:"):
+                errors.append("Threads 無法讀取 Data URL，請使用公開可訪問的 URL")
+            elif not media_url.lower().startswith(("http://", "https://")):
+                errors.append("媒體 URL 必須是 http(s) 地址")
+            else:
+                warnings.append("媒體 URL 未在離線模式下驗證可訪問性")
+        elif media is not None:
+            media_info = {"file_name": media.file_name, "mime_type": media.mime_type, "size": media.size,
+                          "width": media.width, "height": media.height}
+            check_media_metadata(media_type, media.mime_type, media.size, max_file_size_mb, errors, warnings)
+            if media_type == "IMAGE":
+                check_image_dimensions(media.width, media.height, errors, warnings)
+        elif media_file_path:
+            media_info = check_media_file(media_file_path, media_type, max_file_size_mb, errors, warnings)
+        else:
+            errors.append(f"{media_type} 帖子需要提供媒體文件或 URL")
+
+    quota = (ledger or QuotaLedger()).reserve(threads_user_id, 1, parts - 1)
+    if quota["posts_used"] > DAILY_POST_LIMIT:
+        errors.append(f"24 小時內發布數將達 {quota['posts_used']}，超過 {DAILY_POST_LIMIT} 的限制")
+    if quota["replies_used"] > DAILY_REPLY_LIMIT:
+        errors.append(f"24 小時內回覆數將達 {quota['replies_used']}，超過 {DAILY_REPLY_LIMIT} 的限制")
+
+    return {
+        "ok": not errors,
+        "errors": errors,
+        "warnings": warnings,
+        "media_type": media_type,
+        "text_length": text_length,
+        "parts": parts,
+        "media": media_info,
+        "quota": quota,
+    }
+
+
+def format_verdict(verdict: dict) -> str:
+    """
+    判定的單行摘要加上逐條錯誤和警告
+    """
+    lines = [f"{'✅ 預檢通過' if verdict['ok'] else '❌ 預檢未通過'} "
+             f"({verdict['media_type']}, {verdict['text_length']} 字符, {verdict['parts']} 段, "
+             f"今日配額 {verdict['quota']['posts_used']}/{verdict['quota']['posts_limit']})"]
+    lines.extend(f"❌ {error}" for error in verdict["errors"])
+    lines.extend(f"⚠️ {warning}" for warning in verdict["warnings"])
+    return "\n".join(lines)
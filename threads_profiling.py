@@ -0,0 +1,265 @@
+"""
+節點執行剖析（可選）
+啟用後包裝每個節點的 FUNCTION，每次執行保存一組剖析文件：
+    .prof    cProfile 統計（deterministic 模式），可用 snakeviz / pstats 查看
+    .folded  摺疊堆疊，每行「幀;幀;幀 次數」，可直接交給 flamegraph.pl 或 speedscope
+    .txt     耗時摘要
+未啟用時節點方法保持原樣，沒有任何包裝開銷
+
+環境變數 THREADS_PROFILE = deterministic | sampling（1 等同 deterministic），
+THREADS_PROFILE_DIR 指定輸出目錄，THREADS_PROFILE_INTERVAL_MS 指定採樣間隔；也可以用 ThreadsProfilingNode 在運行時切換
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    from .threads_common import get_data_dir
+except ImportError:
+    from threads_common import get_data_dir
+
+PROFILE_MODES = ("off", "deterministic", "sampling")
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+# 每次執行一組文件，超過此數量時刪除最舊的
+DEFAULT_PROFILE_KEEP = 200
+SUMMARY_LINES = 40
+
+
+def _env_number(name: str, default, cast=float):
+    """
+    讀取數值環境變數；格式錯誤或不是正數時提示並使用默認值
+    """
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        print(f"⚠️ {name}={value!r} 無效，使用默認值 {default}")
+        return default
+    return number
+
+
+def mode_from_env() -> str:
+    value = os.environ.get("THREADS_PROFILE", "").strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return "deterministic"
+    return value if value in PROFILE_MODES else "off"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """
+    定期讀取 sys._current_frames()，累計被剖析線程及其執行期間新建線程的堆疊
+    開始時已存在的其他線程（ComfyUI 服務器、後台排程器等）不計入
+    """
+
+    def __init__(self, interval: float, target_ident: int):
+        super().__init__(name="threads-profile-sampler", daemon=True)
+        self.interval = interval
+        self.target_ident = target_ident
+        self.excluded = {thread.ident for thread in threading.enumerate()} - {target_ident}
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or ident in self.excluded:
+                    continue
+                stack = []
+                while frame is not None:
+                    # 略過剖析包裝本身的幀
+                    if frame.f_code.co_filename != __file__:
+                        stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class NodeProfiler:
+    """
+    安裝與移除節點方法的包裝；同一線程中嵌套的節點調用（例如一體化節點內部的上傳）只在最外層剖析
+    """
+
+    def __init__(self):
+        self.mode = "off"
+        self.output_dir = ""
+        self.interval = DEFAULT_SAMPLE_INTERVAL_MS / 1000
+        self.keep = _env_number("THREADS_PROFILE_KEEP", DEFAULT_PROFILE_KEEP, int)
+        self.node_classes = {}
+        self.saved = 0
+        self._originals = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def register(self, node_classes: dict) -> None:
+        self.node_classes = node_classes
+
+    def configure(self, mode: str, output_dir: str = "", interval_ms: float = 0) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支援的剖析模式: {mode}")
+        with self._lock:
+            if mode != "off" or output_dir:
+                self.output_dir = output_dir or os.environ.get("THREADS_PROFILE_DIR", "") or get_data_dir("profiles")
+            self.interval = (interval_ms or _env_number(
+                "THREADS_PROFILE_INTERVAL_MS", DEFAULT_SAMPLE_INTERVAL_MS
+            )) / 1000
+            self.mode = mode
+            if mode == "off":
+                self._uninstall()
+            else:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self._install()
+
+    def _install(self) -> None:
+        for cls in self.node_classes.values():
+            function_name = getattr(cls, "FUNCTION", "")
+            key = (cls, function_name)
+            if not function_name or key in self._originals or getattr(cls, "PROFILER_EXEMPT", False):
+                continue
+            original = cls.__dict__.get(function_name)
+            if original is None:
+                continue
+            self._originals[key] = original
+            setattr(cls, function_name, self._wrap(cls.__name__, function_name, original))
+
+    def _uninstall(self) -> None:
+        for (cls, function_name), original in self._originals.items():
+            setattr(cls, function_name, original)
+        self._originals.clear()
+
+    def _wrap(self, class_name: str, function_name: str, original):
+        profiler = self
+
+        @functools.wraps(original)
+        def profiled(*args, **kwargs):
+            if getattr(profiler._local, "active", False) or not profiler.enabled:
+                return original(*args, **kwargs)
+            profiler._local.active = True
+            try:
+                return profiler._run(f"{class_name}.{function_name}", original, args, kwargs)
+            finally:
+                profiler._local.active = False
+
+        return profiled
+
+    def _run(self, label: str, original, args, kwargs):
+        mode = self.mode
+        sampler = StackSampler(self.interval, threading.get_ident())
+        profile = None
+        if mode == "deterministic":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 其他剖析工具已在運行（例如另一線程的 cProfile），退回只採樣
+                profile = None
+        sampler.start()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            sampler.stop()
+            try:
+                self._save(label, profile, sampler, wall, cpu)
+            except OSError as e:
+                print(f"⚠️ 剖析結果保存失敗: {str(e)}")
+
+    def _save(self, label: str, profile, sampler: StackSampler, wall: float, cpu: float) -> None:
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        base = os.path.join(
+            self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{sequence:04d}-{label}"
+        )
+
+        summary = [
+            f"{label}",
+            f"耗時 {wall:.3f}s，進程 CPU {cpu:.3f}s，採樣 {sampler.samples} 次（間隔 {self.interval * 1000:.0f}ms）",
+            "",
+        ]
+        if profile is not None:
+            profile.dump_stats(f"{base}.prof")
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+            summary.append(stream.getvalue())
+        else:
+            leaves = Counter()
+            for stack, count in sampler.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(leaves.values()) or 1
+            summary.append("採樣最多的幀（含等待中的線程）:")
+            summary.extend(f"{count / total * 100:6.1f}%  {frame}" for frame, count in leaves.most_common(SUMMARY_LINES))
+
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            f.write(sampler.folded())
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(summary))
+        self.saved += 1
+        print(f"🔬 剖析已保存: {base}.* ({wall:.2f}s)")
+        self._prune()
+
+    def _prune(self) -> None:
+        try:
+            with os.scandir(self.output_dir) as entries:
+                runs = sorted({entry.name.rsplit(".", 1)[0] for entry in entries if entry.is_file()})
+        except OSError:
+            return
+        for run in runs[:max(0, len(runs) - self.keep)]:
+            for suffix in (".prof", ".folded", ".txt"):
+                try:
+                    os.remove(os.path.join(self.output_dir, run + suffix))
+                except OSError:
+                    pass
+
+
+_profiler = NodeProfiler()
+
+
+def get_node_profiler() -> NodeProfiler:
+    return _profiler
+
+
+def setup_node_profiling(node_classes: dict) -> None:
+    """
+    登記節點類；THREADS_PROFILE 已設定時立即啟用
+    """
+    _profiler.register(node_classes)
+    mode = mode_from_env()
+    if mode != "off":
+        _profiler.configure(mode)
+        print(f"🔬 節點剖析已啟用 ({mode})，輸出目錄: {_profiler.output_dir}")
@@ -0,0 +1,428 @@
+"""
+Threads 持久化多進程發布隊列
+任務保存在 SQLite (WAL) 中，由獨立的工作進程以租約方式領取，避免在 ComfyUI 進程內與 GIL 和界面競爭
+同一帳戶的任務按加入順序逐個執行，不同帳戶的任務在多個進程中並行；租約過期的任務自動重新排隊
+"""
+
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from .threads_common import get_data_dir, token_fingerprint
+except ImportError:
+    from threads_common import get_data_dir, token_fingerprint
+
+STATUS_QUEUED = "queued"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_IDLE_EXIT = 60
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "threads_cli.py")
+
+
+def default_worker_count() -> int:
+    configured = os.environ.get("THREADS_QUEUE_WORKERS", "")
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class PublishQueueStore:
+    """
+    發布隊列的 SQLite 存儲；shard 為帳戶鍵，同一 shard 只有最早的未完成任務可以被領取
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or os.path.join(get_data_dir(), "publish_queue.db")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS publish_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    shard TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    label TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    queue_media TEXT NOT NULL DEFAULT '',
+                    result TEXT NOT NULL DEFAULT '',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    lease_owner TEXT NOT NULL DEFAULT '',
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(publish_jobs)")}
+            if "queue_media" not in columns:
+                # 舊版數據庫：補上隊列媒體欄位，並從 payload 回填
+                conn.execute("ALTER TABLE publish_jobs ADD COLUMN queue_media TEXT NOT NULL DEFAULT ''")
+                for job_id, payload in conn.execute(
+                    "SELECT id, payload FROM publish_jobs WHERE status IN (?, ?)", (STATUS_QUEUED, STATUS_LEASED)
+                ).fetchall():
+                    queue_media = json.loads(payload).get("queue_media", "")
+                    if queue_media:
+                        conn.execute("UPDATE publish_jobs SET queue_media = ? WHERE id = ?", (queue_media, job_id))
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_publish_jobs_status ON publish_jobs (status, id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_publish_jobs_media ON publish_jobs (queue_media, status)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_publish_jobs_shard ON publish_jobs (shard, status, id)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def enqueue(self, payload: dict, label: str = "", shard: str = "",
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, media_source: tuple = None) -> int:
+        """
+        加入任務；media_source 為 (源文件路徑, sha256) 時先把媒體複製到隊列媒體目錄
+        複製與寫入任務在同一個 BEGIN IMMEDIATE 事務內完成，與 release_media 的檢查刪除互斥
+        """
+        shard = shard or token_fingerprint(payload.get("access_token", ""))
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if media_source:
+                payload["media_file_path"] = persist_queue_media(*media_source)
+                payload["queue_media"] = payload["media_file_path"]
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO publish_jobs (shard, status, label, payload, queue_media, max_attempts, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (shard, STATUS_QUEUED, label, json.dumps(payload, ensure_ascii=False),
+                 payload.get("queue_media", ""), max_attempts, now, now)
+            )
+            conn.execute("COMMIT")
+            return cursor.lastrowid
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        原子地領取一個任務，返回 (job_id, payload)；沒有可執行的任務時返回 None
+        BEGIN IMMEDIATE 讓多個進程的領取互斥，同一 shard 仍有較早的未完成任務時跳過
+        """
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload FROM publish_jobs AS j WHERE status = ? AND NOT EXISTS ("
+                "SELECT 1 FROM publish_jobs WHERE shard = j.shard AND status IN (?, ?) AND id < j.id"
+                ") ORDER BY id LIMIT 1",
+                (STATUS_QUEUED, STATUS_QUEUED, STATUS_LEASED)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE publish_jobs SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (STATUS_LEASED, owner, now + lease_seconds, now, row[0])
+            )
+            conn.execute("COMMIT")
+            return row[0], json.loads(row[1])
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, job_id: int, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """
+        延長租約；租約已被回收時返回 False
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE publish_jobs SET lease_expires = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, job_id, STATUS_LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id: int, owner: str, success: bool, result: dict) -> bool:
+        # 只有仍持有租約的工作進程可以寫入結果
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE publish_jobs SET status = ?, result = ?, lease_owner = '', updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (STATUS_DONE if success else STATUS_FAILED, json.dumps(result, ensure_ascii=False),
+                 time.time(), job_id, STATUS_LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def reclaim_expired(self) -> tuple:
+        """
+        回收過期租約：未達嘗試上限的重新排隊，已達上限的標記為失敗；返回 (重新排隊數, 失敗數)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            failed = conn.execute(
+                "UPDATE publish_jobs SET status = ?, result = ?, lease_owner = '', updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (STATUS_FAILED, json.dumps({"message": "工作進程多次中斷，已放棄"}, ensure_ascii=False),
+                 now, STATUS_LEASED, now)
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE publish_jobs SET status = ?, lease_owner = '', updated_at = ? "
+                "WHERE status = ? AND lease_expires < ?",
+                (STATUS_QUEUED, now, STATUS_LEASED, now)
+            ).rowcount
+        return requeued, failed
+
+    def cancel(self, job_id: int) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE publish_jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_CANCELLED, time.time(), job_id, STATUS_QUEUED)
+            )
+            return cursor.rowcount == 1
+
+    def count_active(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM publish_jobs WHERE status IN (?, ?)", (STATUS_QUEUED, STATUS_LEASED)
+            ).fetchone()[0]
+
+    def release_media(self, queue_media: str) -> bool:
+        """
+        沒有未完成的任務再使用隊列媒體文件時刪除它，返回是否已刪除
+        檢查與刪除在同一個 BEGIN IMMEDIATE 事務內，期間其他進程無法加入引用同一文件的任務
+        """
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            referenced = conn.execute(
+                "SELECT 1 FROM publish_jobs WHERE queue_media = ? AND status IN (?, ?) LIMIT 1",
+                (queue_media, STATUS_QUEUED, STATUS_LEASED)
+            ).fetchone() is not None
+            removed = False
+            if not referenced:
+                try:
+                    os.remove(queue_media)
+                    removed = True
+                except OSError:
+                    pass
+            conn.execute("COMMIT")
+            return removed
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def counts(self) -> dict:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM publish_jobs GROUP BY status"))
+
+    def list_jobs(self, status: str = "", limit: int = 50) -> list:
+        query = "SELECT id, shard, status, label, attempts, result, updated_at FROM publish_jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [
+                {
+                    "id": row[0],
+                    "shard": row[1],
+                    "status": row[2],
+                    "label": row[3],
+                    "attempts": row[4],
+                    "result": json.loads(row[5]) if row[5] else {},
+                    "updated_at": row[6],
+                }
+                for row in conn.execute(query, params)
+            ]
+
+
+def persist_queue_media(source_path: str, sha256: str) -> str:
+    """
+    將只存在於 ComfyUI 進程內的媒體（例如編碼後的圖片）複製到數據目錄，供工作進程讀取
+    """
+    target = os.path.join(get_data_dir("queue_media"), sha256 + os.path.splitext(source_path)[1])
+    if not os.path.exists(target):
+        temp_path = f"{target}.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, target)
+    return target
+
+
+class QueueWorker:
+    """
+    單個工作進程的主循環：回收過期租約 → 領取任務 → 執行 → 寫入結果；執行期間後台線程定期續約
+    """
+
+    def __init__(self, store: PublishQueueStore, run_job, worker_id: str = "",
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 1.0):
+        self.store = store
+        self.run_job = run_job
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.processed = 0
+
+    def _keep_lease(self, job_id: int, done: threading.Event) -> None:
+        while not done.wait(self.lease_seconds / 3):
+            if not self.store.renew(job_id, self.worker_id, self.lease_seconds):
+                print(f"⚠️ 隊列任務 #{job_id} 的租約已被回收")
+                return
+
+    def run_one(self) -> bool:
+        claimed = self.store.claim(self.worker_id, self.lease_seconds)
+        if claimed is None:
+            return False
+        job_id, payload = claimed
+        done = threading.Event()
+        threading.Thread(target=self._keep_lease, args=(job_id, done), daemon=True).start()
+        try:
+            success, result = self.run_job(payload)
+        except Exception as e:
+            success, result = False, {"message": f"隊列任務異常: {str(e)}"}
+        finally:
+            done.set()
+        if not self.store.finish(job_id, self.worker_id, success, result):
+            print(f"⚠️ 隊列任務 #{job_id} 的結果未寫入（租約已失效）")
+        print(f"{'✅' if success else '❌'} [{self.worker_id}] 隊列任務 #{job_id}: {result.get('message', '')}")
+
+        queue_media = payload.get("queue_media", "")
+        if queue_media:
+            self.store.release_media(queue_media)
+        self.processed += 1
+        return True
+
+    def run(self, idle_exit: float = DEFAULT_IDLE_EXIT) -> int:
+        """
+        持續處理任務；idle_exit 秒內沒有任務時退出（0 表示永不退出），返回處理的任務數
+        """
+        idle_since = time.time()
+        last_reclaim = 0
+        while True:
+            if time.time() - last_reclaim >= self.lease_seconds / 4:
+                requeued, failed = self.store.reclaim_expired()
+                if requeued or failed:
+                    print(f"♻️ 回收過期租約: {requeued} 個重新排隊, {failed} 個放棄")
+                last_reclaim = time.time()
+            if self.run_one():
+                idle_since = time.time()
+                continue
+            if idle_exit and time.time() - idle_since >= idle_exit:
+                return self.processed
+            time.sleep(self.poll_interval)
+
+
+class QueueWorkerPool:
+    """
+    管理工作進程；進程空閒時自行退出，有新任務時按需重新啟動
+    """
+
+    def __init__(self, workers: int = 0, db_path: str = ""):
+        self.workers = workers or default_worker_count()
+        self.db_path = db_path or PublishQueueStore().db_path
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def alive(self) -> int:
+        with self._lock:
+            self._processes = [process for process in self._processes if process.poll() is None]
+            return len(self._processes)
+
+    def ensure_running(self) -> int:
+        """
+        補足工作進程數量，返回新啟動的進程數
+        """
+        env = dict(os.environ, THREADS_DATA_DIR=get_data_dir(), PYTHONUNBUFFERED="1")
+        started = 0
+        with self._lock:
+            self._processes = [process for process in self._processes if process.poll() is None]
+            while len(self._processes) < self.workers:
+                worker_id = f"{socket.gethostname()}-{os.getpid()}-{len(self._processes)}-{int(time.time())}"
+                self._processes.append(subprocess.Popen(
+                    [sys.executable, CLI_PATH, "queue-worker", "--db", self.db_path, "--worker-id", worker_id],
+                    env=env
+                ))
+                started += 1
+        if started:
+            print(f"📥 已啟動 {started} 個發布隊列工作進程")
+        return started
+
+    def stop(self, timeout: float = 10) -> None:
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+_queue_store = None
+_queue_pool = None
+_queue_lock = threading.Lock()
+
+
+def get_publish_queue() -> PublishQueueStore:
+    global _queue_store
+    with _queue_lock:
+        if _queue_store is None:
+            _queue_store = PublishQueueStore()
+        return _queue_store
+
+
+def get_queue_pool(workers: int = 0) -> QueueWorkerPool:
+    global _queue_pool
+    store = get_publish_queue()
+    with _queue_lock:
+        if _queue_pool is None:
+            _queue_pool = QueueWorkerPool(workers, store.db_path)
+        elif workers:
+            _queue_pool.workers = workers
+        return _queue_pool
+
+
+def enqueue_publish(payload: dict, label: str = "", start_workers: bool = True,
+                    media_source: tuple = None) -> int:
+    """
+    加入發布隊列並確保有工作進程在運行；media_source 見 PublishQueueStore.enqueue
+    """
+    job_id = get_publish_queue().enqueue(payload, label, media_source=media_source)
+    if start_workers and not os.environ.get("THREADS_QUEUE_DISABLED"):
+        get_queue_pool().ensure_running()
+    return job_id
+
+
+def resume_publish_queue() -> None:
+    """
+    ComfyUI 啟動時有未完成的隊列任務則啟動工作進程；設定 THREADS_QUEUE_DISABLED 時不啟動
+    """
+    if os.environ.get("THREADS_QUEUE_DISABLED"):
+        return
+    if get_publish_queue().count_active():
+        get_queue_pool().ensure_running()
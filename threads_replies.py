@@ -0,0 +1,297 @@
+"""
+Threads 回覆讀取與批量管理
+回覆 (GET /{media_id}/replies) 和整個對話 (GET /{media_id}/conversation) 以游標分頁生成器逐條返回；
+每個帖子保存本地游標（已見過的最新回覆時間），之後只讀取新回覆；新回覆超過單次上限時記錄中斷位置，下次從該處繼續；
+隱藏/取消隱藏並行執行，共享速率限制與重試策略
+"""
+
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .threads_http import RateLimitedSession, RetryPolicy
+    from .threads_journal import connect_posts_db, get_posts_db_path
+    from .threads_listing import MAX_PAGE_SIZE, fetch_page, iter_paginated
+except ImportError:
+    from threads_http import RateLimitedSession, RetryPolicy
+    from threads_journal import connect_posts_db, get_posts_db_path
+    from threads_listing import MAX_PAGE_SIZE, fetch_page, iter_paginated
+
+DEFAULT_REPLY_FIELDS = "id,text,username,permalink,timestamp,media_type,has_replies,is_reply,replied_to,hide_status"
+REPLY_ENDPOINTS = ("replies", "conversation")
+DEFAULT_MODERATION_WORKERS = 4
+
+
+def parse_timestamp(value: str) -> float:
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def reply_session() -> RateLimitedSession:
+    """
+    隱藏/取消隱藏是冪等操作，連線錯誤時也可以安全重試
+    """
+    return RateLimitedSession(policy=RetryPolicy(retry_unsafe=True))
+
+
+class ReplyCursorStore:
+    """
+    每個帖子、每種來源的讀取游標：已見過的最新回覆時間，以及該時間點上已見過的回覆 ID
+    單次讀取達到上限時另外記錄補讀位置：中斷所在頁的分頁游標、已返回的最舊回覆時間和 ID，
+    以及補讀完成後游標應推進到的位置 (target)
+    """
+
+    BACKFILL_COLUMNS = {
+        "backfill_after": "TEXT NOT NULL DEFAULT ''",
+        "backfill_before": "REAL",
+        "backfill_ids": "TEXT NOT NULL DEFAULT '[]'",
+        "target_at": "REAL NOT NULL DEFAULT 0",
+        "target_ids": "TEXT NOT NULL DEFAULT '[]'",
+    }
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or get_posts_db_path()
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reply_cursors (
+                    media_id TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    newest_at REAL NOT NULL,
+                    newest_ids TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (media_id, endpoint)
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(reply_cursors)")}
+            for name, definition in self.BACKFILL_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE reply_cursors ADD COLUMN {name} {definition}")
+
+    def get(self, media_id: str, endpoint: str) -> dict:
+        """
+        返回 {"newest_at", "newest_ids", "backfill_after", "backfill_before", "backfill_ids", "target_at", "target_ids"}；
+        沒有進行中的補讀時 backfill_before 為 None
+        """
+        with connect_posts_db(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT newest_at, newest_ids, backfill_after, backfill_before, backfill_ids, target_at, target_ids "
+                "FROM reply_cursors WHERE media_id = ? AND endpoint = ?",
+                (media_id, endpoint)
+            ).fetchone()
+        if row is None:
+            return {"newest_at": 0.0, "newest_ids": set(), "backfill_after": "", "backfill_before": None,
+                    "backfill_ids": set(), "target_at": 0.0, "target_ids": set()}
+        return {
+            "newest_at": row[0],
+            "newest_ids": set(json.loads(row[1])),
+            "backfill_after": row[2],
+            "backfill_before": row[3],
+            "backfill_ids": set(json.loads(row[4])),
+            "target_at": row[5],
+            "target_ids": set(json.loads(row[6])),
+        }
+
+    def put(self, media_id: str, endpoint: str, newest_at: float, newest_ids: set) -> None:
+        """
+        推進游標並清除補讀位置
+        """
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reply_cursors (media_id, endpoint, newest_at, newest_ids, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (media_id, endpoint, newest_at, json.dumps(sorted(newest_ids)), time.time())
+            )
+
+    def put_backfill(self, media_id: str, endpoint: str, after: str, before_at: float, before_ids: set,
+                     target_at: float, target_ids: set) -> None:
+        """
+        記錄補讀位置；已推進的游標保持不變
+        """
+        with connect_posts_db(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO reply_cursors (media_id, endpoint, newest_at, newest_ids, updated_at) "
+                "VALUES (?, ?, 0, '[]', ?)",
+                (media_id, endpoint, time.time())
+            )
+            conn.execute(
+                "UPDATE reply_cursors SET backfill_after = ?, backfill_before = ?, backfill_ids = ?, "
+                "target_at = ?, target_ids = ?, updated_at = ? WHERE media_id = ? AND endpoint = ?",
+                (after, before_at, json.dumps(sorted(before_ids)), target_at, json.dumps(sorted(target_ids)),
+                 time.time(), media_id, endpoint)
+            )
+
+    def reset(self, media_id: str, endpoint: str = "") -> None:
+        with connect_posts_db(self.db_path) as conn:
+            if endpoint:
+                conn.execute("DELETE FROM reply_cursors WHERE media_id = ? AND endpoint = ?", (media_id, endpoint))
+            else:
+                conn.execute("DELETE FROM reply_cursors WHERE media_id = ?", (media_id,))
+
+
+def iter_replies(base_url: str, media_id: str, access_token: str, endpoint: str = "replies",
+                 fields: str = DEFAULT_REPLY_FIELDS, limit: int = 0, page_size: int = 50,
+                 session=None):
+    """
+    惰性讀取回覆，按時間由新到舊；endpoint 為 replies（頂層回覆）或 conversation（所有層級）
+    """
+    if endpoint not in REPLY_ENDPOINTS:
+        raise ValueError(f"不支援的回覆來源: {endpoint}")
+    params = {
+        'fields': fields or DEFAULT_REPLY_FIELDS,
+        'reverse': 'true',
+        'access_token': access_token
+    }
+    yield from iter_paginated(f"{base_url}/{media_id}/{endpoint}", params, limit, page_size,
+                              session=session or RateLimitedSession())
+
+
+def _iter_reply_pages(base_url: str, media_id: str, access_token: str, endpoint: str, fields: str,
+                      page_size: int, after: str = "", session=None):
+    """
+    逐頁產生 (請求本頁使用的 after 游標, 回覆列表)；保存的 after 游標已失效時從第一頁重新開始
+    """
+    url = f"{base_url}/{media_id}/{endpoint}"
+    params = {
+        'fields': fields,
+        'reverse': 'true',
+        'access_token': access_token,
+        'limit': max(1, min(page_size, MAX_PAGE_SIZE))
+    }
+    session = session or RateLimitedSession()
+    while True:
+        try:
+            page = fetch_page(url, dict(params, after=after) if after else params, session=session)
+        except RuntimeError as e:
+            if not after or params.get('after'):
+                raise
+            print(f"⚠️ 回覆補讀位置已失效，從第一頁重新讀取: {str(e)}")
+            after = ""
+            continue
+        yield after, page.get('data', [])
+        paging = page.get('paging', {})
+        next_after = paging.get('cursors', {}).get('after')
+        if not next_after or not paging.get('next') or not page.get('data'):
+            return
+        after = params['after'] = next_after
+
+
+def iter_new_replies(base_url: str, media_id: str, access_token: str, endpoint: str = "replies",
+                     fields: str = DEFAULT_REPLY_FIELDS, limit: int = 0, page_size: int = 50,
+                     store: ReplyCursorStore = None, resume: bool = True, session=None):
+    """
+    只返回游標之後的新回覆，讀到游標位置即停止翻頁，生成器完整結束時推進游標
+    達到 limit 時記錄補讀位置（中斷所在頁和已返回的最舊回覆），下次調用從該處繼續往更早的回覆讀取，
+    補讀到游標位置後游標才推進；補讀期間新到的回覆在之後的調用中讀取
+    調用方提前停止迭代時不記錄任何位置，下次會重新讀取這些回覆
+    resume = False 時忽略現有游標和補讀位置讀取全部回覆，讀完後同樣更新游標
+    """
+    store = store or ReplyCursorStore()
+    state = store.get(media_id, endpoint)
+    floor_at, floor_ids = (state["newest_at"], state["newest_ids"]) if resume else (0.0, set())
+    if resume and state["backfill_before"] is not None:
+        after = state["backfill_after"]
+        skip_at, skip_ids = state["backfill_before"], state["backfill_ids"]
+        target_at, target_ids = state["target_at"], set(state["target_ids"])
+    else:
+        after, skip_at, skip_ids = "", None, set()
+        target_at, target_ids = state["newest_at"], set(state["newest_ids"])
+    oldest_at, oldest_ids = skip_at, set(skip_ids)
+    yielded = 0
+
+    for page_after, replies in _iter_reply_pages(base_url, media_id, access_token, endpoint,
+                                                 _with_timestamp(fields), page_size, after, session):
+        for reply in replies:
+            reply_id = reply.get('id')
+            reply_at = parse_timestamp(reply.get('timestamp'))
+            if reply_at < floor_at:
+                store.put(media_id, endpoint, target_at, target_ids)
+                return
+            if reply_at == floor_at and reply_id in floor_ids:
+                continue
+            if skip_at is not None and (reply_at > skip_at or (reply_at == skip_at and reply_id in skip_ids)):
+                # 上次已返回
+                continue
+
+            if limit and yielded >= limit:
+                store.put_backfill(media_id, endpoint, page_after, oldest_at, oldest_ids, target_at, target_ids)
+                return
+
+            if reply_at > target_at:
+                target_at, target_ids = reply_at, {reply_id}
+            elif reply_at == target_at:
+                target_ids.add(reply_id)
+            if oldest_at is None or reply_at < oldest_at:
+                oldest_at, oldest_ids = reply_at, {reply_id}
+            elif reply_at == oldest_at:
+                oldest_ids.add(reply_id)
+
+            yield reply
+            yielded += 1
+
+    store.put(media_id, endpoint, target_at, target_ids)
+
+
+def _with_timestamp(fields: str) -> str:
+    # 游標依賴 timestamp 欄位
+    fields = fields or DEFAULT_REPLY_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    for required in ("id", "timestamp"):
+        if required not in names:
+            names.append(required)
+    return ",".join(names)
+
+
+def match_keywords(replies: list, keywords: list) -> list:
+    """
+    返回文本包含任一關鍵字（不分大小寫）的回覆
+    """
+    keywords = [keyword.casefold() for keyword in keywords if keyword]
+    if not keywords:
+        return []
+    return [
+        reply for reply in replies
+        if any(keyword in (reply.get('text') or "").casefold() for keyword in keywords)
+    ]
+
+
+def set_reply_hidden(base_url: str, reply_id: str, access_token: str, hide: bool = True,
+                     session=None) -> tuple:
+    """
+    隱藏或取消隱藏一條回覆 (POST /{reply_id}/manage_reply)，返回 (reply_id, 是否成功, 訊息)
+    """
+    session = session or reply_session()
+    try:
+        response = session.post(f"{base_url}/{reply_id}/manage_reply", params={
+            'hide': 'true' if hide else 'false',
+            'access_token': access_token
+        })
+        if response.status_code == 200 and response.json().get('success', True):
+            return (reply_id, True, "")
+        try:
+            message = response.json().get('error', {}).get('message', response.text)
+        except ValueError:
+            message = response.text
+        return (reply_id, False, f"{response.status_code} - {message}")
+    except Exception as e:
+        return (reply_id, False, str(e))
+
+
+def moderate_replies(base_url: str, reply_ids: list, access_token: str, hide: bool = True,
+                     max_workers: int = DEFAULT_MODERATION_WORKERS, session=None) -> list:
+    """
+    並行隱藏或取消隱藏多條回覆，返回與輸入順序一致的 [(reply_id, 是否成功, 訊息), ...]
+    所有請求共享同一帳戶的令牌桶，遇到限流時一起退避
+    """
+    reply_ids = list(dict.fromkeys(reply_id for reply_id in reply_ids if reply_id))
+    if not reply_ids:
+        return []
+    session = session or reply_session()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(reply_ids)))) as executor:
+        return list(executor.map(
+            lambda reply_id: set_reply_hidden(base_url, reply_id, access_token, hide, session),
+            reply_ids
+        ))
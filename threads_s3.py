@@ -0,0 +1,310 @@
+"""
+S3 相容儲存上傳後端
+支援 AWS S3、MinIO 等任何 S3 相容端點
+大文件使用分段上傳 (Multipart Upload)，各分段在線程池中並行發送
+"""
+
+import datetime
+import hashlib
+import hmac
+import mimetypes
+import os
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote, urlparse
+
+import requests
+
+# S3 規定除最後一段外，每個分段至少 5MB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MAX_PARTS = 10000
+# 預簽名 URL 最長有效期為 7 天
+MAX_PRESIGN_EXPIRES = 7 * 24 * 3600
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+class S3CompatibleUploader:
+    """
+    S3 相容上傳器 - 使用 AWS Signature V4 簽名，僅依賴 requests
+    """
+
+    def __init__(self, endpoint_url: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = "us-east-1", public_base_url: str = "", path_style: bool = True,
+                 part_size: int = DEFAULT_PART_SIZE, max_workers: int = 4,
+                 presign_expires: int = 24 * 3600):
+        if not endpoint_url.startswith(("http://", "https://")):
+            endpoint_url = f"https://{endpoint_url}"
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region or "us-east-1"
+        self.public_base_url = public_base_url.rstrip("/")
+        self.path_style = path_style
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.max_workers = max(1, int(max_workers))
+        self.presign_expires = min(max(int(presign_expires), 1), MAX_PRESIGN_EXPIRES)
+
+        parsed = urlparse(self.endpoint_url)
+        self.scheme = parsed.scheme
+        if self.path_style:
+            self.host = parsed.netloc
+            self.base_path = f"{parsed.path.rstrip('/')}/{bucket}"
+        else:
+            self.host = f"{bucket}.{parsed.netloc}"
+            self.base_path = parsed.path.rstrip("/")
+
+        # 同一上傳器的所有分段共用連接池
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, endpoint_url: str = "", bucket: str = "", access_key: str = "",
+                    secret_key: str = "", region: str = "", public_base_url: str = "",
+                    **kwargs) -> "S3CompatibleUploader":
+        """
+        從節點參數建立上傳器，未填寫的欄位回退到 THREADS_S3_* 環境變數
+        """
+        return cls(
+            endpoint_url=endpoint_url or os.environ.get("THREADS_S3_ENDPOINT", ""),
+            bucket=bucket or os.environ.get("THREADS_S3_BUCKET", ""),
+            access_key=access_key or os.environ.get("THREADS_S3_ACCESS_KEY", ""),
+            secret_key=secret_key or os.environ.get("THREADS_S3_SECRET_KEY", ""),
+            region=region or os.environ.get("THREADS_S3_REGION", "us-east-1"),
+            public_base_url=public_base_url or os.environ.get("THREADS_S3_PUBLIC_BASE_URL", ""),
+            **kwargs
+        )
+
+    def is_configured(self) -> bool:
+        return bool(self.endpoint_url and self.bucket and self.access_key and self.secret_key)
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _object_path(self, key: str) -> str:
+        return f"{self.base_path}/{_uri_encode(key, safe='/-_.~')}"
+
+    def _object_url(self, key: str) -> str:
+        return f"{self.scheme}://{self.host}{self._object_path(key)}"
+
+    def _credential_scope(self, date_stamp: str) -> str:
+        return f"{date_stamp}/{self.region}/s3/aws4_request"
+
+    def _signing_key(self, date_stamp: str) -> bytes:
+        k_date = _hmac_sha256(f"AWS4{self.secret_key}".encode("utf-8"), date_stamp)
+        k_region = _hmac_sha256(k_date, self.region)
+        k_service = _hmac_sha256(k_region, "s3")
+        return _hmac_sha256(k_service, "aws4_request")
+
+    @staticmethod
+    def _canonical_query(query: dict) -> str:
+        return "&".join(
+            f"{_uri_encode(str(k))}={_uri_encode(str(v))}"
+            for k, v in sorted(query.items())
+        )
+
+    def _signature(self, method: str, path: str, query: dict, headers: dict,
+                   payload_hash: str, amz_date: str) -> tuple:
+        date_stamp = amz_date[:8]
+        signed_names = sorted(name.lower() for name in headers)
+        lowered = {name.lower(): str(value).strip() for name, value in headers.items()}
+        canonical_headers = "".join(f"{name}:{lowered[name]}\n" for name in signed_names)
+        signed_headers = ";".join(signed_names)
+
+        canonical_request = "\n".join([
+            method, path, self._canonical_query(query),
+            canonical_headers, signed_headers, payload_hash
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, self._credential_scope(date_stamp),
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        signature = hmac.new(self._signing_key(date_stamp), string_to_sign.encode("utf-8"),
+                             hashlib.sha256).hexdigest()
+        return signature, signed_headers
+
+    def _request(self, method: str, key: str, query: dict = None, data=None,
+                 extra_headers: dict = None, timeout: int = 120) -> requests.Response:
+        """
+        發送已簽名的 S3 請求（負載使用 UNSIGNED-PAYLOAD，避免對大分段重複計算雜湊）
+        """
+        query = query or {}
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._object_path(key)
+
+        headers = {
+            "host": self.host,
+            "x-amz-content-sha256": UNSIGNED_PAYLOAD,
+            "x-amz-date": amz_date,
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+
+        signature, signed_headers = self._signature(method, path, query, headers,
+                                                    UNSIGNED_PAYLOAD, amz_date)
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{self._credential_scope(amz_date[:8])}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        # host 由 requests 自動帶上
+        headers.pop("host")
+
+        url = f"{self.scheme}://{self.host}{path}"
+        if query:
+            url = f"{url}?{self._canonical_query(query)}"
+        return self._session().request(method, url, data=data, headers=headers, timeout=timeout)
+
+    def presign_get(self, key: str, expires: int = None) -> str:
+        """
+        生成預簽名 GET URL（用於私有存儲桶）
+        """
+        expires = min(int(expires or self.presign_expires), MAX_PRESIGN_EXPIRES)
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._object_path(key)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{self._credential_scope(amz_date[:8])}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        signature, _ = self._signature("GET", path, query, {"host": self.host},
+                                       UNSIGNED_PAYLOAD, amz_date)
+        query["X-Amz-Signature"] = signature
+        return f"{self.scheme}://{self.host}{path}?{self._canonical_query(query)}"
+
+    def media_url_for(self, key: str) -> str:
+        """
+        返回容器使用的媒體 URL：有公開網址時直接拼接，否則使用預簽名 URL
+        """
+        if self.public_base_url:
+            return f"{self.public_base_url}/{_uri_encode(key, safe='/-_.~')}"
+        return self.presign_get(key)
+
+    def put_object(self, key: str, file_path: str, content_type: str) -> None:
+        with open(file_path, "rb") as f:
+            response = self._request("PUT", key, data=f, extra_headers={
+                "Content-Type": content_type,
+                "Content-Length": str(os.path.getsize(file_path)),
+            })
+        if response.status_code != 200:
+            raise RuntimeError(f"PutObject 失敗: {response.status_code} - {response.text[:300]}")
+
+    def _upload_part(self, key: str, upload_id: str, file_path: str, part_number: int,
+                     offset: int, length: int, retries: int = 3) -> tuple:
+        last_error = ""
+        for _ in range(retries):
+            # 每個工作線程只讀取自己的分段，內存佔用上限為 max_workers * part_size
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(length)
+            try:
+                response = self._request("PUT", key, query={
+                    "partNumber": str(part_number),
+                    "uploadId": upload_id,
+                }, data=chunk, extra_headers={"Content-Length": str(len(chunk))})
+                if response.status_code == 200:
+                    return (part_number, response.headers.get("ETag", ""))
+                last_error = f"{response.status_code} - {response.text[:200]}"
+            except requests.RequestException as e:
+                last_error = str(e)
+        raise RuntimeError(f"分段 {part_number} 上傳失敗: {last_error}")
+
+    def multipart_upload(self, key: str, file_path: str, content_type: str,
+                         progress_log: list = None) -> None:
+        """
+        並行分段上傳，失敗時中止上傳以釋放已上傳的分段
+        """
+        file_size = os.path.getsize(file_path)
+        part_size = self.part_size
+        # 確保分段數不超過 S3 限制
+        while (file_size + part_size - 1) // part_size > MAX_PARTS:
+            part_size *= 2
+
+        response = self._request("POST", key, query={"uploads": ""},
+                                 extra_headers={"Content-Type": content_type})
+        if response.status_code != 200:
+            raise RuntimeError(f"CreateMultipartUpload 失敗: {response.status_code} - {response.text[:300]}")
+        upload_id = ET.fromstring(response.content).findtext("{*}UploadId")
+        if not upload_id:
+            raise RuntimeError(f"CreateMultipartUpload 未返回 UploadId: {response.text[:300]}")
+
+        ranges = [
+            (index + 1, offset, min(part_size, file_size - offset))
+            for index, offset in enumerate(range(0, file_size, part_size))
+        ]
+        if progress_log is not None:
+            progress_log.append(f"📦 分段上傳: {len(ranges)} 段 × {part_size // (1024 * 1024)}MB，"
+                                f"並行數 {self.max_workers}")
+
+        try:
+            etags = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self._upload_part, key, upload_id, file_path, number, offset, length)
+                    for number, offset, length in ranges
+                ]
+                for future in as_completed(futures):
+                    part_number, etag = future.result()
+                    etags[part_number] = etag
+
+            parts_xml = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etags[number]}</ETag></Part>"
+                for number in sorted(etags)
+            )
+            body = f"<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>".encode("utf-8")
+            response = self._request("POST", key, query={"uploadId": upload_id}, data=body,
+                                     extra_headers={"Content-Type": "application/xml"})
+            # S3 可能以 200 狀態碼返回錯誤內容
+            if response.status_code != 200 or b"<Error>" in response.content:
+                raise RuntimeError(f"CompleteMultipartUpload 失敗: {response.status_code} - {response.text[:300]}")
+        except Exception:
+            try:
+                self._request("DELETE", key, query={"uploadId": upload_id}, timeout=30)
+            except requests.RequestException:
+                pass
+            raise
+
+    def upload_file(self, file_path: str, key: str = "", progress_log: list = None) -> tuple:
+        """
+        上傳文件並返回 (media_url, success, method)
+        """
+        try:
+            if not self.is_configured():
+                return ("", False, "S3 configuration incomplete (endpoint/bucket/access key/secret key)")
+
+            if not os.path.exists(file_path):
+                return ("", False, "File not found")
+
+            content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            if not key:
+                date_prefix = datetime.datetime.now().strftime("%Y%m%d")
+                key = f"threads/{date_prefix}/{uuid.uuid4().hex[:12]}_{os.path.basename(file_path)}"
+
+            file_size = os.path.getsize(file_path)
+            if file_size >= MULTIPART_THRESHOLD:
+                self.multipart_upload(key, file_path, content_type, progress_log)
+                method = f"S3 Multipart ({self.bucket})"
+            else:
+                self.put_object(key, file_path, content_type)
+                method = f"S3 ({self.bucket})"
+
+            return (self.media_url_for(key), True, method)
+
+        except Exception as e:
+            return ("", False, f"S3 upload error: {str(e)}")
@@ -0,0 +1,259 @@
+"""
+Threads 排程發布子系統
+排程任務持久化在 SQLite 中，後台線程使用最小堆計時器，在下一個到期時間準確喚醒
+ComfyUI 重新啟動後會自動恢復尚未執行的任務
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .threads_common import get_data_dir
+except ImportError:
+    from threads_common import get_data_dir
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_INTERRUPTED = "interrupted"
+
+
+class ScheduledPostStore:
+    """
+    排程任務的 SQLite 存儲
+    """
+
+    def __init__(self, db_path: str = ""):
+        self.db_path = db_path or os.path.join(get_data_dir(), "scheduled_posts.db")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scheduled_posts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    due_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    label TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    result TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_scheduled_posts_status_due "
+                "ON scheduled_posts (status, due_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add(self, due_at: float, payload: dict, label: str = "") -> int:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO scheduled_posts (due_at, status, label, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (due_at, STATUS_PENDING, label, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, job_id: int):
+        """
+        原子地將任務從 pending 改為 running，成功時返回 payload，否則返回 None
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_posts SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_RUNNING, time.time(), job_id, STATUS_PENDING)
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = conn.execute("SELECT payload FROM scheduled_posts WHERE id = ?", (job_id,)).fetchone()
+            return json.loads(row[0])
+
+    def finish(self, job_id: int, status: str, result: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE scheduled_posts SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+
+    def cancel(self, job_id: int) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_posts SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_CANCELLED, time.time(), job_id, STATUS_PENDING)
+            )
+            return cursor.rowcount == 1
+
+    def mark_interrupted(self) -> int:
+        """
+        上次進程結束時仍在執行的任務可能已經發布，標記為 interrupted 而不自動重試
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_posts SET status = ?, updated_at = ? WHERE status = ?",
+                (STATUS_INTERRUPTED, time.time(), STATUS_RUNNING)
+            )
+            return cursor.rowcount
+
+    def iter_pending(self):
+        """
+        逐行返回 (due_at, id)，只用於建立計時器堆
+        """
+        with self._connect() as conn:
+            yield from conn.execute(
+                "SELECT due_at, id FROM scheduled_posts WHERE status = ? ORDER BY due_at",
+                (STATUS_PENDING,)
+            )
+
+    def count_pending(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM scheduled_posts WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+
+    def list_jobs(self, status: str = "", limit: int = 50) -> list:
+        query = "SELECT id, due_at, status, label, result FROM scheduled_posts"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY due_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [
+                {
+                    "id": row[0],
+                    "due_at": row[1],
+                    "status": row[2],
+                    "label": row[3],
+                    "result": json.loads(row[4]) if row[4] else {},
+                }
+                for row in conn.execute(query, params)
+            ]
+
+
+class PostScheduler:
+    """
+    最小堆計時器排程器 - 後台線程只在下一個到期時間喚醒，不輪詢掃描數據庫
+    """
+
+    def __init__(self, store: ScheduledPostStore, run_job, max_workers: int = 2):
+        self.store = store
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self._heap = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._condition:
+            if self.running:
+                return
+            interrupted = self.store.mark_interrupted()
+            if interrupted:
+                print(f"⚠️ {interrupted} 個排程任務在上次執行時中斷，已標記為 interrupted")
+            self._heap = list(self.store.iter_pending())
+            heapq.heapify(self._heap)
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="threads-scheduler")
+            self._thread = threading.Thread(target=self._loop, name="threads-scheduler", daemon=True)
+            self._thread.start()
+        print(f"⏰ Threads 排程器已啟動，待執行任務: {len(self._heap)}")
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def schedule(self, due_at: float, payload: dict, label: str = "") -> int:
+        job_id = self.store.add(due_at, payload, label)
+        with self._condition:
+            heapq.heappush(self._heap, (due_at, job_id))
+            # 新任務比當前等待的任務更早時，立即喚醒計時器線程重新計算等待時間
+            if self._heap[0][1] == job_id:
+                self._condition.notify()
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        # 已取消的任務留在堆中，到期時因為狀態不是 pending 而被跳過
+        return self.store.cancel(job_id)
+
+    def _loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=delay)
+                if self._stopping:
+                    return
+                due_jobs = []
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due_jobs.append(heapq.heappop(self._heap)[1])
+
+            for job_id in due_jobs:
+                self._executor.submit(self._execute, job_id)
+
+    def _execute(self, job_id: int) -> None:
+        payload = self.store.claim(job_id)
+        if payload is None:
+            return
+        print(f"⏰ 執行排程任務 #{job_id}")
+        try:
+            success, result = self.run_job(payload)
+            self.store.finish(job_id, STATUS_DONE if success else STATUS_FAILED, result)
+            print(f"{'✅' if success else '❌'} 排程任務 #{job_id} 完成: {result.get('message', '')}")
+        except Exception as e:
+            self.store.finish(job_id, STATUS_FAILED, {"message": f"排程任務異常: {str(e)}"})
+            print(f"❌ 排程任務 #{job_id} 異常: {str(e)}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_post_scheduler(run_job) -> PostScheduler:
+    """
+    返回進程級排程器（首次調用時創建並啟動）
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PostScheduler(ScheduledPostStore(), run_job)
+        _scheduler.start()
+        return _scheduler
+
+
+def resume_pending_schedules(run_job) -> None:
+    """
+    ComfyUI 啟動時恢復排程器；沒有待執行任務或設定 THREADS_SCHEDULER_DISABLED 時不啟動線程
+    """
+    if os.environ.get("THREADS_SCHEDULER_DISABLED"):
+        return
+    if ScheduledPostStore().count_pending():
+        get_post_scheduler(run_job)
@@ -0,0 +1,339 @@
+"""
+受管理的媒體暫存區
+所有需要落地的臨時媒體（內存字節寫出、本地服務器發佈的副本）都放在這裡，而不是各自創建臨時目錄
+總大小受配額限制，按最近使用時間（LRU）和存放時間淘汰；正在被伺服或上傳的文件以引用計數固定，不會被淘汰
+"""
+
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from .threads_common import get_data_dir
+except ImportError:
+    from threads_common import get_data_dir
+
+DEFAULT_SCRATCH_QUOTA_MB = 2048
+DEFAULT_SCRATCH_MAX_AGE = 24 * 3600
+COPY_CHUNK_SIZE = 1024 * 1024
+# Windows OpenProcess / GetExitCodeProcess
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+# FILETIME（1601 年起的 100 納秒）與 Unix 紀元的差
+FILETIME_EPOCH_OFFSET = 11644473600
+# 進程啟動時間與目錄名中記錄時間比較的容差（秒）
+START_TIME_SLACK = 2
+
+
+class _ScratchEntry:
+    __slots__ = ("path", "size", "pins", "created_at", "last_used")
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.pins = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+
+def _windows_process_alive(pid: int) -> bool:
+    # Windows 上 os.kill(pid, 0) 會發送 CTRL_C_EVENT，改用 OpenProcess 查詢退出碼
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # 拒絕存取表示進程存在但屬於其他使用者
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _windows_process_start_time(pid: int):
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.GetProcessTimes.argtypes = (wintypes.HANDLE,) + (ctypes.POINTER(wintypes.FILETIME),) * 4
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return None
+    try:
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+            return None
+        created = (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+        return created / 10 ** 7 - FILETIME_EPOCH_OFFSET
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _boot_time():
+    try:
+        with open("/proc/stat", "r") as f:
+            for line in f:
+                if line.startswith("btime "):
+                    return float(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _process_start_time(pid: int):
+    """
+    進程的啟動時間（Unix 時間戳）；平台不支援或無法讀取時返回 None
+    """
+    if os.name == "nt":
+        try:
+            return _windows_process_start_time(pid)
+        except (OSError, AttributeError):
+            return None
+    boot_time = _boot_time()
+    if boot_time is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # 進程名可能包含空格和括號，從最後一個 ")" 之後開始數；starttime 是第 22 個字段
+            fields = f.read().rpartition(")")[2].split()
+        return boot_time + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _owner_alive(pid: int, started: int) -> bool:
+    """
+    目錄 <pid>-<啟動時間> 的擁有進程是否仍在運行
+    PID 可能已被重用：當前進程晚於目錄創建時間啟動，或目錄創建於本次開機之前，都視為已結束
+    """
+    if not _process_alive(pid):
+        return False
+    start_time = _process_start_time(pid)
+    if start_time is not None:
+        return start_time <= started + START_TIME_SLACK
+    boot_time = _boot_time()
+    return boot_time is None or started >= boot_time
+
+
+def _process_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        return _windows_process_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 無權限時進程仍存在
+        return True
+    return True
+
+
+class ScratchSpace:
+    """
+    每個進程使用 根目錄/<pid>-<啟動時間> 子目錄；啟動時刪除已結束進程留下的子目錄，
+    運行中進程的子目錄不動，由該進程自己按存放時間和配額淘汰
+    文件以 key 命名，相同內容重複寫入時直接重用已有文件
+    """
+
+    def __init__(self, root: str = "", quota_bytes: int = 0, max_age: float = 0):
+        self.root = root or os.environ.get("THREADS_SCRATCH_DIR", "") or get_data_dir("scratch")
+        self.quota_bytes = quota_bytes or int(
+            float(os.environ.get("THREADS_SCRATCH_QUOTA_MB", DEFAULT_SCRATCH_QUOTA_MB)) * 1024 * 1024
+        )
+        self.max_age = max_age or float(os.environ.get("THREADS_SCRATCH_MAX_AGE", DEFAULT_SCRATCH_MAX_AGE))
+        self.directory = os.path.join(self.root, f"{os.getpid()}-{int(time.time())}")
+        self._entries = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.cleanup_stale()
+
+    def cleanup_stale(self) -> int:
+        """
+        刪除已結束進程留下的暫存子目錄，返回刪除的目錄數
+        """
+        removed = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            if path == self.directory or not os.path.isdir(path):
+                continue
+            pid, _, started = name.partition("-")
+            if pid.isdigit() and started.isdigit() and _owner_alive(int(pid), int(started)):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        if removed:
+            print(f"🧹 已清理 {removed} 個過期的媒體暫存目錄")
+        return removed
+
+    def _path_for(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def _evict(self, incoming: int) -> None:
+        """
+        先淘汰超過存放時間的文件，再按 LRU 淘汰直到有足夠空間；被固定的文件跳過（需持有鎖）
+        """
+        now = time.time()
+        for path, entry in list(self._entries.items()):
+            if entry.pins:
+                continue
+            if now - entry.created_at > self.max_age or self._used + incoming > self.quota_bytes:
+                self._remove_entry(path)
+                self.evicted += 1
+        if self._used + incoming > self.quota_bytes:
+            print(f"⚠️ 媒體暫存區超出配額 ({(self._used + incoming) / 1024 / 1024:.1f}MB)，"
+                  f"所有文件都在使用中")
+
+    def _remove_entry(self, path: str) -> None:
+        entry = self._entries.pop(path)
+        self._used -= entry.size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _register(self, path: str, size: int, pin: bool) -> str:
+        entry = _ScratchEntry(path, size)
+        entry.pins = 1 if pin else 0
+        self._entries[path] = entry
+        self._used += size
+        return path
+
+    def _lookup(self, path: str, pin: bool):
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        entry.last_used = time.time()
+        self._entries.move_to_end(path)
+        if pin:
+            entry.pins += 1
+        return path
+
+    def put_bytes(self, data: bytes, key: str, suffix: str = "", pin: bool = True) -> str:
+        """
+        寫入字節並返回路徑；pin = True 時返回前已固定，使用完畢需調用 release
+        """
+        path = self._path_for(key, suffix)
+        with self._lock:
+            if self._lookup(path, pin):
+                return path
+            self._evict(len(data))
+            # 先佔位並固定，寫入期間不會被其他線程淘汰
+            self._register(path, len(data), True)
+        try:
+            temp_path = f"{path}.part"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            with self._lock:
+                self._remove_entry(path)
+            raise
+        if not pin:
+            self.release(path)
+        return path
+
+    def put_file(self, source_path: str, key: str, suffix: str = "", pin: bool = True) -> str:
+        """
+        複製文件到暫存區並返回路徑
+        """
+        suffix = suffix or os.path.splitext(source_path)[1]
+        path = self._path_for(key, suffix)
+        size = os.path.getsize(source_path)
+        with self._lock:
+            if self._lookup(path, pin):
+                return path
+            self._evict(size)
+            self._register(path, size, True)
+        try:
+            temp_path = f"{path}.part"
+            with open(source_path, "rb") as src, open(temp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            os.replace(temp_path, path)
+        except OSError:
+            with self._lock:
+                self._remove_entry(path)
+            raise
+        if not pin:
+            self.release(path)
+        return path
+
+    def pin(self, path: str) -> bool:
+        with self._lock:
+            return self._lookup(path, True) is not None
+
+    def release(self, path: str) -> None:
+        """
+        解除固定；文件保留在暫存區直到被 LRU 或存放時間淘汰
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+                entry.last_used = time.time()
+
+    def discard(self, path: str) -> None:
+        """
+        解除固定並在沒有其他使用者時立即刪除
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return
+            entry.pins = max(0, entry.pins - 1)
+            if not entry.pins:
+                self._remove_entry(path)
+
+    @contextmanager
+    def pinned(self, path: str):
+        self.pin(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "files": len(self._entries),
+                "used_bytes": self._used,
+                "quota_bytes": self.quota_bytes,
+                "pinned": sum(1 for entry in self._entries.values() if entry.pins),
+                "evicted": self.evicted,
+            }
+
+
+_scratch = None
+_scratch_lock = threading.Lock()
+
+
+def get_scratch_space() -> ScratchSpace:
+    global _scratch
+    with _scratch_lock:
+        if _scratch is None:
+            _scratch = ScratchSpace()
+        return _scratch
@@ -0,0 +1,160 @@
+"""
+Threads 長文本拆分
+按 Threads 的方式計算長度（表情符號按 UTF-8 字節數計算），依次在段落、行、句子、單詞、字素邊界拆分
+"""
+
+import re
+import unicodedata
+
+THREADS_TEXT_LIMIT = 500
+
+ZWJ = "\u200d"
+KEYCAP = "\u20e3"
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_LINE_BREAK = re.compile(r"\n\s*")
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|[。！？；]+[」』”’）]*\s*")
+_WORD_BREAK = re.compile(r"\s+")
+
+
+def _is_extender(char: str) -> bool:
+    """
+    附加在前一個字符上、不構成新字素的字符
+    """
+    code = ord(char)
+    return (
+        unicodedata.combining(char) != 0
+        or unicodedata.category(char) in ("Mn", "Me", "Mc")
+        or 0xFE00 <= code <= 0xFE0F        # 變體選擇符
+        or 0x1F3FB <= code <= 0x1F3FF      # 膚色修飾符
+        or 0xE0020 <= code <= 0xE007F      # 旗幟標籤字符
+        or char == KEYCAP
+    )
+
+
+def _is_regional_indicator(char: str) -> bool:
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def _is_emoji(grapheme: str) -> bool:
+    return any(
+        ord(char) > 0xFFFF or unicodedata.category(char) == "So" or char in (ZWJ, KEYCAP, "\ufe0f")
+        for char in grapheme
+    )
+
+
+def iter_graphemes(text: str):
+    """
+    近似的擴展字素簇切分：組合符號、ZWJ 序列、膚色修飾、國旗（區域指示符對）不會被拆開
+    """
+    index = 0
+    length = len(text)
+    while index < length:
+        end = index + 1
+        if _is_regional_indicator(text[index]) and end < length and _is_regional_indicator(text[end]):
+            end += 1
+        while end < length:
+            if _is_extender(text[end]):
+                end += 1
+            elif text[end] == ZWJ:
+                # ZWJ 連接下一個字符
+                end = min(end + 2, length)
+            else:
+                break
+        yield text[index:end]
+        index = end
+
+
+def grapheme_length(grapheme: str) -> int:
+    # Threads 將表情符號按 UTF-8 字節數計入字數限制
+    if _is_emoji(grapheme):
+        return len(grapheme.encode("utf-8"))
+    return len(grapheme)
+
+
+def threads_length(text: str) -> int:
+    """
+    按 Threads 規則計算的文本長度
+    """
+    return sum(grapheme_length(grapheme) for grapheme in iter_graphemes(text))
+
+
+def _split_after(pattern, text: str) -> list:
+    """
+    在每個分隔符之後切分，分隔符保留在前一段末尾，各段拼接後等於原文
+    """
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() > start:
+            pieces.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+_SPLITTERS = (
+    lambda text: _split_after(_PARAGRAPH_BREAK, text),
+    lambda text: _split_after(_LINE_BREAK, text),
+    lambda text: _split_after(_SENTENCE_END, text),
+    lambda text: _split_after(_WORD_BREAK, text),
+    lambda text: list(iter_graphemes(text)),
+)
+
+
+def _pack(text: str, budget: int, level: int = 0) -> list:
+    """
+    貪婪打包：盡量把同一層級的片段合併到 budget 之內，單一片段超長時降到下一層級再拆
+    """
+    chunks = []
+    current = []
+    current_length = 0
+
+    for unit in _SPLITTERS[level](text):
+        unit_length = threads_length(unit)
+        if current_length + unit_length <= budget:
+            current.append(unit)
+            current_length += unit_length
+            continue
+
+        if current:
+            chunks.append("".join(current))
+            current, current_length = [], 0
+
+        if unit_length <= budget:
+            current, current_length = [unit], unit_length
+        else:
+            sub_chunks = _pack(unit, budget, level + 1)
+            chunks.extend(sub_chunks[:-1])
+            current = [sub_chunks[-1]]
+            current_length = threads_length(sub_chunks[-1])
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def split_for_threads(text: str, limit: int = THREADS_TEXT_LIMIT, numbering: bool = False) -> list:
+    """
+    將長文本拆分為每段不超過 limit 的列表；numbering 時在每段末尾加上 (i/n)
+    """
+    text = text.strip()
+    if threads_length(text) <= limit:
+        return [text]
+
+    # 按實際段數的位數預留編號空間；拆分後段數位數增加時以更寬的後綴重新拆分
+    digits = 1
+    while True:
+        budget = limit - len(f" ({'9' * digits}/{'9' * digits})") if numbering else limit
+        if budget <= 0:
+            raise ValueError(f"limit={limit} 不足以容納編號後綴")
+        parts = [chunk.strip() for chunk in _pack(text, budget)]
+        parts = [part for part in parts if part]
+        if not numbering or len(str(len(parts))) <= digits:
+            break
+        digits = len(str(len(parts)))
+
+    if numbering:
+        total = len(parts)
+        parts = [f"{part} ({index}/{total})" for index, part in enumerate(parts, 1)]
+    return parts
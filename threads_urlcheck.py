@@ -0,0 +1,130 @@
+"""
+媒體 URL 可達性預檢
+並行發出 HEAD（不支援時改用 Range GET）檢查狀態碼、Content-Type、Content-Length，結果按 URL 緩存
+避免在 Threads 抓取失敗（視頻要等到輪詢超時）後才發現 URL 不可用
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from .threads_cache import TTLCache
+    from .threads_preflight import MAX_IMAGE_BYTES, MAX_VIDEO_BYTES
+except ImportError:
+    from threads_cache import TTLCache
+    from threads_preflight import MAX_IMAGE_BYTES, MAX_VIDEO_BYTES
+
+URL_CHECK_TTL = 600
+# 失敗結果只短時間緩存，讓剛上傳完成的 URL 很快可以重新檢查
+URL_FAILURE_TTL = 30
+ACCEPTED_CONTENT_TYPES = {
+    "IMAGE": ("image/jpeg", "image/png"),
+    "VIDEO": ("video/mp4", "video/quicktime"),
+}
+# 部分存儲服務不返回準確的類型，只警告不阻止
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream", "")
+MAX_BYTES = {"IMAGE": MAX_IMAGE_BYTES, "VIDEO": MAX_VIDEO_BYTES}
+
+_url_cache = TTLCache()
+
+
+def _content_length(response) -> int:
+    # Range GET 的 206 響應中完整大小在 Content-Range: bytes 0-1023/總大小
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length", "")
+    return int(length) if length.isdigit() and response.status_code == 200 else 0
+
+
+def _probe(url: str, session: requests.Session, timeout: float):
+    """
+    先 HEAD；伺服器不支援 HEAD 或沒有返回類型時，改用只讀取前 1KB 的 Range GET
+    """
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code in (200, 206) and response.headers.get("Content-Type"):
+        return response, "HEAD"
+    response = session.get(url, headers={"Range": "bytes=0-1023"}, stream=True,
+                           allow_redirects=True, timeout=timeout)
+    response.close()
+    return response, "GET"
+
+
+def check_media_url(url: str, media_type: str, session: requests.Session = None,
+                    timeout: float = 10, use_cache: bool = True) -> dict:
+    """
+    檢查單個媒體 URL，返回 {"url", "ok", "status", "content_type", "content_length", "method", "errors", "warnings"}
+    """
+    cache_key = (url, media_type)
+    if use_cache:
+        cached = _url_cache.get(cache_key, URL_CHECK_TTL)
+        if cached is not None and (cached["ok"] or time.time() - cached["checked_at"] < URL_FAILURE_TTL):
+            return dict(cached, cached=True)
+
+    result = {"url": url, "ok": False, "status": 0, "content_type": "", "content_length": 0,
+              "method": "", "errors": [], "warnings": [], "checked_at": time.time(), "cached": False}
+
+    if not url.lower().startswith(("http://", "https://")):
+        result["errors"].append("媒體 URL 必須是 http(s) 地址")
+        return result
+
+    try:
+        response, result["method"] = _probe(url, session or requests.Session(), timeout)
+    except requests.RequestException as e:
+        result["errors"].append(f"無法連接: {str(e)}")
+        _url_cache.put(cache_key, result)
+        return result
+
+    result["status"] = response.status_code
+    result["content_type"] = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    result["content_length"] = _content_length(response)
+
+    if response.status_code not in (200, 206):
+        result["errors"].append(f"HTTP {response.status_code}")
+        _url_cache.put(cache_key, result)
+        return result
+
+    accepted = ACCEPTED_CONTENT_TYPES.get(media_type, ())
+    if result["content_type"] in GENERIC_CONTENT_TYPES:
+        result["warnings"].append(f"伺服器未返回具體的媒體類型 ({result['content_type'] or '無'})")
+    elif accepted and result["content_type"] not in accepted:
+        result["errors"].append(f"Content-Type {result['content_type']} 不是 Threads 支援的{media_type}格式")
+
+    limit = MAX_BYTES.get(media_type, 0)
+    if limit and result["content_length"] > limit:
+        result["errors"].append(
+            f"文件大小 {result['content_length'] / 1024 / 1024:.1f}MB 超過 Threads 限制 {limit / 1024 / 1024:.0f}MB"
+        )
+    elif not result["content_length"]:
+        result["warnings"].append("伺服器未返回文件大小")
+
+    result["ok"] = not result["errors"]
+    _url_cache.put(cache_key, result)
+    return result
+
+
+def check_media_urls(items: list, max_workers: int = 8, timeout: float = 10) -> list:
+    """
+    並行檢查 [(url, media_type), ...]，返回順序與輸入一致；重複的 URL 只請求一次
+    """
+    unique = list(dict.fromkeys(items))
+    if not unique:
+        return []
+    session = requests.Session()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as executor:
+        results = dict(zip(unique, executor.map(
+            lambda item: check_media_url(item[0], item[1], session, timeout), unique
+        )))
+    return [results[item] for item in items]
+
+
+def format_url_check(result: dict) -> str:
+    lines = [f"{'✅' if result['ok'] else '❌'} 媒體 URL 預檢: HTTP {result['status']} {result['content_type']} "
+             f"{result['content_length']} bytes ({result['method'] or '-'}{', 緩存' if result['cached'] else ''})"]
+    lines.extend(f"❌ {error}" for error in result["errors"])
+    lines.extend(f"⚠️ {warning}" for warning in result["warnings"])
+    return "\n".join(lines)